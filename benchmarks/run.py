@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Benchmark the candidate pipeline on synthetic .singlepulse data:
+#
+#   python -m benchmarks.run --sizes 1e4 1e5 1e6 1e7
+#   python -m benchmarks.run --sizes 1e5 --compare benchmarks/results/<older>.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import GENERATOR_VERSION, synthesize_singlepulse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Largest size each stage runs at by default; HDBSCAN is far from linear
+DEFAULT_LIMITS = {
+    "HDBSCAN_clustering": 10 ** 5,
+    "cluster_hdbscan": 10 ** 6,
+}
+
+F_LOW, BW = 550.0, 200.0
+
+
+def _load(state):
+    from cluster_tools.io import load_singlepulse
+    state["df"] = load_singlepulse(state["data_dir"], verbose=False)
+
+
+def _dm_delay(state):
+    from cluster_tools.io import DM_delay
+    state["df"]["Delay_s"] = DM_delay(state["df"]["DM"], F_LOW, BW)
+
+
+def _dbscan(state):
+    from cluster_tools.clustering import DBSCAN_clustering
+    state["clustered"] = DBSCAN_clustering(state["df"], ['Delay_s', 'Time'], eps=0.05, min_samples=5)
+
+
+def _fof(state):
+    from cluster_tools.clustering import FOF_clustering
+    FOF_clustering(state["df"], ['Delay_s', 'Time'], eps=0.05, min_samples=5)
+
+
+def _hdbscan(state):
+    from cluster_tools.clustering import HDBSCAN_clustering
+    HDBSCAN_clustering(state["df"], ['Delay_s', 'Time'], min_cluster_size=5)
+
+
+def _summary(state):
+    from cluster_tools.clustering import cluster_summary
+    state["best"] = cluster_summary(state["clustered"])
+
+
+def _write_singlepulse(state):
+    from cluster_tools.output import write_singlepulse
+    write_singlepulse(state["clustered"], os.path.join(state["work_dir"], "all.singlepulse"))
+
+
+def _write_npz(state):
+    from cluster_tools.output import write_candidates
+    write_candidates(state["clustered"], os.path.join(state["work_dir"], "all.npz"))
+
+
+def _write_csv(state):
+    from cluster_tools.output import write_candidates
+    write_candidates(state["clustered"], os.path.join(state["work_dir"], "all.csv"))
+
+
+# In-process stages in run order; each needs the state left by the earlier ones
+STAGES = [
+    ("load_singlepulse", _load),
+    ("DM_delay", _dm_delay),
+    ("DBSCAN_clustering", _dbscan),
+    ("FOF_clustering", _fof),
+    ("HDBSCAN_clustering", _hdbscan),
+    ("cluster_summary", _summary),
+    ("write_singlepulse", _write_singlepulse),
+    ("write_candidates_npz", _write_npz),
+    ("write_candidates_csv", _write_csv),
+]
+
+# End-to-end CLIs, run as separate processes on the same directory
+CLIS = {
+    "cluster_dbscan": ["cluster_tools.cli.clustering_dbscan", "--no_cache"],
+    "cluster_hdbscan": ["cluster_tools.cli.clustering_hdbscan", "--no_cache"],
+}
+
+# Stages that cannot run without the output of another one
+REQUIRES = {
+    "DM_delay": "load_singlepulse",
+    "DBSCAN_clustering": "DM_delay",
+    "FOF_clustering": "DM_delay",
+    "HDBSCAN_clustering": "DM_delay",
+    "cluster_summary": "DBSCAN_clustering",
+    "write_singlepulse": "DBSCAN_clustering",
+    "write_candidates_npz": "DBSCAN_clustering",
+    "write_candidates_csv": "DBSCAN_clustering",
+}
+
+
+def dataset(n, data_root, seed=0):
+    """
+    Directory of n synthetic candidates, generated on first use and reused
+    while its manifest matches the generator version and seed.
+    """
+    path = os.path.join(data_root, f"n{n}_seed{seed}")
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest["generator_version"] == GENERATOR_VERSION and manifest["n_candidates"] == n:
+            return path
+    except (OSError, ValueError, KeyError):
+        pass
+    print(f"Generating {n:,} synthetic candidates in {path}")
+    synthesize_singlepulse(n, path, seed=seed)
+    return path
+
+
+def run_stage(func, state):
+    # Wall time and peak traced allocation (numpy buffers included) of one stage
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        func(state)
+    finally:
+        seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_cli(module_args, data_dir, work_dir):
+    # Wall time and peak resident memory of a CLI in a child process
+    cmd = [sys.executable, "-m", module_args[0], "-s", data_dir, "-o", os.path.join(work_dir, "out.singlepulse")]
+    cmd += module_args[1:]
+    log = os.path.join(work_dir, "cli.log")
+    t0 = time.perf_counter()
+    with open(log, "wb") as fh:
+        proc = subprocess.Popen(cmd, cwd=work_dir, stdout=fh, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        with open(log, errors="replace") as fh:
+            last = fh.read().strip().splitlines()[-1:]
+        raise RuntimeError(f"exit code {proc.returncode}: {' '.join(last)}")
+    # ru_maxrss is in kB on Linux and bytes on macOS
+    peak = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return seconds, peak
+
+
+def environment():
+    import numpy
+    import pandas
+    import sklearn
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "git_commit": commit, "python": platform.python_version(), "numpy": numpy.__version__,
+        "pandas": pandas.__version__, "sklearn": sklearn.__version__, "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_curves(results):
+    # One row per stage, throughput in candidates/s (and peak MB) per size
+    sizes = sorted({r["n"] for r in results})
+    print(f"\n{'stage':<22}" + "".join(f"{n:>22,}" for n in sizes))
+    for stage in dict.fromkeys(r["stage"] for r in results):
+        cells = []
+        for n in sizes:
+            r = next((r for r in results if r["stage"] == stage and r["n"] == n), None)
+            if r is None or r["status"] != "ok":
+                cells.append(f"{'-' if r is None else r['status']:>22}")
+            else:
+                cells.append(f"{r['throughput']:>12.3g}/s {r['peak_mb']:>6.0f} MB")
+        print(f"{stage:<22}" + "".join(cells))
+
+
+def print_comparison(results, baseline):
+    # Speed-up of every (stage, size) measured in both runs
+    old = {(r["stage"], r["n"]): r for r in baseline["results"] if r["status"] == "ok"}
+    print(f"\nCompared with {baseline['label']} ({baseline['environment'].get('git_commit')}):")
+    print(f"{'stage':<22} {'n':>12} {'old s':>10} {'new s':>10} {'speed-up':>9} {'old MB':>8} {'new MB':>8}")
+    for r in results:
+        o = old.get((r["stage"], r["n"]))
+        if o is None or r["status"] != "ok":
+            continue
+        print(f"{r['stage']:<22} {r['n']:>12,} {o['seconds']:>10.3f} {r['seconds']:>10.3f} "
+              f"{o['seconds'] / r['seconds']:>8.2f}x {o['peak_mb']:>8.0f} {r['peak_mb']:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the cluster_tools pipeline on synthetic .singlepulse data.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e4, 1e5, 1e6, 1e7],
+                        help="Candidate counts to run (default: 1e4 1e5 1e6 1e7)")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="Stages and CLIs to run (default: all): " + " ".join(name for name, _ in STAGES) +
+                             " " + " ".join(CLIS))
+    parser.add_argument("--limit", nargs="+", default=[], metavar="STAGE=N",
+                        help="Largest size a stage runs at, e.g. HDBSCAN_clustering=1e5 "
+                             "(default: HDBSCAN_clustering up to 1e5, cluster_hdbscan up to 1e6)")
+    parser.add_argument("--data_dir", default=os.path.join(HERE, "data"),
+                        help="Where synthetic datasets are generated and reused (default: benchmarks/data)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data (default: 0)")
+    parser.add_argument("--label", default=None,
+                        help="Name of this run (default: the git commit, or 'local')")
+    parser.add_argument("--output", default=None,
+                        help="Results JSON (default: benchmarks/results/<label>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    limits = dict(DEFAULT_LIMITS)
+    for item in args.limit:
+        name, _, value = item.partition("=")
+        limits[name] = int(float(value))
+    selected = set(args.stages) if args.stages else {name for name, _ in STAGES} | set(CLIS)
+    unknown = selected - {name for name, _ in STAGES} - set(CLIS)
+    if unknown:
+        parser.error(f"unknown stages: {' '.join(sorted(unknown))}")
+
+    # Selected stages plus everything they depend on
+    needed = set(selected)
+    for name in selected:
+        while REQUIRES.get(name) is not None:
+            name = REQUIRES[name]
+            needed.add(name)
+
+    env = environment()
+    label = args.label or env["git_commit"] or "local"
+    results = []
+    for n in (int(s) for s in args.sizes):
+        data_dir = dataset(n, args.data_dir, seed=args.seed)
+        with tempfile.TemporaryDirectory() as work_dir:
+            state = {"data_dir": data_dir, "work_dir": work_dir}
+            done = set()
+            runs = [(name, func, None) for name, func in STAGES] + [(name, None, cli) for name, cli in CLIS.items()]
+            for name, func, cli in runs:
+                if name not in needed:
+                    continue
+                record = {"stage": name, "n": n, "seconds": None, "throughput": None, "peak_mb": None}
+                if n > limits.get(name, n):
+                    record["status"] = "skipped"
+                elif REQUIRES.get(name) is not None and REQUIRES[name] not in done:
+                    record["status"] = "blocked"
+                else:
+                    try:
+                        seconds, peak = run_cli(cli, data_dir, work_dir) if cli else run_stage(func, state)
+                    except Exception as e:
+                        record["status"] = "error"
+                        record["error"] = f"{type(e).__name__}: {e}"
+                    else:
+                        done.add(name)
+                        record.update(status="ok", seconds=seconds, throughput=n / max(seconds, 1e-9),
+                                      peak_mb=peak / 2 ** 20)
+                if name in selected:
+                    results.append(record)
+                    shown = f"{record['seconds']:.3f} s" if record["status"] == "ok" else record["status"]
+                    print(f"{name:<22} {n:>12,}  {shown}" + (f"  {record['error']}" if "error" in record else ""))
+
+    print_curves(results)
+
+    output = args.output or os.path.join(HERE, "results", f"{label}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"label": label, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": env,
+                   "generator_version": GENERATOR_VERSION, "seed": args.seed, "results": results}, f, indent=1)
+    print(f"\nSaved results to: {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from cluster_tools.io import DM_delay, SINGLEPULSE_COLUMNS
+from cluster_tools.output import write_singlepulse
+from cluster_tools.search import DEFAULT_DOWNFACTS
+
+# Bump when the generated data changes, so cached datasets are rebuilt
+GENERATOR_VERSION = 1
+
+
+def _noise(rng, n, dms, duration):
+    # Gaussian noise peaks: S/N follows the tail of a normal above 5 sigma,
+    # narrow boxcars are the most common
+    weights = 1.0 / np.arange(1, len(DEFAULT_DOWNFACTS) + 1)
+    return {
+        'DM': dms[rng.integers(0, len(dms), n)],
+        'Sigma': np.sqrt(25.0 + rng.exponential(2.0, n)),
+        'Time': rng.uniform(0, duration, n),
+        'Downfact': rng.choice(DEFAULT_DOWNFACTS, n, p=weights / weights.sum()),
+    }
+
+
+def _bursts(rng, n, dms, duration, f_low, bw, tsamp):
+    """
+    Dispersed bursts seen across neighbouring DM trials.
+
+    A burst of width w (log-normal around 2 ms) detected at DM trial d
+    has its S/N reduced by the residual dispersion smearing across the
+    band, peak / sqrt(1 + (DM_delay(|d - DM0|) / w)^2), and is listed in
+    every trial where that is still above 5. The arrival time drifts by
+    half the residual delay and the boxcar widens with the smearing.
+    """
+    parts = []
+    truth = []
+    total = 0
+    while total < n:
+        dm0 = rng.uniform(0.05, 0.8) * dms[-1]
+        t0 = rng.uniform(0, duration)
+        width = float(np.clip(np.exp(rng.normal(np.log(2e-3), 0.7)), 2e-4, 2e-2))
+        peak = 8.0 * np.exp(rng.exponential(0.5))
+        smear = DM_delay(np.abs(dms - dm0), f_low, bw)
+        sigma = peak / np.sqrt(1.0 + (smear / width) ** 2)
+        keep = sigma > 5.0
+        m = int(keep.sum())
+        if m == 0:
+            continue
+        k = min(m, n - total)
+        order = np.argsort(-sigma[keep])[:k]
+        trial_dms = dms[keep][order]
+        smeared = width * np.sqrt(1.0 + (smear[keep][order] / width) ** 2) / tsamp
+        steps = np.minimum(np.searchsorted(DEFAULT_DOWNFACTS, smeared), len(DEFAULT_DOWNFACTS) - 1)
+        parts.append({
+            'DM': trial_dms,
+            'Sigma': sigma[keep][order],
+            'Time': t0 + np.sign(trial_dms - dm0) * smear[keep][order] / 2,
+            'Downfact': np.asarray(DEFAULT_DOWNFACTS)[steps],
+        })
+        truth.append({'dm': float(dm0), 'time': float(t0), 'width': width, 'peak_sigma': float(peak),
+                      'n_candidates': k})
+        total += k
+    return parts, truth
+
+
+def _storms(rng, n, dms, duration):
+    """
+    Broadband RFI storms: a few seconds in which many low-DM trials fire,
+    strongest near DM 0 and with wide boxcars.
+    """
+    parts = []
+    truth = []
+    n_storms = max(1, n // 5000) if n else 0
+    for k, count in enumerate(np.diff(np.linspace(0, n, n_storms + 1).astype(np.int64))):
+        start = rng.uniform(0, duration)
+        length = rng.uniform(0.5, 5.0)
+        dm_index = np.minimum(rng.exponential(len(dms) * 0.02, count).astype(np.int64), len(dms) - 1)
+        parts.append({
+            'DM': dms[dm_index],
+            'Sigma': 5.0 + rng.exponential(5.0, count) * np.exp(-dms[dm_index] / (dms[-1] * 0.05)),
+            'Time': start + rng.uniform(0, length, count),
+            'Downfact': rng.choice(DEFAULT_DOWNFACTS[3:], count),
+        })
+        truth.append({'time': float(start), 'duration': float(length), 'n_candidates': int(count)})
+    return parts, truth
+
+
+def synthesize_singlepulse(n_candidates, output_dir, n_dm=1000, dm_max=2000.0, rate=1000.0,
+                           burst_fraction=0.05, rfi_fraction=0.15, f_low=550.0, bw=200.0, tsamp=8.192e-5,
+                           seed=0, prefix="synthetic"):
+    """
+    Write a synthetic PRESTO .singlepulse directory.
+
+    One file per DM trial, <prefix>_DM<dm>.singlepulse, holds a mix of
+    Gaussian noise candidates, dispersed bursts listed across the DM
+    trials around their true DM, and RFI storms at low DM. The observation
+    length is n_candidates / rate seconds, so the candidate density (and
+    the clustering work per candidate) stays the same at every scale.
+
+    Parameters
+    ----------
+    n_candidates : int
+        Total number of candidates written
+
+    output_dir : str
+        Directory created for the files
+
+    n_dm, dm_max : int, float
+        DM trials, evenly spaced from 0 to dm_max
+
+    rate : float
+        Candidates per second of observation
+
+    burst_fraction, rfi_fraction : float
+        Share of the candidates from bursts and RFI storms; the rest is noise
+
+    f_low, bw : float
+        Band (MHz) used for the burst smearing
+
+    tsamp : float
+        Sampling time (s) for the Sample column
+
+    seed : int
+        Random seed, the same seed gives the same files
+
+    Returns
+    -------
+    manifest : dict
+        Parameters and the injected bursts and storms, also written to
+        <output_dir>/manifest.json
+    """
+    rng = np.random.default_rng(seed)
+    dms = np.round(np.linspace(0, dm_max, n_dm), 2)
+    duration = n_candidates / rate
+    n_burst = int(n_candidates * burst_fraction)
+    n_rfi = int(n_candidates * rfi_fraction)
+
+    burst_parts, bursts = _bursts(rng, n_burst, dms, duration, f_low, bw, tsamp)
+    storm_parts, storms = _storms(rng, n_rfi, dms, duration)
+    parts = [_noise(rng, n_candidates - n_burst - n_rfi, dms, duration)] + burst_parts + storm_parts
+
+    df = pd.DataFrame({name: np.concatenate([p[name] for p in parts]) for name in ('DM', 'Sigma', 'Time', 'Downfact')})
+    df['Time'] = df['Time'].clip(0, duration)
+    df['Sample'] = np.floor(df['Time'] / tsamp + 0.5).astype(np.int64)
+    df['Downfact'] = df['Downfact'].astype(np.int64)
+    df = df[SINGLEPULSE_COLUMNS].sort_values(['DM', 'Time'], kind='stable')
+
+    os.makedirs(output_dir, exist_ok=True)
+    trial = np.searchsorted(dms, df['DM'].to_numpy())
+    bounds = np.searchsorted(trial, np.arange(n_dm + 1))
+    for k, dm in enumerate(dms):
+        write_singlepulse(df.iloc[bounds[k]:bounds[k + 1]], os.path.join(output_dir, f"{prefix}_DM{dm:.2f}.singlepulse"))
+
+    manifest = {
+        'generator_version': GENERATOR_VERSION, 'n_candidates': int(n_candidates), 'n_dm': n_dm, 'dm_max': dm_max,
+        'rate': rate, 'duration': duration, 'burst_fraction': burst_fraction, 'rfi_fraction': rfi_fraction,
+        'f_low': f_low, 'bw': bw, 'tsamp': tsamp, 'seed': seed, 'bursts': bursts, 'storms': storms,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
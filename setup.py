@@ -16,7 +16,14 @@ setup(
         "console_scripts": [
             "cluster_dbscan = cluster_tools.cli.clustering_dbscan:main",
             "cluster_hdbscan = cluster_tools.cli.clustering_hdbscan:main",
+            "cluster_online = cluster_tools.cli.clustering_online:main",
+            "cluster_sweep = cluster_tools.cli.clustering_sweep:main",
+            "cluster_batch = cluster_tools.cli.clustering_batch:main",
+            "cluster_queue = cluster_tools.cli.work_queue:main",
+            "cluster_service = cluster_tools.cli.cluster_service:main",
+            "cluster_client = cluster_tools.cli.cluster_client:main",
             "csv_convert = cluster_tools.cli.csv_convertor:main",
+            "make_cutouts = cluster_tools.cli.make_cutouts:main",
             "dedisperse = cluster_tools.cli.DDplan_dedisperse:main",
         ]
     },
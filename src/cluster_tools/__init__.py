@@ -1,11 +1,97 @@
 # src/cluster_tools/__init__.py
+import importlib
+
+# Public names and the submodule defining each. They are imported on first
+# use (PEP 562), so that importing the package or one light submodule (e.g.
+# the service client) does not load pandas, sklearn and hdbscan.
+_EXPORTS = {
+    "DM_delay": "io",
+    "load_singlepulse": "io",
+    "iter_singlepulse": "io",
+    "load_filtered_singlepulse": "io",
+    "SinglepulseWatcher": "io",
+    "CandidateTable": "candidates",
+    "load_candidate_table": "candidates",
+    "HDBSCAN_clustering": "clustering",
+    "DBSCAN_clustering": "clustering",
+    "FOF_clustering": "clustering",
+    "cluster_summary": "clustering",
+    "cluster_features": "clustering",
+    "dbscan_labels": "clustering",
+    "fof_labels": "clustering",
+    "hdbscan_labels": "clustering",
+    "select_strategy": "clustering",
+    "format_singlepulse": "output",
+    "write_singlepulse": "output",
+    "write_candidates": "output",
+    "read_candidates": "output",
+    "single_pulse_search": "search",
+    "read_cutout_candidates": "cutouts",
+    "make_cutouts": "cutouts",
+    "DBSCAN_sweep": "sweep",
+    "HDBSCAN_sweep": "sweep",
+    "MetricsRecorder": "metrics",
+    "recording": "metrics",
+    "stage": "metrics",
+    "rfi_veto": "rfi",
+    "cluster_batch": "batch",
+    "cluster_observation": "batch",
+    "WorkQueue": "workqueue",
+    "run_worker": "workqueue",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    else:
+        # Submodules stay reachable as attributes, e.g. cluster_tools.io
+        try:
+            value = importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
 
-from .io import DM_delay, load_singlepulse
-from .clustering import HDBSCAN_clustering, DBSCAN_clustering
 
 __all__ = [
     "DM_delay",
     "load_singlepulse",
+    "iter_singlepulse",
+    "load_filtered_singlepulse",
+    "SinglepulseWatcher",
+    "CandidateTable",
+    "load_candidate_table",
     "HDBSCAN_clustering",
-    "DBSCAN_clustering"
+    "DBSCAN_clustering",
+    "FOF_clustering",
+    "cluster_summary",
+    "cluster_features",
+    "dbscan_labels",
+    "fof_labels",
+    "hdbscan_labels",
+    "select_strategy",
+    "format_singlepulse",
+    "write_singlepulse",
+    "write_candidates",
+    "read_candidates",
+    "single_pulse_search",
+    "read_cutout_candidates",
+    "make_cutouts",
+    "DBSCAN_sweep",
+    "HDBSCAN_sweep",
+    "MetricsRecorder",
+    "recording",
+    "stage",
+    "rfi_veto",
+    "cluster_batch",
+    "cluster_observation",
+    "WorkQueue",
+    "run_worker"
 ]
\ No newline at end of file
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import glob
+import os
+import time
+from concurrent.futures import as_completed
+
+import pandas as pd
+
+from .io import _make_pool, load_filtered_singlepulse
+from .clustering import dbscan_labels, fof_labels, hdbscan_labels, cluster_summary
+from .output import write_singlepulse
+from .rfi import rfi_veto
+
+# Shared settings of a batch; see cluster_observation
+DEFAULT_CONFIG = {
+    "algorithm": "dbscan",
+    "eps": 0.05,
+    "min_samples": None,
+    "min_cluster_size": 5,
+    "snr": 6.0,
+    "dm_threshold": 10.0,
+    "f_low": 550.0,
+    "bandwidth": 200.0,
+    "strategy": "auto",
+    "decimate": None,
+    "rfi_veto": None,
+    "summary": False,
+    "cache": True,
+}
+
+INDEX_COLUMNS = ['observation', 'name', 'status', 'output', 'n_read', 'n_candidates', 'n_clusters', 'n_best',
+                 'seconds', 'error']
+
+
+def expand_observations(patterns):
+    """
+    Singlepulse directories named by `patterns`: paths or glob patterns,
+    in the given order with duplicates and non-directories dropped.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(os.path.abspath(p) for p in matches if os.path.isdir(p))
+    return list(dict.fromkeys(paths))
+
+
+def observation_names(paths):
+    """
+    Output name of every directory: its basename, extended with parent
+    directories (joined by '_') until the names are unique.
+    """
+    parts = [os.path.normpath(p).split(os.sep) for p in paths]
+    depth = [1] * len(paths)
+    while True:
+        names = ["_".join(p[-d:]).strip("_") for p, d in zip(parts, depth)]
+        seen = {}
+        for i, name in enumerate(names):
+            seen.setdefault(name, []).append(i)
+        clashes = [i for group in seen.values() if len(group) > 1 for i in group if depth[i] < len(parts[i])]
+        if not clashes:
+            return names
+        for i in clashes:
+            depth[i] += 1
+
+
+def cluster_observation(path, output_dir, name, config=None):
+    """
+    Cluster one singlepulse directory and write its best candidates.
+
+    Candidates are loaded with the DM threshold and 'Delay_s' applied
+    while parsing, optionally passed through rfi_veto (config['rfi_veto']
+    holds its keyword arguments; the DM threshold then follows the veto),
+    clustered on ('Delay_s', 'Time'), and the highest-Sigma candidate of
+    every cluster above config['snr'] is written, sorted by Time, to
+    <output_dir>/<name>.singlepulse. With config['summary'] the full
+    cluster_summary goes to <name>_summary.csv.
+
+    Parameters
+    ----------
+    path : str
+        Directory with .singlepulse files
+
+    output_dir : str
+        Directory for the outputs
+
+    name : str
+        Base name of the outputs
+
+    config : dict
+        Settings overriding DEFAULT_CONFIG: 'algorithm' ('dbscan', 'fof'
+        or 'hdbscan'), 'eps', 'min_samples' (None: 5 for DBSCAN/FOF, the
+        HDBSCAN default otherwise), 'min_cluster_size', 'snr',
+        'dm_threshold', 'f_low', 'bandwidth', 'strategy', 'decimate',
+        'rfi_veto', 'summary' and 'cache'
+
+    Returns
+    -------
+    record : dict
+        Row of the batch index for this observation
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    t0 = time.perf_counter()
+    output = os.path.join(output_dir, f"{name}.singlepulse")
+    rfi = config["rfi_veto"]
+
+    df = load_filtered_singlepulse(path, f_low=config["f_low"], BW=config["bandwidth"],
+                                   dm_min=None if rfi is not None else config["dm_threshold"],
+                                   cache=config["cache"], verbose=False)
+    n_read = df.attrs["rows_read"]
+    if rfi is not None:
+        keep, report = rfi_veto(df, **rfi)
+        report.to_csv(os.path.join(output_dir, f"{name}_rfi_veto.csv"), index=False)
+        df = df[keep & (df["DM"].to_numpy() >= config["dm_threshold"])].reset_index(drop=True)
+
+    algorithm = config["algorithm"]
+    if algorithm == "hdbscan":
+        labels = hdbscan_labels(df, ["Delay_s", "Time"], min_cluster_size=config["min_cluster_size"],
+                                min_samples=config["min_samples"], strategy=config["strategy"])
+    elif algorithm in ("dbscan", "fof"):
+        min_samples = 5 if config["min_samples"] is None else config["min_samples"]
+        if algorithm == "fof":
+            labels = fof_labels(df, ["Delay_s", "Time"], eps=config["eps"], min_samples=min_samples)
+        else:
+            labels = dbscan_labels(df, ["Delay_s", "Time"], eps=config["eps"], min_samples=min_samples,
+                                   strategy=config["strategy"], decimate=config["decimate"])
+    else:
+        raise ValueError(f"Unknown algorithm '{algorithm}', expected 'dbscan', 'fof' or 'hdbscan'.")
+    df["cluster"] = labels
+
+    summary = cluster_summary(df)
+    if config["summary"]:
+        summary.to_csv(os.path.join(output_dir, f"{name}_summary.csv"), index=False)
+    best = summary[summary["Sigma"] > config["snr"]].sort_values("Time").reset_index(drop=True)
+    write_singlepulse(best, output)
+
+    return {
+        "observation": path, "name": name, "status": "ok", "output": output, "n_read": n_read,
+        "n_candidates": len(df), "n_clusters": len(summary), "n_best": len(best),
+        "seconds": time.perf_counter() - t0, "error": "",
+    }
+
+
+def _run_observation(task):
+    # Pool worker: one observation, with failures reported in its index row
+    path, output_dir, name, config = task
+    t0 = time.perf_counter()
+    try:
+        return cluster_observation(path, output_dir, name, config)
+    except Exception as e:
+        return {"observation": path, "name": name, "status": "error", "output": "", "n_read": 0,
+                "n_candidates": 0, "n_clusters": 0, "n_best": 0, "seconds": time.perf_counter() - t0,
+                "error": f"{type(e).__name__}: {e}"}
+
+
+def cluster_batch(paths, output_dir, config=None, n_jobs=1, verbose=True):
+    """
+    Cluster many singlepulse directories with one configuration.
+
+    Observations are spread over `n_jobs` worker processes (<= 0 uses all
+    CPUs), one observation per worker at a time, so a node is kept busy
+    across beams. Where workers are forked (Linux), they inherit the
+    imported numpy, pandas, sklearn and hdbscan instead of importing them
+    again. A failing observation is recorded in the index and does not
+    stop the others.
+
+    Parameters
+    ----------
+    paths : list
+        Singlepulse directories (see expand_observations)
+
+    output_dir : str
+        Directory for the per-observation outputs and index.csv
+
+    config : dict
+        Shared settings, see cluster_observation
+
+    n_jobs : int
+        Observations clustered at once
+
+    verbose : bool
+        Print a line per finished observation
+
+    Returns
+    -------
+    index : pandas.DataFrame
+        One row per observation in input order, also written to
+        <output_dir>/index.csv: 'observation', 'name', 'status' ('ok' or
+        'error'), 'output', 'n_read', 'n_candidates' (after the DM
+        threshold and veto), 'n_clusters', 'n_best', 'seconds' and 'error'
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(path, output_dir, name, config) for path, name in zip(paths, observation_names(paths))]
+    records = [None] * len(tasks)
+
+    def report(k, record):
+        records[k] = record
+        if verbose:
+            done = sum(r is not None for r in records)
+            detail = (f"{record['n_best']} candidates from {record['n_candidates']} in {record['seconds']:.1f} s"
+                      if record["status"] == "ok" else record["error"])
+            print(f"[{done}/{len(tasks)}] {record['name']}: {detail}")
+
+    pool = _make_pool(n_jobs, backend="process")
+    try:
+        if pool is None:
+            for k, task in enumerate(tasks):
+                report(k, _run_observation(task))
+        else:
+            futures = {pool.submit(_run_observation, task): k for k, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                report(futures[future], future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    index = pd.DataFrame(records, columns=INDEX_COLUMNS)
+    index_file = os.path.join(output_dir, "index.csv")
+    tmp = f"{index_file}.{os.getpid()}.tmp"
+    index.to_csv(tmp, index=False)
+    os.replace(tmp, index_file)
+    return index
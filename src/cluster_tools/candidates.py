@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+from .io import SINGLEPULSE_COLUMNS, DM_delay, iter_singlepulse
+
+# Compact storage types for candidate columns. Time stays in double
+# precision: float32 cannot resolve single samples over multi-hour scans.
+COMPACT_DTYPES = {
+    'DM': np.float32,
+    'Sigma': np.float32,
+    'Time': np.float64,
+    'Sample': np.int64,
+    'Downfact': np.int32,
+    'Delay_s': np.float32,
+    'cluster': np.int32,
+}
+
+
+def _fill_value(dtype):
+    # Placeholder for rows outside a view when a new column is assigned
+    return np.nan if np.issubdtype(dtype, np.floating) else -1
+
+
+class CandidateTable:
+    """
+    Column-oriented candidate container with compact dtypes.
+
+    Each column is a separate NumPy array stored with the dtype listed in
+    COMPACT_DTYPES (other columns keep their own dtype). Filtering with
+    `where` or `take` returns a table that shares the column arrays and
+    only records the selected rows, so no column is copied until it is
+    read. Use `to_pandas` to obtain a DataFrame.
+
+    Parameters
+    ----------
+    columns : dict
+        Mapping of column name to 1-D array, all of the same length
+
+    rows : numpy.ndarray
+        Integer positions into the column arrays selected by this table,
+        or None for all rows
+    """
+
+    def __init__(self, columns, rows=None):
+        self._columns = {}
+        for name, values in columns.items():
+            self._columns[name] = np.asarray(values, dtype=COMPACT_DTYPES.get(name))
+        lengths = {len(v) for v in self._columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        self._base_length = lengths.pop() if lengths else 0
+        self._rows = rows
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build a table from a DataFrame, converting to compact dtypes."""
+        return cls({name: df[name].to_numpy() for name in df.columns})
+
+    @classmethod
+    def from_chunks(cls, chunks, f_low=None, BW=None):
+        """
+        Build a table from an iterable of candidate DataFrames, e.g.
+        iter_singlepulse(...). Each chunk is converted to compact dtypes
+        before the next is read. If `f_low` and `BW` are given the
+        'Delay_s' column is computed per chunk.
+        """
+        parts = {name: [] for name in SINGLEPULSE_COLUMNS}
+        if f_low is not None and BW is not None:
+            parts['Delay_s'] = []
+        for chunk in chunks:
+            for name in SINGLEPULSE_COLUMNS:
+                parts[name].append(chunk[name].to_numpy().astype(COMPACT_DTYPES[name]))
+            if 'Delay_s' in parts:
+                parts['Delay_s'].append(DM_delay(chunk['DM'].to_numpy(), f_low, BW).astype(COMPACT_DTYPES['Delay_s']))
+        return cls({
+            name: np.concatenate(arrays) if arrays else np.empty(0, dtype=COMPACT_DTYPES[name])
+            for name, arrays in parts.items()
+        })
+
+    def __len__(self):
+        return self._base_length if self._rows is None else len(self._rows)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __repr__(self):
+        return f"CandidateTable({len(self):,} rows, columns={self.columns})"
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def is_view(self):
+        return self._rows is not None
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays and row selection."""
+        n = sum(v.nbytes for v in self._columns.values())
+        return n + (0 if self._rows is None else self._rows.nbytes)
+
+    def __getitem__(self, name):
+        values = self._columns[name]
+        return values if self._rows is None else values[self._rows]
+
+    def __setitem__(self, name, values):
+        # Writes through a view land in the shared column arrays
+        dtype = COMPACT_DTYPES.get(name, np.asarray(values).dtype)
+        values = np.asarray(values, dtype=dtype)
+        if len(values) != len(self):
+            raise ValueError(f"Column '{name}' has {len(values)} rows, expected {len(self)}.")
+        if self._rows is None:
+            self._columns[name] = values
+            return
+        if name not in self._columns:
+            self._columns[name] = np.full(self._base_length, _fill_value(dtype), dtype=dtype)
+        self._columns[name][self._rows] = values
+
+    def assign(self, name, values):
+        """Return a table with `name` set to `values`, leaving this one unchanged."""
+        result = CandidateTable.__new__(CandidateTable)
+        result._columns = dict(self._columns)
+        result._columns.pop(name, None)
+        result._base_length = self._base_length
+        result._rows = self._rows
+        result[name] = values
+        return result
+
+    def where(self, mask):
+        """Return a view of the rows where the boolean `mask` is True."""
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != len(self):
+            raise ValueError(f"Mask has {len(mask)} rows, expected {len(self)}.")
+        return self.take(np.flatnonzero(mask))
+
+    def take(self, indices):
+        """Return a view of the rows at integer positions `indices`."""
+        indices = np.asarray(indices, dtype=np.intp)
+        rows = indices if self._rows is None else self._rows[indices]
+        result = CandidateTable.__new__(CandidateTable)
+        result._columns = self._columns
+        result._base_length = self._base_length
+        result._rows = rows
+        return result
+
+    def sort_values(self, name):
+        """Return a view sorted by column `name` (stable)."""
+        return self.take(np.argsort(self[name], kind='stable'))
+
+    def features(self, names, dtype=np.float64):
+        """
+        Gather `names` into a C-contiguous (N, len(names)) array, as used
+        for the clustering input.
+        """
+        X = np.empty((len(self), len(names)), dtype=dtype)
+        for i, name in enumerate(names):
+            X[:, i] = self[name]
+        return X
+
+    def materialize(self):
+        """Return a table that owns compacted copies of the selected rows."""
+        return CandidateTable({name: self[name] for name in self._columns})
+
+    def to_pandas(self, columns=None):
+        """Convert the selected rows to a DataFrame."""
+        if columns is None:
+            columns = self.columns
+        return pd.DataFrame({name: self[name] for name in columns})
+
+
+def load_candidate_table(path, f_low=None, BW=None, verbose=True, **kwargs):
+    """
+    Load .singlepulse files into a CandidateTable.
+
+    Files are streamed through iter_singlepulse, so predicates such as
+    dm_min are applied while parsing and only the surviving candidates
+    are stored, in compact dtypes.
+
+    Parameters
+    ----------
+    path : str
+        Path to directory containing .singlepulse files
+
+    f_low : float
+        Lower frequency in MHz used for 'Delay_s' (optional)
+
+    BW : float
+        Bandwidth in MHz used for 'Delay_s' (optional)
+
+    verbose : bool
+        Print summary statistics if True
+
+    **kwargs :
+        Passed to iter_singlepulse (dm_min, sigma_min, n_jobs, cache, ...)
+
+    Returns
+    -------
+    table : CandidateTable
+    """
+    stats = {'rows_read': 0, 'load_errors': {}}
+
+    def chunks():
+        for chunk in iter_singlepulse(path, **kwargs):
+            stats['rows_read'] += chunk.attrs['rows_read']
+            stats['load_errors'].update(chunk.attrs['load_errors'])
+            yield chunk
+
+    table = CandidateTable.from_chunks(chunks(), f_low=f_low, BW=BW)
+
+    if verbose:
+        for f, err in stats['load_errors'].items():
+            print(f"Skipped {f}: {err}")
+        print(f"Loaded {len(table):,} of {stats['rows_read']:,} candidates "
+              f"({table.nbytes / 1e6:.1f} MB)")
+
+    return table
@@ -1,79 +1,147 @@
 #!/usr/bin/env python3
 # Script to dedisperse data based on DDplan output
-from builtins import zip
-import pandas as pd
 import os
+import sys
 import argparse
+from cluster_tools.dedisperse import (read_ddplan, plan_prepsubband_jobs, run_jobs, estimate_job_costs,
+                                     order_longest_first, simulate_schedule, check_free_space, dedisperse_filterbank)
+from cluster_tools.filterbank import read_filterbank_header
+from cluster_tools.search import search_dedispersed
+from cluster_tools.output import write_singlepulse
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+from cluster_tools.workqueue import WorkQueue, dedisperse_jobs
+
+
+def print_plan(jobs, n_jobs):
+    # Command list with per-call estimates, then totals and the expected speed-up
+    total_cost = sum(job["cost"] for job in jobs)
+    total_bytes = sum(job["out_bytes"] for job in jobs)
+    print(f"{'cost %':>7} {'output':>10}  command")
+    for job in jobs:
+        print(f"{100 * job['cost'] / max(total_cost, 1):7.2f} {job['out_bytes'] / 1e9:8.2f} GB  {job['cmd']}")
+    makespan = simulate_schedule(jobs, n_jobs)
+    print(f"Total: {len(jobs)} calls, {total_cost / 1e9:.1f} G sample-ops, {total_bytes / 1e9:.2f} GB written")
+    print(f"Projected wall time with {n_jobs} workers: {100 * makespan / max(total_cost, 1):.1f}% of a serial run")
 
 
-def myexecute(cmd):
-    print("'%s'"%cmd)
-    os.system(cmd)
-
 def main():
     parser = argparse.ArgumentParser(description="Script to dedisperse data based on DDplan output")
 
     parser.add_argument('-f', '--fil_file', type= str, help='Filterbank file path ', required=True)
     parser.add_argument('-m', '--mask_file', type= str, help='RFI mask file path ', required=True)
     parser.add_argument('-p', '--parameters_file', type= str, help='DDplan parameters file path ', required=True)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of prepsubband calls run at the same time, <= 0 uses all CPUs (default: 1)')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='Times a failing prepsubband call is retried before giving up (default: 0)')
+    parser.add_argument('--keep_going', action='store_true',
+                        help='Keep running calls that do not depend on a failed one instead of aborting')
+    parser.add_argument('--log_dir', type=str, default=None,
+                        help='Directory for per-call logs (default: <basename>_dedisperse_logs)')
+    parser.add_argument('--dry_run', '--dry-run', action='store_true',
+                        help='Print the calls with their estimated cost and output size, then exit')
+    parser.add_argument('--engine', choices=['presto', 'numpy'], default='presto',
+                        help='Run prepsubband, or dedisperse in-process with NumPy into one DM-time array '
+                             'per DDplan row instead of one .dat file per DM (default: presto)')
+    parser.add_argument('--output_dir', type=str, default=None,
+                        help='Directory for the numpy engine DM-time arrays (default: <basename>_dmt)')
+    parser.add_argument('--search', action='store_true',
+                        help='With the numpy engine, run the boxcar single-pulse search on the DM-time arrays and '
+                             'write the candidates to <output_dir>/<basename>.singlepulse')
+    parser.add_argument('--threshold', type=float, default=5.0,
+                        help='S/N threshold of the single-pulse search (default: 5.0)')
+    parser.add_argument('--queue', type=str, default=None, metavar='DIR',
+                        help='Submit the prepsubband calls to the shared work queue DIR instead of running them; '
+                             'run them with "cluster_queue worker -q DIR" on any node seeing this directory')
+
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    if args.queue and args.engine != 'presto':
+        parser.error('--queue needs --engine presto')
+    with cli_metrics(args):
+        dedisperse(args)
+
 
+def dedisperse(args):
     basename = os.path.splitext(os.path.basename(args.fil_file))[0] # Base name for output files
     rawfiles = args.fil_file # Input filterbank file path
     mask = args.mask_file # RFI mask file path
 
-
-    df = pd.read_csv(args.parameters_file, sep='\s+')
+    df = read_ddplan(args.parameters_file)
     print(df)
     print(df.shape)
 
-    #if the max DM is greater than 1000, output subbands
-    if df["High_DM"].max() > 1000:
-        outsubs = True # By default, do not output subbands
-    else:
-        outsubs = False 
-
-
     nsub = 32 # Number of subbands
 
-    # dDM steps from DDplan.py
-    dDMs        = df["dDM"].tolist()
-    # dsubDM steps
-    dsubDMs     = df["dsubDM"].tolist()
-    # downsample factors
-    downsamps   = df["DownSamp"].tolist()
-    # number of calls per set of subbands
-    subcalls    = df["calls"].tolist()
-    # The low DM for each set of DMs
-    startDMs    = df["Low_DM"].tolist()
-    # DMs/call
-    dmspercalls = df["DM_call"].tolist()
-
-
-    for dDM, dsubDM, dmspercall, downsamp, subcall, startDM in zip(dDMs, dsubDMs, dmspercalls, downsamps, subcalls, startDMs):
-        # Loop over the number of calls
-        for ii in range(subcall):
-            subDM = startDM + (ii+0.5)*dsubDM
-            loDM = startDM + ii*dsubDM
-            if outsubs:
-                # Get our downsampling right
-                subdownsamp = downsamp // 2
-                datdownsamp = 2
-                if downsamp < 2: subdownsamp = datdownsamp = 1
-                # First create the subbands
-                myexecute("prepsubband -sub -subdm %.2f -nsub %d -downsamp %d -o %s %s" %
-                        (subDM, nsub, subdownsamp, basename, rawfiles))
-                # And now create the time series
-                subnames = basename+"_DM%.2f.sub[0-9]*"%subDM
-                myexecute("prepsubband -lodm %.2f -dmstep %.2f -numdms %d -downsamp %d -mask %s -o %s %s -nobary" %
-                        (loDM, dDM, dmspercall, datdownsamp, mask, basename, subnames))
-            else:
-                myexecute("prepsubband -nsub %d -lodm %.2f -dmstep %.2f -numdms %d -downsamp %d -mask %s -o %s %s -nobary" %
-                        (nsub, loDM, dDM, dmspercall, downsamp, mask, basename, rawfiles))
+    # Subbands are created first when the max DM is greater than 1000
+    with stage("plan"):
+        jobs = plan_prepsubband_jobs(df, basename, rawfiles, mask, nsub=nsub)
+    n_jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    # Estimate each call from the filterbank size and start the longest chains first
+    try:
+        with stage("header"):
+            header = read_filterbank_header(rawfiles)
+    except Exception as e:
+        if args.dry_run:
+            sys.exit(f"Cannot read filterbank header of {rawfiles}: {e}")
+        print(f"Cannot read filterbank header ({e}), running calls in plan order")
+    else:
+        print(f"Filterbank: {header['nspectra']} spectra x {header['nchans']} channels, tsamp {header['tsamp']} s")
+        jobs = order_longest_first(estimate_job_costs(jobs, header, nsub=nsub))
+        total_bytes = sum(job["out_bytes"] for job in jobs)
+        free, enough = check_free_space(total_bytes, ".")
+        if not enough:
+            print(f"WARNING: the plan writes about {total_bytes / 1e9:.2f} GB but only "
+                  f"{free / 1e9:.2f} GB is free in {os.getcwd()}")
+        if args.dry_run:
+            print_plan(jobs, n_jobs)
+            return
+
+    if args.engine == "numpy":
+        output_dir = args.output_dir or f"{basename}_dmt"
+        print(f"Dedispersing {rawfiles} in-process with {n_jobs} threads into {output_dir}")
+        with stage("dedisperse") as record:
+            rows = dedisperse_filterbank(rawfiles, df, mask_file=mask, nsub=nsub, output_dir=output_dir, n_jobs=n_jobs)
+            record["rows"] = sum(len(row["dms"]) for row in rows)
+        for k, row in enumerate(rows):
+            print(f"Row {k}: {len(row['dms'])} DMs {row['dms'][0]:.2f}-{row['dms'][-1]:.2f}, "
+                  f"{row['data'].shape[1]} samples of {row['tsamp']:.6g} s")
+        if args.search:
+            with stage("search") as record:
+                candidates = search_dedispersed(rows, threshold=args.threshold)
+                record["rows"] = len(candidates)
+            sp_file = os.path.join(output_dir, f"{basename}.singlepulse")
+            with stage("write", rows=len(candidates)):
+                write_singlepulse(candidates.sort_values(["DM", "Time"]), sp_file)
+            print(f"Saved {len(candidates)} single-pulse candidates to: {sp_file}")
+        return
+
+    log_dir = args.log_dir or f"{basename}_dedisperse_logs"
+    if args.queue:
+        queued = dedisperse_jobs(jobs, basename, log_dir, retries=args.retries)
+        submitted = WorkQueue(args.queue).submit(queued)
+        print(f"Submitted {submitted} prepsubband calls to {args.queue} ({len(queued) - submitted} already queued), "
+              f"logs in {log_dir}")
+        return
+
+    print(f"Running {len(jobs)} prepsubband calls with {n_jobs} workers, logs in {log_dir}")
+    with stage("run_jobs", calls=len(jobs)):
+        results = run_jobs(jobs, n_jobs=n_jobs, retries=args.retries, log_dir=log_dir,
+                           keep_going=args.keep_going)
+
+    counts = {}
+    for result in results.values():
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    print(", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    for name, result in results.items():
+        if result["status"] == "failed":
+            print(f"Failed: {name} (exit code {result['returncode']}, log {result['log']})")
+
+    if counts.get("done", 0) != len(jobs):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Thin client of cluster_service: only the standard library is imported
+import argparse
+import os
+import sys
+from cluster_tools.service import handle_request, request
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send clustering or CSV conversion jobs to a running cluster_service and print the results."
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Socket of the service (default: as cluster_service)."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Seconds to wait for the answer (default: no limit)."
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Run the job in this process when no service is listening, instead of failing."
+    )
+    subparsers = parser.add_subparsers(dest="op", required=True)
+
+    cluster = subparsers.add_parser("cluster", help="Cluster one singlepulse directory, as cluster_dbscan / cluster_hdbscan.")
+    cluster.add_argument("-s", "--single_path", type=str, required=True, help="Path containing .singlepulse files.")
+    cluster.add_argument("-o", "--output", type=str, default="clustered_candidates.singlepulse",
+                         help="Output .singlepulse file (default: clustered_candidates.singlepulse).")
+    cluster.add_argument("-a", "--algorithm", choices=["dbscan", "fof", "hdbscan"], default="dbscan",
+                         help="Clustering algorithm (default: dbscan).")
+    cluster.add_argument("-e", "--eps", type=float, default=0.05, help="eps parameter for DBSCAN and FOF (default: 0.05).")
+    cluster.add_argument("--min_samples", type=int, default=None,
+                         help="min_samples parameter (default: 5 for DBSCAN and FOF, None for HDBSCAN).")
+    cluster.add_argument("--min_cluster_size", type=int, default=5, help="Minimum cluster size for HDBSCAN (default: 5).")
+    cluster.add_argument("--snr", type=float, default=6, help="snr threshold value")
+    cluster.add_argument("-dm", "--dm_threshold", type=float, default=10.0,
+                         help="Minimum DM threshold for candidates to be included in clustering (default: 10.0 pc/cm^3).")
+    cluster.add_argument("-f_low", "--frequency_low", type=float, default=550.0,
+                         help="Lower frequency in MHz (default: 550.0 MHz).")
+    cluster.add_argument("-bw", "--bandwidth", type=float, default=200.0, help="Bandwidth in MHz (default: 200.0 MHz).")
+    cluster.add_argument("--strategy", choices=["auto", "default"], default="auto",
+                         help="Neighbour-search options of DBSCAN and HDBSCAN, see cluster_dbscan (default: auto).")
+    cluster.add_argument("--decimate", type=float, nargs="?", const=4, default=None,
+                         help="DBSCAN only: cluster count-weighted representatives of grid cells of side eps / DECIMATE.")
+    cluster.add_argument("--summary", action="store_true",
+                         help="Also write <output>_summary.csv with the statistics of every cluster.")
+    cluster.add_argument("--no_cache", action="store_true", help="Do not use the binary candidate cache.")
+    cluster.add_argument("--print", action="store_true", help="Print the clustered candidates.")
+
+    convert = subparsers.add_parser("convert", help="Convert .fil and .injinf/.singlepulse files to CSV, as csv_convert.")
+    convert.add_argument("-f", "--fil_file", required=True, nargs="+", help="Paths to input filterbank files")
+    convert.add_argument("-i", "--info_file", required=True, nargs="+", help="Paths to .injinf or .singlepulse files")
+    convert.add_argument("-o", "--output_dir", required=True, help="Directory to save output CSV file")
+    convert.add_argument("-cm", "--channel_mask", type=str, default=None,
+                         help="if you have channel mask files corresponding to filterbank files")
+
+    subparsers.add_parser("ping", help="Check that the service is running.")
+    subparsers.add_parser("stop", help="Stop the service.")
+
+    args = parser.parse_args()
+    if args.op == "cluster":
+        if args.decimate is not None and args.algorithm != "dbscan":
+            parser.error("--decimate needs --algorithm dbscan")
+        # Paths are resolved here: the service runs in its own working directory
+        message = {"op": "cluster", "single_path": os.path.abspath(args.single_path),
+                   "output": os.path.abspath(args.output), "config": {
+            "algorithm": args.algorithm, "eps": args.eps, "min_samples": args.min_samples,
+            "min_cluster_size": args.min_cluster_size, "snr": args.snr, "dm_threshold": args.dm_threshold,
+            "f_low": args.frequency_low, "bandwidth": args.bandwidth, "strategy": args.strategy,
+            "decimate": args.decimate, "summary": args.summary, "cache": not args.no_cache,
+        }}
+    elif args.op == "convert":
+        message = {"op": "convert", "fil_files": [os.path.abspath(f) for f in args.fil_file],
+                   "info_files": [os.path.abspath(f) for f in args.info_file],
+                   "output_dir": os.path.abspath(args.output_dir),
+                   "channel_mask": os.path.abspath(args.channel_mask) if args.channel_mask else None}
+    else:
+        message = {"op": args.op}
+
+    try:
+        response = request(message, socket_path=args.socket, timeout=args.timeout)
+    except ConnectionError as e:
+        if not args.local or args.op not in ("cluster", "convert"):
+            sys.exit(str(e))
+        response = handle_request(message)
+
+    if response["status"] != "ok":
+        sys.exit(f"Error: {response['error']}")
+    result = response["result"]
+    if args.op == "cluster":
+        print(f"Saved {result['n_best']} candidates from {result['n_candidates']} ({result['n_clusters']} clusters) "
+              f"to: {result['output']} in {response['seconds']:.3f} s")
+        if args.print:
+            with open(result["output"]) as fh:
+                sys.stdout.write(fh.read())
+    elif args.op == "convert":
+        print(f"CSV file saved at: {result['output']} ({result['n_candidates']} candidates) "
+              f"in {response['seconds']:.3f} s")
+    elif args.op == "ping":
+        print(f"Service pid {result['pid']} up for {result['uptime']:.0f} s, {result['requests']} requests served")
+    else:
+        print(f"Stopping service pid {result['pid']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+from cluster_tools.service import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep the clustering libraries loaded and answer cluster_client requests on a Unix socket."
+    )
+
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Socket file (default: $CLUSTER_TOOLS_SOCKET, $XDG_RUNTIME_DIR/cluster_tools.sock "
+             "or /tmp/cluster_tools-<uid>.sock)."
+    )
+
+    parser.add_argument(
+        "--no_warm",
+        action="store_true",
+        help="Accept requests at once instead of loading and warming up the clustering libraries first."
+    )
+
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Do not print a line per request."
+    )
+
+    args = parser.parse_args()
+    try:
+        serve(args.socket, warm=not args.no_warm, verbose=not args.quiet)
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import argparse
+from cluster_tools.batch import cluster_batch, expand_observations
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+from cluster_tools.rfi import add_rfi_arguments, rfi_options
+from cluster_tools.workqueue import WorkQueue, cluster_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cluster many singlepulse directories (observations or beams) with one configuration, "
+                    "in parallel, writing one output per directory and an index.csv."
+    )
+
+    parser.add_argument(
+        "-s", "--single_paths",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Directories containing .singlepulse files, or quoted glob patterns such as 'obs*/beam*'."
+    )
+
+    parser.add_argument(
+        "-o", "--output_dir",
+        type=str,
+        default="clustered",
+        help="Directory for <name>.singlepulse per directory and index.csv (default: clustered)."
+    )
+
+    parser.add_argument(
+        "-a", "--algorithm",
+        choices=["dbscan", "fof", "hdbscan"],
+        default="dbscan",
+        help="Clustering algorithm (default: dbscan)."
+    )
+
+    parser.add_argument(
+        "-e", "--eps",
+        type=float,
+        default=0.05,
+        help="eps parameter for DBSCAN and FOF (default: 0.05)."
+    )
+
+    parser.add_argument(
+        "--min_samples",
+        type=int,
+        default=None,
+        help="min_samples parameter (default: 5 for DBSCAN and FOF, None for HDBSCAN)."
+    )
+
+    parser.add_argument(
+        "--min_cluster_size",
+        type=int,
+        default=5,
+        help="Minimum cluster size for HDBSCAN (default: 5)."
+    )
+
+    parser.add_argument(
+        "--snr",
+        type=float,
+        default=6,
+        help="snr threshold value"
+    )
+
+    parser.add_argument(
+        "-dm", "--dm_threshold",
+        type=float,
+        default=10.0,
+        help="Minimum DM threshold for candidates to be included in clustering (default: 10.0 pc/cm^3)."
+    )
+
+    parser.add_argument(
+        "-f_low", "--frequency_low",
+        type=float,
+        default=550.0,
+        help="Lower frequency in MHz (default: 550.0 MHz)."
+    )
+
+    parser.add_argument(
+        "-bw", "--bandwidth",
+        type=float,
+        default=200.0,
+        help="Bandwidth in MHz (default: 200.0 MHz)."
+    )
+
+    parser.add_argument(
+        "--strategy",
+        choices=["auto", "default"],
+        default="auto",
+        help="Neighbour-search options of DBSCAN and HDBSCAN, see cluster_dbscan (default: auto)."
+    )
+
+    parser.add_argument(
+        "--decimate",
+        type=float,
+        nargs="?",
+        const=4,
+        default=None,
+        help="DBSCAN only: cluster count-weighted representatives of grid cells of side eps / DECIMATE (default: off; 4 if given without a value)."
+    )
+
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help="Also write <name>_summary.csv with the statistics of every cluster."
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of directories clustered at once in worker processes, <= 0 uses all CPUs (default: 1)."
+    )
+
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Do not read or update the binary candidate cache kept in each <single_path>/.singlepulse_cache."
+    )
+
+    parser.add_argument(
+        "--queue",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Submit one job per directory to the shared work queue DIR instead of clustering here; "
+             "run them with 'cluster_queue worker -q DIR' on any node."
+    )
+
+    add_rfi_arguments(parser, report=False)
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    if args.decimate is not None and args.algorithm != "dbscan":
+        parser.error("--decimate needs --algorithm dbscan")
+
+    paths = expand_observations(args.single_paths)
+    if not paths:
+        parser.error("no directories match --single_paths")
+
+    config = {
+        "algorithm": args.algorithm,
+        "eps": args.eps,
+        "min_samples": args.min_samples,
+        "min_cluster_size": args.min_cluster_size,
+        "snr": args.snr,
+        "dm_threshold": args.dm_threshold,
+        "f_low": args.frequency_low,
+        "bandwidth": args.bandwidth,
+        "strategy": args.strategy,
+        "decimate": args.decimate,
+        "rfi_veto": rfi_options(args),
+        "summary": args.summary,
+        "cache": not args.no_cache,
+    }
+
+    if args.queue:
+        jobs = cluster_jobs(paths, args.output_dir, config=config)
+        submitted = WorkQueue(args.queue).submit(jobs)
+        print(f"Submitted {submitted} clustering jobs to {args.queue} ({len(jobs) - submitted} already queued)")
+        return
+
+    with cli_metrics(args):
+        print(f"Clustering {len(paths)} directories with {args.algorithm}")
+        with stage("batch", observations=len(paths)) as record:
+            index = cluster_batch(paths, args.output_dir, config=config, n_jobs=args.jobs)
+            record["rows"] = int(index["n_candidates"].sum())
+
+        failed = index[index["status"] != "ok"]
+        print(f"Saved {int(index['n_best'].sum())} candidates from {len(index) - len(failed)} directories "
+              f"to: {args.output_dir} (index: {args.output_dir}/index.csv)")
+        for row in failed.itertuples():
+            print(f"Failed: {row.observation} ({row.error})")
+
+    if len(failed):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@
 import pandas as pd
 import argparse
 import os
-from cluster_tools.io import DM_delay, load_singlepulse
-from cluster_tools.clustering import DBSCAN_clustering
+from cluster_tools.io import load_filtered_singlepulse
+from cluster_tools.output import STORE_EXTENSIONS, write_candidates, write_singlepulse
+from cluster_tools.clustering import dbscan_labels, fof_labels, cluster_summary
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+from cluster_tools.rfi import add_rfi_arguments, cli_rfi_veto
 
 def main():
     parser = argparse.ArgumentParser(
@@ -68,62 +71,141 @@ def main():
 
     parser.add_argument(
         "--store_all",
-        action="store_true",
-        help="Store all candidates with their cluster labels in an output file (default: only highest SNR per cluster)."
+        nargs="?",
+        const="csv",
+        choices=["csv", "npz", "hdf5", "parquet"],
+        help="Store all candidates with their cluster labels in an output file, as CSV or a memory-mappable "
+             "npz/hdf5/parquet table (default: only highest SNR per cluster; csv if no format is given)."
     )
 
-    args = parser.parse_args()
-
-    df_all = load_singlepulse(args.single_path, verbose=True)
-    print(f"Total candidates: {len(df_all)}")
-  
-    # Calculate dispersion delay
-    df_all["Delay_s"] = DM_delay(df_all["DM"], args.frequency_low, args.bandwidth)
-
-    # Filtring candidates 
-    df_all = df_all[df_all["DM"] >= args.dm_threshold]
-    print(f"Candidates after DM >= {args.dm_threshold} filter: {len(df_all)}")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of parallel workers used to parse .singlepulse files, cluster Time tiles and run the neighbour queries of a single fit, <= 0 uses all CPUs (default: 1)."
+    )
 
-    # DBSCAN clustering
-    df_all = DBSCAN_clustering(
-        df_all,
-        cluster_column=["Delay_s", "Time"],
-        eps=args.eps,
-        min_samples=args.min_samples,
-        verbose=True
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Do not read or update the binary candidate cache kept in <single_path>/.singlepulse_cache."
     )
 
-    if args.store_all:
-        df_all.to_csv(f"all_candidates_with_clusters_eps{args.eps}_min_samples{args.min_samples}.csv", index=False)
-        print(f"Saved all candidates with cluster labels to: all_candidates_with_clusters_eps{args.eps}_min_samples{args.min_samples}.csv")
-    
-    # Filter out noise (-1)
-    df_clusters = df_all[df_all["cluster"] != -1]
+    parser.add_argument(
+        "--tiles",
+        type=int,
+        default=1,
+        help="Split candidates into this many overlapping Time tiles clustered in parallel (default: 1, single fit). Results match a single fit when tiles overlap by at least 2 * eps."
+    )
 
-    # Keep highest-SNR candidate from each cluster
-    idx = df_clusters.groupby("cluster")["Sigma"].idxmax()
-    df_best = df_clusters.loc[idx].reset_index(drop=True)
+    parser.add_argument(
+        "--tile_overlap",
+        type=float,
+        default=None,
+        help="Time overlap between tiles in seconds (default: 2 * eps)."
+    )
 
-    # Filter by SNR
-    df_best = df_best[df_best["Sigma"] > args.snr] 
-    print(f"Candidates after SNR > {args.snr} filter: {len(df_best)}") 
+    parser.add_argument(
+        "--backend",
+        choices=["sklearn", "fof"],
+        default="sklearn",
+        help="Clustering backend: sklearn DBSCAN or the grid-hashed friends-of-friends, which gives identical labels (default: sklearn)."
+    )
 
-    # Sort by Time
-    df_best = df_best.sort_values("Time").reset_index(drop=True)
+    parser.add_argument(
+        "--strategy",
+        choices=["auto", "default"],
+        default="auto",
+        help="Neighbour search of the sklearn backend: 'auto' picks the tree and leaf size from the candidate count and dimensions, 'default' keeps sklearn's; labels are the same (default: auto)."
+    )
 
-    # Save output file
-    output_file = args.output
-    if not output_file.endswith(".singlepulse"):
-        output_file += ".singlepulse"
+    parser.add_argument(
+        "--decimate",
+        type=float,
+        nargs="?",
+        const=4,
+        default=None,
+        help="Before clustering, merge candidates into grid cells of side eps / DECIMATE and cluster one count-weighted representative per cell, then label every candidate by its cell (default: off; 4 if given without a value)."
+    )
 
-    with open(output_file, "w") as f:
-        f.write("# DM      Sigma      Time (s)     Sample    Downfact\n")
-        df_best[["DM", "Sigma", "Time", "Sample", "Downfact"]].to_string(
-            f, index=False, header=False, float_format="%.8f"
-        )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default=None,
+        help="Write a CSV with one row per cluster: best candidate, member count, DM and Time ranges, SNR-weighted centroid and max Downfact."
+    )
 
-    print(f"Saved candidates to: {output_file}")
+    add_rfi_arguments(parser)
+    add_metrics_arguments(parser)
 
+    args = parser.parse_args()
+    if args.decimate is not None and args.backend == "fof":
+        parser.error("--decimate needs the sklearn backend")
+
+    with cli_metrics(args):
+        # Stream candidates, applying the DM filter and dispersion delay per chunk;
+        # with the RFI veto the DM filter waits until storms peaking at low DM are found
+        with stage("load"):
+            df_all = load_filtered_singlepulse(
+                args.single_path,
+                f_low=args.frequency_low,
+                BW=args.bandwidth,
+                dm_min=None if args.rfi_veto else args.dm_threshold,
+                n_jobs=args.jobs,
+                cache=not args.no_cache,
+                verbose=True
+            )
+        print(f"Total candidates: {df_all.attrs['rows_read']}")
+        df_all = cli_rfi_veto(args, df_all, dm_min=args.dm_threshold)
+        print(f"Candidates after DM >= {args.dm_threshold} filter: {len(df_all)}")
+
+        # DBSCAN clustering, labels written straight into df_all
+        with stage("cluster", rows=len(df_all), backend=args.backend):
+            clustering = fof_labels if args.backend == "fof" else dbscan_labels
+            options = {} if args.backend == "fof" else {"strategy": args.strategy, "decimate": args.decimate}
+            clustering(
+                df_all,
+                cluster_column=["Delay_s", "Time"],
+                inplace=True,
+                eps=args.eps,
+                min_samples=args.min_samples,
+                verbose=True,
+                n_tiles=args.tiles,
+                n_jobs=args.jobs,
+                tile_overlap=args.tile_overlap,
+                **options
+            )
+
+        if args.store_all:
+            with stage("store_all", rows=len(df_all), format=args.store_all):
+                all_file = f"all_candidates_with_clusters_eps{args.eps}_min_samples{args.min_samples}.{STORE_EXTENSIONS[args.store_all]}"
+                write_candidates(df_all, all_file, fmt=args.store_all)
+            print(f"Saved all candidates with cluster labels to: {all_file}")
+
+        # Highest-SNR candidate and statistics of each cluster (noise excluded)
+        with stage("summary") as record:
+            df_summary = cluster_summary(df_all)
+            record["rows"] = len(df_summary)
+            if args.summary:
+                df_summary.to_csv(args.summary, index=False)
+                print(f"Saved cluster summary to: {args.summary}")
+
+        # Filter by SNR
+        df_best = df_summary[df_summary["Sigma"] > args.snr]
+        print(f"Candidates after SNR > {args.snr} filter: {len(df_best)}") 
+
+        # Sort by Time
+        df_best = df_best.sort_values("Time").reset_index(drop=True)
+
+        # Save output file
+        output_file = args.output
+        if not output_file.endswith(".singlepulse"):
+            output_file += ".singlepulse"
+
+        with stage("write", rows=len(df_best)):
+            write_singlepulse(df_best, output_file)
+
+        print(f"Saved candidates to: {output_file}")
 
 if __name__ == "__main__":
     main()
@@ -2,8 +2,11 @@
 import pandas as pd
 import argparse
 import os
-from cluster_tools.io import DM_delay, load_singlepulse
-from cluster_tools.clustering import HDBSCAN_clustering
+from cluster_tools.io import load_filtered_singlepulse
+from cluster_tools.output import STORE_EXTENSIONS, write_candidates, write_singlepulse
+from cluster_tools.clustering import hdbscan_labels, cluster_summary
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+from cluster_tools.rfi import add_rfi_arguments, cli_rfi_veto
 
 
 def main():
@@ -69,62 +72,129 @@ def main():
 
     parser.add_argument(
         "--store_all",
+        nargs="?",
+        const="csv",
+        choices=["csv", "npz", "hdf5", "parquet"],
+        help="Store all candidates with their cluster labels in an output file, as CSV or a memory-mappable "
+             "npz/hdf5/parquet table (default: only highest SNR per cluster; csv if no format is given)."
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of parallel workers used to parse .singlepulse files, cluster Time tiles and run the neighbour queries of a single fit, <= 0 uses all CPUs (default: 1)."
+    )
+
+    parser.add_argument(
+        "--no_cache",
         action="store_true",
-        help="Store all candidates with their cluster labels in an output file (default: only highest SNR per cluster)."
+        help="Do not read or update the binary candidate cache kept in <single_path>/.singlepulse_cache."
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--tiles",
+        type=int,
+        default=1,
+        help="Split candidates into this many overlapping Time tiles clustered in parallel (default: 1, single fit). Clusters meeting in a tile overlap are merged, which approximates a single fit."
+    )
+
+    parser.add_argument(
+        "--tile_overlap",
+        type=float,
+        default=None,
+        help="Time overlap between tiles in seconds (default: full Delay_s sweep of the candidates)."
+    )
 
-    df_all = load_singlepulse(args.single_path, verbose=True)
-    print(f"Total candidates: {len(df_all)}")
-  
-    # Calculate dispersion delay
-    df_all["Delay_s"] = DM_delay(df_all["DM"], args.frequency_low, args.bandwidth)
-   
-    # Filter candidates based on DM threshold
-    df_all = df_all[df_all["DM"] >= args.dm_threshold]
-    print(f"Candidates after DM >= {args.dm_threshold} filter: {len(df_all)}")
-    
-    # Perform HDBSCAN clustering
-    df_all = HDBSCAN_clustering(
-        df_all,
-        cluster_column=["Delay_s", "Time"],
-        min_cluster_size=args.min_cluster_size,
-        min_samples=args.min_samples,
-        verbose=True
-    )
-
-    if args.store_all:
-        df_all.to_csv(f"all_candidates_with_clusters_min_cluster_size{args.min_cluster_size}_min_samples{args.min_samples}.csv", index=False)
-        print(f"Saved all candidates with cluster labels to: all_candidates_with_clusters_min_cluster_size{args.min_cluster_size}_min_samples{args.min_samples}.csv")
-    
-    # Filter out noise (-1)
-    df_clusters = df_all[df_all["cluster"] != -1]
-
-    # Keep highest-SNR candidate from each cluster
-    idx = df_clusters.groupby("cluster")["Sigma"].idxmax()
-    df_best = df_clusters.loc[idx].reset_index(drop=True)
-
-    # Filter by SNR
-    df_best = df_best[df_best["Sigma"] > args.snr] 
-    print(f"Candidates after SNR > {args.snr} filter: {len(df_best)}") 
-
-    # Sort by Time
-    df_best = df_best.sort_values("Time").reset_index(drop=True)
-    
-    # Save output file
-    output_file = args.output
-    if not output_file.endswith(".singlepulse"):
-        output_file += ".singlepulse"
-
-    with open(output_file, "w") as f:
-        f.write("# DM      Sigma      Time (s)     Sample    Downfact\n")
-        df_best[["DM", "Sigma", "Time", "Sample", "Downfact"]].to_string(
-            f, index=False, header=False, float_format="%.8f"
-        )
-
-    print(f"Saved candidates to: {output_file}")
+    parser.add_argument(
+        "--strategy",
+        choices=["auto", "default"],
+        default="auto",
+        help="Tree, leaf size and spanning-tree options of HDBSCAN: 'auto' picks them from the candidate count and dimensions, 'default' keeps hdbscan's (default: auto)."
+    )
+
+    parser.add_argument(
+        "--core_dist_jobs",
+        type=int,
+        default=None,
+        help="Workers computing core distances in a single fit, <= 0 uses all CPUs (default: --jobs)."
+    )
+
+    parser.add_argument(
+        "--summary",
+        type=str,
+        default=None,
+        help="Write a CSV with one row per cluster: best candidate, member count, DM and Time ranges, SNR-weighted centroid and max Downfact."
+    )
+
+    add_rfi_arguments(parser)
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
 
+    with cli_metrics(args):
+        # Stream candidates, applying the DM filter and dispersion delay per chunk;
+        # with the RFI veto the DM filter waits until storms peaking at low DM are found
+        with stage("load"):
+            df_all = load_filtered_singlepulse(
+                args.single_path,
+                f_low=args.frequency_low,
+                BW=args.bandwidth,
+                dm_min=None if args.rfi_veto else args.dm_threshold,
+                n_jobs=args.jobs,
+                cache=not args.no_cache,
+                verbose=True
+            )
+        print(f"Total candidates: {df_all.attrs['rows_read']}")
+        df_all = cli_rfi_veto(args, df_all, dm_min=args.dm_threshold)
+        print(f"Candidates after DM >= {args.dm_threshold} filter: {len(df_all)}")
+
+        # Perform HDBSCAN clustering
+        with stage("cluster", rows=len(df_all)):
+            hdbscan_labels(
+                df_all,
+                cluster_column=["Delay_s", "Time"],
+                inplace=True,
+                min_cluster_size=args.min_cluster_size,
+                min_samples=args.min_samples,
+                verbose=True,
+                n_tiles=args.tiles,
+                n_jobs=args.jobs,
+                tile_overlap=args.tile_overlap,
+                strategy=args.strategy,
+                core_dist_n_jobs=args.core_dist_jobs
+            )
+
+        if args.store_all:
+            with stage("store_all", rows=len(df_all), format=args.store_all):
+                all_file = f"all_candidates_with_clusters_min_cluster_size{args.min_cluster_size}_min_samples{args.min_samples}.{STORE_EXTENSIONS[args.store_all]}"
+                write_candidates(df_all, all_file, fmt=args.store_all)
+            print(f"Saved all candidates with cluster labels to: {all_file}")
+
+        # Highest-SNR candidate and statistics of each cluster (noise excluded)
+        with stage("summary") as record:
+            df_summary = cluster_summary(df_all)
+            record["rows"] = len(df_summary)
+            if args.summary:
+                df_summary.to_csv(args.summary, index=False)
+                print(f"Saved cluster summary to: {args.summary}")
+
+        # Filter by SNR
+        df_best = df_summary[df_summary["Sigma"] > args.snr]
+        print(f"Candidates after SNR > {args.snr} filter: {len(df_best)}") 
+
+        # Sort by Time
+        df_best = df_best.sort_values("Time").reset_index(drop=True)
+
+        # Save output file
+        output_file = args.output
+        if not output_file.endswith(".singlepulse"):
+            output_file += ".singlepulse"
+
+        with stage("write", rows=len(df_best)):
+            write_singlepulse(df_best, output_file)
+
+        print(f"Saved candidates to: {output_file}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+import argparse
+import signal
+import time
+import numpy as np
+import pandas as pd
+from cluster_tools.io import DM_delay, SinglepulseWatcher, SINGLEPULSE_COLUMNS
+from cluster_tools.clustering import cluster_summary
+from cluster_tools.online import DMProgress, OnlineDBSCAN
+from cluster_tools.output import SINGLEPULSE_HEADER, write_singlepulse
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+
+
+def write_best(output_file, df_final, snr):
+    # Append the highest-SNR candidate of each finalized cluster
+    if len(df_final) == 0:
+        return 0
+    df_best = cluster_summary(df_final)
+    df_best = df_best[df_best["Sigma"] > snr].sort_values("Time")
+    if len(df_best) == 0:
+        return 0
+    return write_singlepulse(df_best, output_file, append=True)
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cluster single-pulse candidates with DBSCAN as .singlepulse files arrive."
+    )
+
+    parser.add_argument(
+        "-s", "--single_path",
+        type=str,
+        required=True,
+        help="Path watched for .singlepulse files."
+    )
+
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        default="clustered_candidates.singlepulse",
+        help="Output .singlepulse file, appended with the highest SNR candidate of each cluster once it is final (default: clustered_candidates.singlepulse)."
+    )
+
+    parser.add_argument(
+        "-e", "--eps",
+        type=float,
+        default=0.05,
+        help="eps parameter for DBSCAN (default: 0.05)."
+    )
+
+    parser.add_argument(
+        "--min_samples",
+        type=int,
+        default=5,
+        help="min_samples parameter for DBSCAN (default: 5)."
+    )
+
+    parser.add_argument(
+        "--snr",
+        type=float,
+        default=6,
+        help="snr threshold value"
+    )
+
+    parser.add_argument(
+        "-dm", "--dm_threshold",
+        type=float,
+        default=10.0,
+        help="Minimum DM threshold for candidates to be included in clustering (default: 10.0 pc/cm^3)."
+    )
+
+    parser.add_argument(
+        "-f_low", "--frequency_low",
+        type=float,
+        default=550.0,
+        help="Lower frequency in MHz (default: 550.0 MHz)."
+    )
+
+    parser.add_argument(
+        "-bw", "--bandwidth",
+        type=float,
+        default=200.0,
+        help="Bandwidth in MHz (default: 200.0 MHz)."
+    )
+
+    parser.add_argument(
+        "--backend",
+        choices=["sklearn", "fof"],
+        default="sklearn",
+        help="Clustering backend: sklearn DBSCAN or the grid-hashed friends-of-friends (default: sklearn)."
+    )
+
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=5.0,
+        help="Seconds between directory scans (default: 5.0)."
+    )
+
+    parser.add_argument(
+        "--n_dms",
+        type=int,
+        default=None,
+        help="Number of DM trials searched. Clusters are written as soon as every trial has been searched "
+             "past them; without it they are written when the watcher stops (default: unknown)."
+    )
+
+    parser.add_argument(
+        "--n_files",
+        type=int,
+        default=None,
+        help="Number of .singlepulse files expected. Once that many have been read, all clusters are "
+             "written and the watcher exits (default: watch until stopped)."
+    )
+
+    parser.add_argument(
+        "--settle_time",
+        type=float,
+        default=0.0,
+        help="Extra margin (in seconds of candidate Time) behind the time every DM trial has been searched "
+             "to before clusters are final (default: 0)."
+    )
+
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Ingest the files present now, write all clusters and exit."
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of parallel workers used to parse .singlepulse files, <= 0 uses all CPUs (default: 1)."
+    )
+
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    with cli_metrics(args) as metrics:
+        output_file = args.output
+        if not output_file.endswith(".singlepulse"):
+            output_file += ".singlepulse"
+        with open(output_file, "w") as f:
+            f.write(SINGLEPULSE_HEADER)
+
+        # Treat SIGTERM like Ctrl-C so open clusters are still written on shutdown
+        signal.signal(signal.SIGTERM, _stop)
+
+        clusterer = OnlineDBSCAN(eps=args.eps, min_samples=args.min_samples, backend=args.backend)
+        watcher = SinglepulseWatcher(args.single_path, n_jobs=args.jobs)
+        progress = DMProgress(args.n_dms)
+        n_written = 0
+
+        try:
+            while True:
+                blocks = []
+                with stage("parse") as record:
+                    # A file is read once its size and mtime are unchanged between scans
+                    results, changed = watcher.read_new(complete=args.once)
+                    for f in changed:
+                        print(f"Ignoring change to already ingested file: {f}")
+                    for f, data, err in results:
+                        if err is not None:
+                            print(f"Skipped {f}: {err}")
+                            progress.update(f, [])
+                            continue
+                        progress.update(f, data[:, 2])
+                        blocks.append(data[data[:, 0] >= args.dm_threshold])
+                    record["files"] = len(results)
+                    record["rows"] = sum(len(block) for block in blocks)
+                ready = [f for f, _, _ in results]
+
+                # Everything that arrived in this scan is clustered as one batch
+                n_new = n_reclustered = 0
+                if blocks:
+                    batch = pd.DataFrame(np.concatenate(blocks), columns=SINGLEPULSE_COLUMNS)
+                    batch["Delay_s"] = DM_delay(batch["DM"], args.frequency_low, args.bandwidth)
+                    n_new = len(batch)
+                    with stage("cluster", rows=n_new):
+                        n_reclustered = clusterer.add(batch)
+
+                # All clusters are written below once no more files are expected
+                if args.once or (args.n_files is not None and len(watcher.ingested) >= args.n_files):
+                    break
+
+                with stage("write") as record:
+                    n_best = write_best(output_file, clusterer.finalize(progress.watermark() - args.settle_time),
+                                        args.snr)
+                    record["rows"] = n_best
+                n_written += n_best
+                if ready:
+                    print(f"Ingested {len(ready)} files ({n_new} candidates), re-clustered {n_reclustered}, "
+                          f"wrote {n_best} final candidates, {len(clusterer)} held")
+                    # Keep the metrics file current while the watcher runs
+                    if metrics is not None and args.metrics:
+                        metrics.write(args.metrics)
+
+                time.sleep(args.poll)
+        except KeyboardInterrupt:
+            print("Stopping, writing remaining clusters...")
+        finally:
+            watcher.close()
+
+        with stage("write") as record:
+            record["rows"] = write_best(output_file, clusterer.finalize(), args.snr)
+        n_written += record["rows"]
+        if clusterer.n_late:
+            print(f"{clusterer.n_late} candidates arrived after their time window was final; "
+                  f"they could not join clusters already written.")
+        print(f"Saved {n_written} candidates to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import argparse
+from cluster_tools.io import load_filtered_singlepulse
+from cluster_tools.sweep import DBSCAN_sweep, HDBSCAN_sweep
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+
+
+def _optional_int(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate DBSCAN or HDBSCAN clustering over a grid of parameters in one pass."
+    )
+
+    parser.add_argument(
+        "-s", "--single_path",
+        type=str,
+        required=True,
+        help="Path containing .singlepulse files."
+    )
+
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        default="cluster_sweep.csv",
+        help="Output CSV table with one row per parameter setting (default: cluster_sweep.csv)."
+    )
+
+    parser.add_argument(
+        "-a", "--algorithm",
+        choices=["dbscan", "hdbscan"],
+        default="dbscan",
+        help="Clustering algorithm to sweep (default: dbscan)."
+    )
+
+    parser.add_argument(
+        "-e", "--eps",
+        type=float,
+        nargs="+",
+        default=[0.01, 0.02, 0.05, 0.1],
+        help="eps values for DBSCAN (default: 0.01 0.02 0.05 0.1)."
+    )
+
+    parser.add_argument(
+        "--min_samples",
+        type=_optional_int,
+        nargs="+",
+        default=None,
+        help="min_samples values; 'none' (HDBSCAN only) follows min_cluster_size but rebuilds the tree for every "
+             "setting (default: 3 5 10 for DBSCAN, 5 for HDBSCAN)."
+    )
+
+    parser.add_argument(
+        "--min_cluster_size",
+        type=int,
+        nargs="+",
+        default=[3, 5, 10, 20],
+        help="min_cluster_size values for HDBSCAN (default: 3 5 10 20)."
+    )
+
+    parser.add_argument(
+        "--snr",
+        type=float,
+        default=6,
+        help="snr threshold applied to the best candidate of each cluster"
+    )
+
+    parser.add_argument(
+        "-dm", "--dm_threshold",
+        type=float,
+        default=10.0,
+        help="Minimum DM threshold for candidates to be included in clustering (default: 10.0 pc/cm^3)."
+    )
+
+    parser.add_argument(
+        "-f_low", "--frequency_low",
+        type=float,
+        default=550.0,
+        help="Lower frequency in MHz (default: 550.0 MHz)."
+    )
+
+    parser.add_argument(
+        "-bw", "--bandwidth",
+        type=float,
+        default=200.0,
+        help="Bandwidth in MHz (default: 200.0 MHz)."
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of parallel workers used to parse .singlepulse files and run the neighbour queries, <= 0 uses all CPUs (default: 1)."
+    )
+
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Do not read or update the binary candidate cache kept in <single_path>/.singlepulse_cache."
+    )
+
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    if args.algorithm == "dbscan" and args.min_samples is not None and None in args.min_samples:
+        parser.error("--min_samples none needs --algorithm hdbscan")
+
+    with cli_metrics(args):
+        with stage("load"):
+            df_all = load_filtered_singlepulse(
+                args.single_path,
+                f_low=args.frequency_low,
+                BW=args.bandwidth,
+                dm_min=args.dm_threshold,
+                n_jobs=args.jobs,
+                cache=not args.no_cache,
+                verbose=True
+            )
+        print(f"Total candidates: {df_all.attrs['rows_read']}")
+        print(f"Candidates after DM >= {args.dm_threshold} filter: {len(df_all)}")
+
+        with stage("sweep", rows=len(df_all), algorithm=args.algorithm) as record:
+            if args.algorithm == "dbscan":
+                table = DBSCAN_sweep(
+                    df_all,
+                    cluster_column=["Delay_s", "Time"],
+                    eps_values=args.eps,
+                    min_samples_values=args.min_samples or [3, 5, 10],
+                    snr=args.snr,
+                    n_jobs=args.jobs
+                )
+            else:
+                table = HDBSCAN_sweep(
+                    df_all,
+                    cluster_column=["Delay_s", "Time"],
+                    min_cluster_size_values=args.min_cluster_size,
+                    min_samples_values=args.min_samples or [5],
+                    snr=args.snr,
+                    n_jobs=args.jobs
+                )
+            record["settings"] = len(table)
+
+        print(table.to_string(index=False))
+        with stage("write", rows=len(table)):
+            table.to_csv(args.output, index=False)
+        print(f"Saved sweep table to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,51 @@
 
 import argparse
 import os
-import your
+from collections import deque
 import pandas as pd
 import numpy as np
+from cluster_tools.io import _make_pool, _n_workers
+from cluster_tools.filterbank import default_header_cache, read_filterbank_headers
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+
+
+def convert_pair(fil_file, info_file, tsamp, extension, chan_mask_path=None):
+    # Candidate rows of one filterbank / info file pair
+    info_df = pd.read_csv(info_file, sep=r'\s+')
+
+    # Extract data
+    DM = info_df.iloc[:, 0].values
+    snr = info_df.iloc[:, 1].values
+    stime = info_df.iloc[:, 2].values
+    width_time = info_df.iloc[:, 3].values
+    width_in_samp = info_df.iloc[:, 4].values
+    label = np.zeros(len(DM), dtype=int) # Placeholder for label column
+
+    # Width as log2 of the width in samples, truncated like int()
+    if extension == '.injinf':
+        width_samp = width_time / tsamp # converting sample width from sec to samples
+    else:
+        width_samp = width_in_samp
+    width_samp = np.asarray(width_samp, dtype=np.float64)
+    invalid = ~(np.isfinite(width_samp) & (width_samp > 0))
+    if invalid.any():
+        row = np.flatnonzero(invalid)[0]
+        raise ValueError(f"{info_file}: {invalid.sum()} candidates have a zero, negative or non-finite width "
+                         f"(first in data row {row + 1}: {width_samp[row]} samples)")
+    width = np.log2(width_samp).astype(int)
+
+    return pd.DataFrame({
+        "file": [fil_file] * len(DM),
+        "snr": snr,
+        "width": width,
+        "dm": DM,
+        "label": label,
+        "stime": stime,
+        "chan_mask_path": chan_mask_path,
+        "num_files": 1
+    })
+
+
 def main():
 
     parser = argparse.ArgumentParser(description="Convert .fil and .injinf/.singlepulse files to CSV file for candidate h5 files.")
@@ -12,20 +54,43 @@ def main():
     parser.add_argument("-i", "--info_file", required=True, nargs='+', help="Paths to .injinf or .singlepulse files")
     parser.add_argument("-o", "--output_dir", required=True, help="Directory to save output CSV file")
     parser.add_argument("-cm","--channel_mask", type=str, default=None, help="if you have channel mask files corresponding to filterbank files")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of worker processes converting file pairs, <= 0 uses all CPUs (default: 1)")
+    parser.add_argument("--header_cache", type=str, default=None,
+                        help="JSON file caching filterbank headers by path, size and mtime "
+                             "(default: ~/.cache/cluster_tools/filterbank_headers.json)")
+    parser.add_argument("--no_header_cache", action="store_true",
+                        help="Read every filterbank header instead of using the header cache")
+
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
 
     # Resolve paths
     fil_files = [os.path.abspath(f) for f in args.fil_file]
     info_files = [os.path.abspath(f) for f in args.info_file]
-    output_dir = os.path.abspath(args.output_dir)
+    extension, csv_file_path = output_path(fil_files, info_files, args.output_dir)
+
+    n_workers = _n_workers(args.jobs)
+    pool = _make_pool(n_workers, backend="process")
+    try:
+        with cli_metrics(args):
+            convert(args, fil_files, info_files, extension, csv_file_path, pool, n_workers)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def output_path(fil_files, info_files, output_dir):
+    # Check the inputs, create output_dir and return (info extension, CSV path)
+    output_dir = os.path.abspath(output_dir)
 
     #checking input file extension
     name, extension = os.path.splitext(os.path.basename(info_files[0]))
     if extension not in ['.injinf', '.singlepulse']:
         raise ValueError("Info files must have .injinf or .singlepulse extension.")
-    
-    
+
+
     # Sanity check
     if len(fil_files) != len(info_files):
         raise ValueError("Number of .fil and .injinf files must be equal.")
@@ -40,55 +105,43 @@ def main():
         csv_file_path = os.path.join(output_dir, base_name + "combined" + ".csv")
     else:
         csv_file_path = os.path.join(output_dir, base_name + ".csv")
-
-    dataframes = []
-
-    for fil_file, info_file in zip(fil_files, info_files):
+    return extension, csv_file_path
+
+
+def convert(args, fil_files, info_files, extension, csv_file_path, pool=None, n_workers=1):
+    # Only tsamp is needed from each filterbank, and it rarely changes between runs
+    with stage("headers", files=len(fil_files)):
+        cache_file = None if args.no_header_cache else (args.header_cache or default_header_cache())
+        headers = read_filterbank_headers(fil_files, cache_file=cache_file, pool=pool)
+
+    # Pairs are converted in the pool and appended in input order as they
+    # finish, with at most 2 * n_workers in flight so memory stays flat
+    pending = deque()
+    n_rows = 0
+    first = True
+    pairs = iter(zip(fil_files, info_files))
+    while True:
+        for fil_file, info_file in pairs:
+            call = (fil_file, info_file, headers[fil_file]["tsamp"], extension, args.channel_mask)
+            pending.append((fil_file, info_file, pool.submit(convert_pair, *call) if pool is not None else call))
+            if len(pending) >= 2 * n_workers:
+                break
+        if not pending:
+            break
+        fil_file, info_file, result = pending.popleft()
         print(f"Processing filterbank file : {fil_file}")
         print(f"With info file : {info_file}")
+        with stage("convert") as record:
+            df = result.result() if pool is not None else convert_pair(*result)
+            record["rows"] = len(df)
+        with stage("write", rows=len(df)):
+            df.to_csv(csv_file_path, index=False, mode="w" if first else "a", header=first)
+        first = False
+        n_rows += len(df)
+
+    print(f"CSV file saved at: {csv_file_path} ({n_rows} candidates)")
+    return n_rows
 
-        # Load .injinf file
-        info_df = pd.read_csv(info_file, sep='\s+')
-
-        # Extract data
-        DM = info_df.iloc[:, 0].values 
-        snr = info_df.iloc[:, 1].values
-        stime = info_df.iloc[:, 2].values
-        width_time = info_df.iloc[:, 3].values
-        width_in_samp = info_df.iloc[:, 4].values
-        label = np.zeros(len(DM), dtype=int) # Placeholder for label column
-        chan_mask_path = args.channel_mask 
-        # Process .fil file
-        your_object = your.Your(fil_file)
-        tsamp = your_object.your_header.tsamp
-        width_samp = (width_time / tsamp) #converting sample width from sec to samples 
-        
-
-
-        if extension == '.injinf':
-            width = np.array([int(np.log2(i)) for i in width_samp])
-        else:
-            width = np.array([int(np.log2(i)) for i in width_in_samp])
-
-            
-        df = pd.DataFrame({
-            "file": [fil_file] * len(DM),
-            "snr": snr,
-            "width": width,
-            "dm": DM,
-            "label": label,
-            "stime": stime,
-            "chan_mask_path": chan_mask_path,
-            "num_files": 1
-        })
-
-        dataframes.append(df)
-
-    # Combine and save
-    final_df = pd.concat(dataframes, ignore_index=True)
-    final_df.to_csv(csv_file_path, index=False)
-
-    print(f"CSV file saved at: {csv_file_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import argparse
+import os
+from cluster_tools.cutouts import read_cutout_candidates, make_cutouts
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics, stage
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write dedispersed freq-time and DM-time HDF5 cutouts of candidates, "
+                    "reading each filterbank once in sequential blocks."
+    )
+
+    parser.add_argument(
+        "-c", "--candidates",
+        type=str,
+        required=True,
+        help="csv_convert output CSV, or a .singlepulse file (e.g. from cluster_dbscan) together with -f."
+    )
+
+    parser.add_argument(
+        "-f", "--fil_file",
+        type=str,
+        default=None,
+        help="Filterbank file of the .singlepulse candidates."
+    )
+
+    parser.add_argument(
+        "-cm", "--channel_mask",
+        type=str,
+        default=None,
+        help="Channel mask file applied to .singlepulse candidates (csv input uses its chan_mask_path column)."
+    )
+
+    parser.add_argument(
+        "-o", "--output_dir",
+        type=str,
+        default="cutouts",
+        help="Directory for the .h5 cutouts (default: cutouts)."
+    )
+
+    parser.add_argument(
+        "--snr",
+        type=float,
+        default=None,
+        help="Only cut out candidates above this SNR (default: all)."
+    )
+
+    parser.add_argument(
+        "--time_size",
+        type=int,
+        default=256,
+        help="Time bins per cutout, each max(1, width // 2) samples wide (default: 256)."
+    )
+
+    parser.add_argument(
+        "--freq_size",
+        type=int,
+        default=256,
+        help="Frequency channels per cutout (default: 256)."
+    )
+
+    parser.add_argument(
+        "--dm_size",
+        type=int,
+        default=256,
+        help="DM trials from 0 to twice the candidate DM (default: 256)."
+    )
+
+    parser.add_argument(
+        "--block_mb",
+        type=float,
+        default=256,
+        help="Largest filterbank block read at once, in MB of float32 data (default: 256)."
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes, each handling whole blocks, <= 0 uses all CPUs (default: 1)."
+    )
+
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+
+    with cli_metrics(args):
+        with stage("read") as record:
+            candidates = read_cutout_candidates(args.candidates, fil_file=args.fil_file,
+                                                chan_mask_path=args.channel_mask)
+            if args.snr is not None:
+                candidates = candidates[candidates["snr"] > args.snr]
+            record["rows"] = len(candidates)
+        print(f"Cutting out {len(candidates)} candidates from {candidates['file'].nunique()} filterbank files")
+
+        with stage("cutouts", rows=len(candidates)):
+            result = make_cutouts(candidates, args.output_dir, time_size=args.time_size, freq_size=args.freq_size,
+                                  dm_size=args.dm_size, block_bytes=int(args.block_mb * (1 << 20)), n_jobs=args.jobs)
+
+        index_file = os.path.join(args.output_dir, "cutouts.csv")
+        with stage("index", rows=len(result)):
+            result.to_csv(index_file, index=False)
+        print(f"Saved {len(result)} cutouts to: {args.output_dir} (index: {index_file})")
+
+
+if __name__ == "__main__":
+    main()
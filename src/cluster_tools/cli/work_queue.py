@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sys
+from cluster_tools.io import _make_pool, _n_workers
+from cluster_tools.workqueue import STATES, WorkQueue, run_worker
+from cluster_tools.metrics import add_metrics_arguments, cli_metrics
+
+
+def run_workers(args):
+    # One worker in this process, or --jobs worker processes
+    options = dict(heartbeat=args.heartbeat, timeout=args.timeout, poll=args.poll, wait=args.wait,
+                   max_jobs=args.max_jobs)
+    n_workers = _n_workers(args.jobs)
+    pool = _make_pool(n_workers, backend="process")
+    if pool is None:
+        return run_worker(args.queue, **options)
+    try:
+        futures = [pool.submit(run_worker, args.queue, **options) for _ in range(n_workers)]
+        counts = {}
+        for future in futures:
+            for outcome, n in future.result().items():
+                counts[outcome] = counts.get(outcome, 0) + n
+        return counts
+    finally:
+        pool.shutdown()
+
+
+def write_index(queue, index_file):
+    # Batch index of the clustering jobs, as cluster_batch writes it
+    import pandas as pd
+    from cluster_tools.batch import INDEX_COLUMNS
+
+    rows = []
+    for state in STATES:
+        for job in queue.jobs(state):
+            if job["kind"] != "cluster":
+                continue
+            if state == "done":
+                rows.append(job["result"])
+            else:
+                rows.append({"observation": job["observation"], "name": job["output_name"], "status": "error" if state == "failed" else state,
+                             "error": job.get("error", "")})
+    pd.DataFrame(rows, columns=INDEX_COLUMNS).to_csv(index_file, index=False)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run or inspect a job queue kept in a shared directory. Jobs are submitted with "
+                    "dedisperse --queue or cluster_batch --queue; workers on any node claim and run them."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker = subparsers.add_parser("worker", help="Claim and run jobs until the queue is empty.")
+    worker.add_argument("-q", "--queue", type=str, required=True, help="Queue directory on the shared filesystem.")
+    worker.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Worker processes on this node, <= 0 uses all CPUs (default: 1).")
+    worker.add_argument("--heartbeat", type=float, default=30.0,
+                        help="Seconds between heartbeats of a running job (default: 30).")
+    worker.add_argument("--timeout", type=float, default=300.0,
+                        help="Seconds without heartbeat after which a running job is requeued (default: 300).")
+    worker.add_argument("--poll", type=float, default=5.0,
+                        help="Seconds between attempts to claim a job when none is pending (default: 5).")
+    worker.add_argument("--wait", action="store_true",
+                        help="Keep waiting for new jobs instead of exiting when the queue is empty.")
+    worker.add_argument("--max_jobs", type=int, default=None,
+                        help="Exit after running this many jobs per worker (default: no limit).")
+    add_metrics_arguments(worker)
+
+    status = subparsers.add_parser("status", help="Print job counts, running and failed jobs.")
+    status.add_argument("-q", "--queue", type=str, required=True, help="Queue directory on the shared filesystem.")
+    status.add_argument("--index", type=str, default=None,
+                        help="Write the index of the clustering jobs (as cluster_batch's index.csv) to this CSV.")
+    status.add_argument("--retry_failed", action="store_true",
+                        help="Queue failed and skipped jobs again, with their attempt counts reset.")
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.queue):
+        parser.error(f"queue directory {args.queue} does not exist")
+
+    if args.command == "worker":
+        with cli_metrics(args):
+            counts = run_workers(args)
+        print(", ".join(f"{n} {outcome}" for outcome, n in counts.items()))
+        if counts.get("failed"):
+            sys.exit(1)
+        return
+
+    queue = WorkQueue(args.queue)
+    if args.retry_failed:
+        print(f"Queued {queue.retry_failed()} failed jobs again")
+    jobs = {state: queue.jobs(state) for state in STATES}
+    print(", ".join(f"{len(jobs[state])} {state}" for state in STATES))
+    for job in jobs["running"]:
+        print(f"Running: {job['name']} on {job['worker']} (heartbeat {job['heartbeat_age']:.0f} s ago)")
+    for job in jobs["failed"]:
+        print(f"Failed: {job['name']} ({job.get('error') or 'exit code %s, log %s' % (job.get('returncode'), job.get('log'))})")
+    if args.index:
+        n = write_index(queue, args.index)
+        print(f"Saved index of {n} clustering jobs to: {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,700 @@
+import os
+import numpy as np
 import pandas as pd
 import hdbscan
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
 
-def DBSCAN_clustering(df, cluster_column = None, eps=0.05, min_samples=5, verbose=False):
-    # Perform DBSCAN clustering on the specified columns of the DataFrame.
+from .candidates import CandidateTable
+from .metrics import instrumented, stage
+
+def cluster_features(data, cluster_column=None):
+    """
+    Return the clustering input as a C-contiguous float64 (N, d) array.
+
+    A 2-D array that is already C-contiguous float64 is returned as is.
+    For a DataFrame or CandidateTable only the `cluster_column` columns
+    (default: ['Delay_s', 'Time']) are gathered, into one new array.
+    """
+    if isinstance(data, np.ndarray):
+        if data.ndim != 2:
+            raise ValueError(f"Expected a 2-D feature array, got {data.ndim} dimensions.")
+        return np.ascontiguousarray(data, dtype=np.float64)
     if cluster_column is None:
         cluster_column = ['Delay_s', 'Time']
-    X = df[cluster_column]
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-    labels = dbscan.fit_predict(X)
+    if isinstance(data, CandidateTable):
+        return data.features(cluster_column)
+    X = np.empty((len(data), len(cluster_column)), dtype=np.float64)
+    for i, name in enumerate(cluster_column):
+        X[:, i] = data[name].to_numpy()
+    return X
+
+# Below this many points a single thread is faster: starting the workers
+# (processes, for HDBSCAN's core distances) costs more than the queries
+PARALLEL_MIN_ROWS = 20000
+
+def _n_threads(n_jobs, n):
+    # Workers for the neighbour queries of one fit, <= 0 or None meaning all CPUs
+    if n < PARALLEL_MIN_ROWS:
+        return 1
+    if n_jobs is None or n_jobs <= 0:
+        return os.cpu_count() or 1
+    return n_jobs
+
+def select_strategy(method, n, d, n_jobs=1, strategy="auto"):
+    """
+    Neighbour-search options for fitting `method` ('dbscan' or 'hdbscan')
+    on n points in d dimensions.
+
+    With strategy='auto', DBSCAN queries a ball tree with leaf_size 30 up
+    to 15 dimensions and uses brute force beyond, where trees no longer
+    prune. On (Delay_s, Time) candidates the ball tree answered the radius
+    queries about twice as fast as sklearn's default KD-tree from 3e3 to
+    1e6 points, and leaf sizes from 20 to 30 were fastest. HDBSCAN keeps
+    Boruvka on a KD-tree with an approximate minimum spanning tree and
+    leaf_size 40 up to 60 dimensions (exact Prim's beyond): on the same
+    data Prim's was 5-10x slower, the exact tree about 35% slower and
+    other leaf sizes slower as well. strategy='default' leaves the tree
+    options at the estimator defaults and a dict gives them explicitly.
+
+    Either way the queries run on `n_jobs` workers (<= 0 uses all CPUs),
+    or one below PARALLEL_MIN_ROWS points.
+
+    Returns
+    -------
+    options : dict
+        Keyword arguments for sklearn's DBSCAN or hdbscan.HDBSCAN
+    """
+    if method not in ("dbscan", "hdbscan"):
+        raise ValueError(f"Unknown method '{method}', expected 'dbscan' or 'hdbscan'.")
+    if isinstance(strategy, dict):
+        options = dict(strategy)
+    elif strategy == "default":
+        options = {}
+    elif strategy == "auto":
+        if method == "dbscan":
+            options = {"algorithm": "ball_tree", "leaf_size": 30} if d <= 15 else {"algorithm": "brute"}
+        elif d <= 60:
+            options = {"algorithm": "boruvka_kdtree", "leaf_size": 40, "approx_min_span_tree": True}
+        else:
+            options = {"algorithm": "prims_kdtree", "leaf_size": 40}
+    else:
+        raise ValueError(f"Unknown strategy '{strategy}', expected 'auto', 'default' or a dict of options.")
+    jobs_key = "n_jobs" if method == "dbscan" else "core_dist_n_jobs"
+    options.setdefault(jobs_key, _n_threads(n_jobs, n))
+    return options
+
+def _attach_labels(df, labels):
+    if isinstance(df, CandidateTable):
+        return df.assign("cluster", labels)
     result = df.copy()
     result["cluster"] = labels
-    n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
-    if verbose:
-        print(f"DBSCAN found {n_clusters} clusters (excluding noise).")
+    return result
+
+def _iter_cell_pairs(start_a, count_a, start_b, count_b, budget=1 << 22):
+    """
+    Yield (i, j, pair) arrays enumerating every point pair between cell
+    ranges a[pair] and b[pair], in batches of about `budget` pairs.
+    """
+    sizes = count_a.astype(np.int64) * count_b
+    pos = 0
+    while pos < len(sizes):
+        # Take consecutive cell pairs until the batch budget is reached
+        stop = pos + max(1, int(np.searchsorted(np.cumsum(sizes[pos:]), budget, side="right")))
+        pairs = np.arange(pos, stop)
+        for lo in range(0, max(int(sizes[pairs].max()), 1), budget):
+            # Oversized cell pairs are split along their local pair index
+            local_sizes = np.clip(sizes[pairs] - lo, 0, budget)
+            keep = local_sizes > 0
+            p, n = pairs[keep], local_sizes[keep]
+            if len(p) == 0:
+                break
+            rep = np.repeat(np.arange(len(p)), n)
+            local = lo + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+            nb = count_b[p][rep]
+            yield start_a[p][rep] + local // nb, start_b[p][rep] + local % nb, p[rep]
+        pos = stop
+
+def _fof_labels(X, eps, min_samples):
+    """
+    Grid-hashed friends-of-friends equivalent to DBSCAN.
+
+    Points are hashed into cells of side eps / sqrt(d), sorted with the
+    last column (Time) as the major key, so all points sharing a cell are
+    within eps of each other and neighbours can only lie within
+    r = ceil(sqrt(d)) cells along each axis. Up to d = 4 the neighbouring
+    cells are found from a table of the (2r + 1)^d offsets; above that the
+    table grows too fast and occupied cells are paired with a radius
+    query on their grid coordinates instead. Cells holding at least `min_samples` points are
+    all core; only points in sparser cells need pairwise neighbour counts.
+    Core cells are joined with union-find (connected components) when a
+    pair of their core points is within eps. Clusters are numbered by
+    their lowest-index core point and border points take the lowest
+    adjacent cluster, which is how sklearn's DBSCAN assigns them, so the
+    labels are identical.
+
+    Returns
+    -------
+    (labels, core) : tuple of numpy.ndarray
+    """
+    X = np.asarray(X, dtype=np.float64)
+    n, d = X.shape
+    labels = np.full(n, -1, dtype=np.int64)
+    core = np.zeros(n, dtype=bool)
+    if n == 0:
+        return labels, core
+
+    side = eps / np.sqrt(d)
+    reach = int(np.ceil(np.sqrt(d)))
+    coords = np.floor((X - X.min(axis=0)) / side).astype(np.int64) + reach
+    dims = coords.max(axis=0) + reach + 1
+    if np.prod(dims.astype(float)) >= 2.0 ** 62:
+        raise ValueError("eps is too small for the extent of the data to hash into a grid.")
+    strides = np.cumprod(np.r_[1, dims[:-1]])
+    key = coords @ strides
+    order = np.argsort(key, kind="stable")
+    Xs, key = X[order], key[order]
+
+    cell_key, cell_start, cell_count = np.unique(key, return_index=True, return_counts=True)
+    cell_of = np.repeat(np.arange(len(cell_key)), cell_count)
+
+    # Neighbouring cell pairs (each unordered pair once) whose minimum separation is <= eps
+    if d <= 4:
+        offsets = np.array(np.meshgrid(*[np.arange(-reach, reach + 1)] * d, indexing="ij")).reshape(d, -1).T
+        gap = np.clip(np.abs(offsets) - 1, 0, None)
+        offsets = offsets[((gap ** 2).sum(axis=1) <= d) & (offsets @ strides > 0)]
+        cell_a, cell_b = [], []
+        for step in offsets @ strides:
+            b = np.searchsorted(cell_key, cell_key + step)
+            found = b < len(cell_key)
+            found[found] = cell_key[b[found]] == cell_key[found] + step
+            cell_a.append(np.flatnonzero(found))
+            cell_b.append(b[found])
+        cell_a, cell_b = np.concatenate(cell_a), np.concatenate(cell_b)
+    else:
+        # A gap of g cells per axis with sum(g^2) <= d puts the cells at most 2 sqrt(d) apart
+        cell_coords = coords[order][cell_start].astype(np.float64)
+        graph = NearestNeighbors(radius=2 * np.sqrt(d)).fit(cell_coords).radius_neighbors_graph(cell_coords).tocoo()
+        upper = graph.row < graph.col
+        cell_a, cell_b = graph.row[upper].astype(np.intp), graph.col[upper].astype(np.intp)
+        gap = np.clip(np.abs(cell_coords[cell_a] - cell_coords[cell_b]) - 1, 0, None)
+        close = (gap ** 2).sum(axis=1) <= d
+        cell_a, cell_b = cell_a[close], cell_b[close]
+
+    def point_pairs(select):
+        # Point pairs within eps between the selected neighbouring cells
+        a, b = cell_a[select], cell_b[select]
+        for i, j, p in _iter_cell_pairs(cell_start[a], cell_count[a], cell_start[b], cell_count[b]):
+            diff = Xs[i] - Xs[j]
+            close = np.einsum("ij,ij->i", diff, diff) <= eps * eps
+            yield i[close], j[close], a[p[close]], b[p[close]]
+
+    # Core points: whole dense cells, plus pairwise counts for sparse ones
+    sparse = cell_count < min_samples
+    count = cell_count[cell_of].astype(np.int64)
+    for i, j, _, _ in point_pairs(sparse[cell_a] | sparse[cell_b]):
+        count += np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+    core_s = count >= min_samples
 
+    # Union core cells that have a pair of core points within eps
+    core_cell = np.bincount(cell_of, weights=core_s, minlength=len(cell_key)) > 0
+    src, dst = [], []
+    for i, j, a, b in point_pairs(core_cell[cell_a] & core_cell[cell_b]):
+        linked = core_s[i] & core_s[j]
+        src.append(a[linked])
+        dst.append(b[linked])
+    src = np.concatenate(src) if src else np.empty(0, dtype=np.intp)
+    dst = np.concatenate(dst) if dst else np.empty(0, dtype=np.intp)
+    graph = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(len(cell_key),) * 2)
+    _, component = connected_components(graph, directed=False)
+
+    # Number clusters by their lowest original index among core points
+    orig = order
+    comp_core = component[cell_of[core_s]]
+    first = np.full(len(cell_key), n, dtype=np.int64)
+    np.minimum.at(first, comp_core, orig[core_s])
+    used = np.flatnonzero(first < n)
+    rank = np.full(len(cell_key), -1, dtype=np.int64)
+    rank[used[np.argsort(first[used])]] = np.arange(len(used))
+    labels_s = np.full(n, -1, dtype=np.int64)
+    labels_s[core_s] = rank[comp_core]
+
+    # Border points join the lowest-numbered cluster among their core neighbours
+    border = ~core_s
+    cell_label = np.full(len(cell_key), n, dtype=np.int64)
+    np.minimum.at(cell_label, cell_of[core_s], labels_s[core_s])
+    best = np.where(border, cell_label[cell_of], n)
+    has_border = np.bincount(cell_of, weights=border, minlength=len(cell_key)) > 0
+    for i, j, _, _ in point_pairs((has_border[cell_a] & core_cell[cell_b]) | (core_cell[cell_a] & has_border[cell_b])):
+        to_i = border[i] & core_s[j]
+        np.minimum.at(best, i[to_i], labels_s[j[to_i]])
+        to_j = border[j] & core_s[i]
+        np.minimum.at(best, j[to_j], labels_s[i[to_j]])
+    labels_s[border & (best < n)] = best[border & (best < n)]
+
+    labels[order] = labels_s
+    core[order] = core_s
+    return labels, core
+
+def _graph_dbscan_labels(n, rows, cols, core, rank=None):
+    """
+    DBSCAN labels from a neighbour edge list and core mask.
+
+    `rows`/`cols` hold every directed neighbour pair (i != j) within eps.
+    Clusters are numbered by their lowest-index core point and border
+    points join the lowest-numbered adjacent cluster, as in sklearn.
+    `rank` (distinct integers, default the point index) replaces the
+    point index in that ordering.
+    """
+    linked = core[rows] & core[cols]
+    graph = coo_matrix((np.ones(int(linked.sum()), dtype=np.int8), (rows[linked], cols[linked])), shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    unset = np.iinfo(np.int64).max
+    first = np.full(n, unset, dtype=np.int64)
+    core_idx = np.flatnonzero(core)
+    np.minimum.at(first, component[core_idx], core_idx if rank is None else rank[core_idx])
+    used = np.flatnonzero(first < unset)
+    rank = np.full(n, -1, dtype=np.int64)
+    rank[used[np.argsort(first[used])]] = np.arange(len(used))
+    labels[core_idx] = rank[component[core_idx]]
+
+    to_border = ~core[rows] & core[cols]
+    best = np.full(n, n, dtype=np.int64)
+    np.minimum.at(best, rows[to_border], labels[cols[to_border]])
+    border = best < n
+    labels[border] = best[border]
+    return labels
+
+def _weighted_dbscan_labels(X, eps, min_samples, weights, options, rank=None):
+    """
+    DBSCAN in which point i counts weights[i] times towards min_samples.
+
+    Weighted neighbour counts come from one radius-neighbours graph, and
+    the labels from _graph_dbscan_labels, which numbers clusters as sklearn
+    does (by `rank` rather than point index, if given). This avoids the
+    per-point Python loop of sklearn's sample_weight.
+
+    Returns
+    -------
+    (labels, core) : tuple of numpy.ndarray
+    """
+    graph = NearestNeighbors(radius=eps, **options).fit(X).radius_neighbors_graph(X, mode="connectivity").tocoo()
+    off_diagonal = graph.row != graph.col
+    rows, cols = graph.row[off_diagonal], graph.col[off_diagonal]
+    weights = np.asarray(weights, dtype=np.float64)
+    core = weights + np.bincount(rows, weights=weights[cols], minlength=len(X)) >= min_samples
+    return _graph_dbscan_labels(len(X), rows, cols, core, rank), core
+
+def _grid_decimate(X, cell_size):
+    """
+    Coarsen points onto a grid of cells of side `cell_size`.
+
+    Returns
+    -------
+    (centres, counts, inverse) : tuple of numpy.ndarray
+        Centroid and number of points of every occupied cell, and the
+        cell of each point
+    """
+    coords = np.floor((X - X.min(axis=0)) / cell_size).astype(np.int64)
+    dims = coords.max(axis=0) + 1
+    if np.prod(dims.astype(float)) >= 2.0 ** 62:
+        raise ValueError("The decimation cell is too small for the extent of the data to hash into a grid.")
+    key = coords @ np.cumprod(np.r_[1, dims[:-1]])
+    _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+    centres = np.empty((len(counts), X.shape[1]), dtype=np.float64)
+    for i in range(X.shape[1]):
+        centres[:, i] = np.bincount(inverse, weights=X[:, i], minlength=len(counts)) / counts
+    return centres, counts, inverse
+
+def _number_by_first_row(labels):
+    # Renumber clusters 0, 1, ... in order of their first row
+    result = np.full(len(labels), -1, dtype=np.int64)
+    clustered = labels >= 0
+    _, first, inverse = np.unique(labels[clustered], return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    result[clustered] = rank[inverse]
     return result
-    
-def HDBSCAN_clustering(df, cluster_column = None, min_cluster_size=5, min_samples=None, verbose=False):
-    # Perform HDBSCAN clustering on the specified columns of the DataFrame.
+
+def _fit_tile(method, X, params, strategy="auto", weights=None):
+    # Cluster one tile; returns local labels and the points that may link clusters.
+    # Tiles already run in parallel, so each fit is single-threaded
+    if method == "dbscan" and weights is not None:
+        return _weighted_dbscan_labels(X, params["eps"], params["min_samples"], weights,
+                                       select_strategy(method, len(X), X.shape[1], 1, strategy))
+    if method == "dbscan":
+        model = DBSCAN(**params, **select_strategy(method, len(X), X.shape[1], 1, strategy)).fit(X)
+        core = np.zeros(len(X), dtype=bool)
+        core[model.core_sample_indices_] = True
+        return model.labels_, core
+    if method == "fof":
+        return _fof_labels(X, **params)
+    if len(X) <= (params["min_samples"] or params["min_cluster_size"]):
+        # Too few points for the core-distance query: all noise
+        return np.full(len(X), -1), np.zeros(len(X), dtype=bool)
+    labels = hdbscan.HDBSCAN(**params, **select_strategy(method, len(X), X.shape[1], 1, strategy)).fit_predict(X)
+    return labels, labels >= 0
+
+def _tiled_labels(X, time_index, method, params, n_tiles, overlap, n_jobs=1, strategy="auto", weights=None):
+    """
+    Cluster X in overlapping Time tiles and merge labels across seams.
+
+    Points are split into `n_tiles` equal-count core windows along column
+    `time_index`; each tile also holds the points within `overlap` of its
+    window. A point takes its label from the tile that owns it, and tile
+    clusters are merged through linking points (DBSCAN core points, or
+    any clustered point for HDBSCAN) that appear in several tiles. For
+    DBSCAN with overlap >= 2 * eps this reproduces the global result up
+    to label numbering and the choice between clusters for shared border
+    points, since every owned point and its neighbours see their full
+    eps-neighbourhood. DBSCAN points may carry `weights` (see
+    _weighted_dbscan_labels).
+    """
+    n = len(X)
+    order = np.argsort(X[:, time_index], kind="stable")
+    Xs = np.ascontiguousarray(X[order])
+    ws = weights[order] if weights is not None else None
+    t = Xs[:, time_index]
+
+    core_start = np.unique(np.linspace(0, n, n_tiles + 1).astype(np.intp))
+    core_start, core_stop = core_start[:-1], core_start[1:]
+    lo = np.searchsorted(t, t[core_start] - overlap, side="left")
+    hi = np.searchsorted(t, t[core_stop - 1] + overlap, side="right")
+
+    if n_jobs is None or n_jobs <= 0:
+        n_jobs = None
+    if n_jobs == 1 or len(core_start) == 1:
+        results = [_fit_tile(method, Xs[a:b], params, strategy, ws[a:b] if ws is not None else None)
+                   for a, b in zip(lo, hi)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_fit_tile, method, Xs[a:b], params, strategy, ws[a:b] if ws is not None else None)
+                       for a, b in zip(lo, hi)]
+            results = [f.result() for f in futures]
+
+    # Give every (tile, local label) pair a global node id
+    offsets = np.cumsum([0] + [labels.max() + 1 for labels, _ in results])
+    owner_label = np.full(n, -1, dtype=np.int64)
+    owner_link = np.zeros(n, dtype=bool)
+    for k, (labels, link) in enumerate(results):
+        a, b = core_start[k] - lo[k], core_stop[k] - lo[k]
+        local = labels[a:b]
+        owner_label[core_start[k]:core_stop[k]] = np.where(local >= 0, local + offsets[k], -1)
+        owner_link[core_start[k]:core_stop[k]] = link[a:b]
+
+    # Join each tile cluster to the owner cluster of every linking point it contains
+    src, dst = [], []
+    for k, (labels, link) in enumerate(results):
+        owned = owner_label[lo[k]:hi[k]]
+        sel = (labels >= 0) & link & owner_link[lo[k]:hi[k]] & (owned >= 0)
+        src.append(labels[sel] + offsets[k])
+        dst.append(owned[sel])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    n_nodes = int(offsets[-1])
+    graph = coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n_nodes, n_nodes))
+    _, component = connected_components(graph, directed=False)
+
+    # Renumber merged clusters consecutively in Time order
+    merged = np.full(n, -1, dtype=np.int64)
+    clustered = owner_label >= 0
+    _, first, inverse = np.unique(component[owner_label[clustered]], return_index=True, return_inverse=True)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    merged[clustered] = rank[inverse]
+
+    labels = np.empty(n, dtype=np.int64)
+    labels[order] = merged
+    return labels
+
+def _time_index(data, cluster_column, time_index):
+    # Column of the feature array that tiles are cut along
+    if time_index is not None:
+        return time_index
+    if isinstance(data, np.ndarray):
+        return data.shape[1] - 1
     if cluster_column is None:
         cluster_column = ['Delay_s', 'Time']
-    X = df[cluster_column]
-    clusterer = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples)
-    labels = clusterer.fit_predict(X)
-    result = df.copy()
-    result["cluster"] = labels
-    n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
+    if 'Time' not in cluster_column:
+        raise ValueError(f"Tiled clustering needs 'Time' among the cluster columns {cluster_column}.")
+    return list(cluster_column).index('Time')
+
+def _store_labels(data, labels, inplace, label_column):
+    if inplace:
+        if isinstance(data, np.ndarray):
+            raise ValueError("inplace=True needs a DataFrame or CandidateTable to write labels to.")
+        data[label_column] = labels
+    return labels
+
+def _report_strategy(name, options, verbose):
     if verbose:
-        print(f"HDBSCAN found {n_clusters} clusters (excluding noise).")
-    
-    return result
\ No newline at end of file
+        print(f"{name} strategy: " + ", ".join(f"{key}={value}" for key, value in options.items()))
+
+def _report(name, labels, verbose):
+    if verbose:
+        n_clusters = len(np.unique(labels[labels >= 0]))
+        print(f"{name} found {n_clusters} clusters (excluding noise).")
+
+@instrumented()
+def dbscan_labels(data, cluster_column=None, eps=0.05, min_samples=5, n_tiles=1, n_jobs=1,
+                  tile_overlap=None, time_index=None, inplace=False, label_column="cluster",
+                  verbose=False, strategy="auto", decimate=None):
+    """
+    DBSCAN cluster labels for a feature array, DataFrame or CandidateTable.
+
+    Parameters
+    ----------
+    data : numpy.ndarray, pandas.DataFrame or CandidateTable
+        (N, d) feature array, used without a copy when it is C-contiguous
+        float64, or a table from which `cluster_column` is gathered
+
+    cluster_column : list
+        Columns clustered on for table input (default: ['Delay_s', 'Time'])
+
+    eps, min_samples :
+        DBSCAN parameters
+
+    n_jobs : int
+        Threads for the neighbour queries of a single fit, or processes
+        fitting tiles; <= 0 uses all CPUs
+
+    n_tiles, tile_overlap :
+        Cluster overlapping Time tiles across n_jobs processes when
+        n_tiles > 1; tile_overlap (default 2 * eps) must be at least 2 * eps
+        to match the global fit
+
+    time_index : int
+        Feature column holding Time, for tiling (default: the position of
+        'Time' in cluster_column, or the last column of an array)
+
+    inplace : bool
+        Also store the labels as `label_column` of the table, without
+        copying the table
+
+    verbose : bool
+        Print the neighbour-search strategy and the number of clusters found
+
+    strategy : str or dict
+        'auto', 'default' or explicit estimator options, see
+        select_strategy; the labels do not depend on it
+
+    decimate : float
+        Bin the points on a grid of cells of side eps / decimate, cluster
+        one representative per occupied cell (its centroid, counting as
+        many points as the cell holds towards min_samples) and give every
+        row the label of its cell. Near-duplicate candidates of adjacent
+        DM trials then cost one point; positions move by at most the cell
+        diagonal, so a few points near the eps boundary may change status.
+        Default: no decimation.
+
+    Returns
+    -------
+    labels : numpy.ndarray
+        Cluster label per row, -1 for noise
+    """
+    with stage("features"):
+        X = cluster_features(data, cluster_column)
+    weights = inverse = None
+    if decimate and len(X) > 0:
+        with stage("decimate", rows=len(X)) as record:
+            X, weights, inverse = _grid_decimate(X, eps / decimate)
+            record["cells"] = len(X)
+            # Cells are ordered by their first row, so that a grid holding one
+            # point per cell numbers clusters exactly as sklearn does
+            first_row = np.full(len(X), len(inverse), dtype=np.int64)
+            np.minimum.at(first_row, inverse, np.arange(len(inverse)))
+        if verbose:
+            print(f"Decimated {len(inverse)} points to {len(X)} grid cells ({len(inverse) / len(X):.1f}x fewer).")
+    tiled = n_tiles is not None and n_tiles > 1 and len(X) > 0
+    if tiled:
+        if tile_overlap is None:
+            tile_overlap = 2 * eps
+        if tile_overlap < 2 * eps:
+            raise ValueError(f"tile_overlap must be at least 2 * eps ({2 * eps}).")
+        with stage("fit_tiles", tiles=n_tiles):
+            labels = _tiled_labels(X, _time_index(data, cluster_column, time_index), "dbscan",
+                                   {"eps": eps, "min_samples": min_samples}, n_tiles, tile_overlap, n_jobs=n_jobs,
+                                   strategy=strategy, weights=weights)
+    else:
+        options = select_strategy("dbscan", len(X), X.shape[1], n_jobs, strategy)
+        _report_strategy("DBSCAN", options, verbose)
+        with stage("fit", **options):
+            if weights is None:
+                labels = DBSCAN(eps=eps, min_samples=min_samples, **options).fit_predict(X)
+            else:
+                labels, _ = _weighted_dbscan_labels(X, eps, min_samples, weights, options, first_row)
+    if inverse is not None:
+        labels = labels[inverse]
+        if tiled:
+            labels = _number_by_first_row(labels)
+    _report("DBSCAN", labels, verbose)
+    return _store_labels(data, labels, inplace, label_column)
+
+@instrumented()
+def fof_labels(data, cluster_column=None, eps=0.05, min_samples=5, n_tiles=1, n_jobs=1,
+               tile_overlap=None, time_index=None, inplace=False, label_column="cluster",
+               verbose=False):
+    """
+    Grid-hashed friends-of-friends labels, identical to dbscan_labels for
+    the same eps and min_samples. Arguments are as for dbscan_labels.
+    """
+    with stage("features"):
+        X = cluster_features(data, cluster_column)
+    if n_tiles is not None and n_tiles > 1 and len(X) > 0:
+        if tile_overlap is None:
+            tile_overlap = 2 * eps
+        if tile_overlap < 2 * eps:
+            raise ValueError(f"tile_overlap must be at least 2 * eps ({2 * eps}).")
+        with stage("fit_tiles", tiles=n_tiles):
+            labels = _tiled_labels(X, _time_index(data, cluster_column, time_index), "fof",
+                                   {"eps": eps, "min_samples": min_samples}, n_tiles, tile_overlap, n_jobs=n_jobs)
+    else:
+        with stage("fit"):
+            labels, _ = _fof_labels(X, eps, min_samples)
+    _report("FOF", labels, verbose)
+    return _store_labels(data, labels, inplace, label_column)
+
+@instrumented()
+def hdbscan_labels(data, cluster_column=None, min_cluster_size=5, min_samples=None, n_tiles=1, n_jobs=1,
+                   tile_overlap=None, time_index=None, inplace=False, label_column="cluster",
+                   verbose=False, strategy="auto", core_dist_n_jobs=None):
+    """
+    HDBSCAN labels for a feature array, DataFrame or CandidateTable.
+
+    Arguments are as for dbscan_labels. Tiling approximates the global
+    fit; tile_overlap defaults to the largest spread of the other feature
+    columns (the full dispersion sweep in Delay_s). core_dist_n_jobs sets
+    the core-distance workers of a single fit apart from n_jobs (default:
+    n_jobs). 'auto' and 'default' give the same tree; unlike DBSCAN, other
+    tree options may change the labels, as they decide spanning-tree ties.
+    """
+    with stage("features"):
+        X = cluster_features(data, cluster_column)
+    if n_tiles is not None and n_tiles > 1 and len(X) > 0:
+        index = _time_index(data, cluster_column, time_index)
+        if tile_overlap is None:
+            other = np.delete(X, index, axis=1)
+            tile_overlap = float(np.ptp(other, axis=0).max()) if other.shape[1] else 0.0
+        with stage("fit_tiles", tiles=n_tiles):
+            labels = _tiled_labels(X, index, "hdbscan",
+                                   {"min_cluster_size": min_cluster_size, "min_samples": min_samples},
+                                   n_tiles, tile_overlap, n_jobs=n_jobs, strategy=strategy)
+    else:
+        options = select_strategy("hdbscan", len(X), X.shape[1],
+                                  n_jobs if core_dist_n_jobs is None else core_dist_n_jobs, strategy)
+        _report_strategy("HDBSCAN", options, verbose)
+        with stage("fit", **options):
+            clusterer = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples, **options)
+            labels = clusterer.fit_predict(X)
+    _report("HDBSCAN", labels, verbose)
+    return _store_labels(data, labels, inplace, label_column)
+
+def DBSCAN_clustering(df, cluster_column = None, eps=0.05, min_samples=5, verbose=False,
+                      n_tiles=1, n_jobs=1, tile_overlap=None, strategy="auto", decimate=None):
+    # Perform DBSCAN clustering on the specified columns of the DataFrame or CandidateTable
+    # and return a copy with a 'cluster' column. See dbscan_labels for the tiling,
+    # neighbour-search and decimation options and for clustering without the copy.
+    labels = dbscan_labels(df, cluster_column, eps=eps, min_samples=min_samples, n_tiles=n_tiles,
+                           n_jobs=n_jobs, tile_overlap=tile_overlap, verbose=verbose, strategy=strategy,
+                           decimate=decimate)
+    return _attach_labels(df, labels)
+
+def FOF_clustering(df, cluster_column = None, eps=0.05, min_samples=5, verbose=False,
+                   n_tiles=1, n_jobs=1, tile_overlap=None):
+    # Perform grid-hashed friends-of-friends clustering, giving the same labels as
+    # DBSCAN_clustering for the same eps and min_samples in O(n log n) time without
+    # per-point neighbour lists. See fof_labels.
+    labels = fof_labels(df, cluster_column, eps=eps, min_samples=min_samples, n_tiles=n_tiles,
+                        n_jobs=n_jobs, tile_overlap=tile_overlap, verbose=verbose)
+    return _attach_labels(df, labels)
+
+def HDBSCAN_clustering(df, cluster_column = None, min_cluster_size=5, min_samples=None, verbose=False,
+                       n_tiles=1, n_jobs=1, tile_overlap=None, strategy="auto", core_dist_n_jobs=None):
+    # Perform HDBSCAN clustering on the specified columns of the DataFrame or CandidateTable
+    # and return a copy with a 'cluster' column. See hdbscan_labels.
+    labels = hdbscan_labels(df, cluster_column, min_cluster_size=min_cluster_size, min_samples=min_samples,
+                            n_tiles=n_tiles, n_jobs=n_jobs, tile_overlap=tile_overlap, verbose=verbose,
+                            strategy=strategy, core_dist_n_jobs=core_dist_n_jobs)
+    return _attach_labels(df, labels)
+
+@instrumented()
+def cluster_summary(df, labels=None):
+    """
+    Summarise each cluster in one vectorized pass over the labels.
+
+    Per-cluster reductions use bincount and unbuffered ufunc.at calls
+    indexed by label, so no sort or groupby is needed.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame or CandidateTable
+        Candidates with at least the 'DM', 'Sigma', 'Time' and 'Downfact'
+        columns
+
+    labels : array-like
+        Cluster label per row, -1 for noise (default: df['cluster'])
+
+    Returns
+    -------
+    summary : pandas.DataFrame
+        One row per cluster, ordered by label, holding the columns of its
+        highest-Sigma member (the first such row on ties, as with
+        groupby().idxmax()) plus 'n_members', 'DM_min', 'DM_max',
+        'Time_min', 'Time_max', 'Time_span', 'DM_centroid' and
+        'Time_centroid' (Sigma-weighted) and 'Downfact_max'.
+    """
+    if labels is None:
+        labels = df["cluster"]
+    labels = np.asarray(labels)
+    columns = [c for c in df.columns if c != "cluster"]
+    stats = ["n_members", "DM_min", "DM_max", "Time_min", "Time_max", "Time_span",
+             "DM_centroid", "Time_centroid", "Downfact_max"]
+
+    rows = np.flatnonzero(labels >= 0)
+    if len(rows) == 0:
+        return pd.DataFrame(columns=["cluster"] + columns + stats)
+
+    # Dense cluster codes: labels directly, or compressed if they are sparse
+    codes = labels[rows].astype(np.intp)
+    n_codes = int(codes.max()) + 1
+    if n_codes > 4 * len(rows):
+        cluster_ids, codes = np.unique(codes, return_inverse=True)
+        n_codes = len(cluster_ids)
+    else:
+        cluster_ids = np.arange(n_codes)
+
+    def reduce(ufunc, values, initial):
+        out = np.full(n_codes, initial, dtype=np.float64)
+        ufunc.at(out, codes, values)
+        return out
+
+    sigma = np.asarray(df["Sigma"], dtype=np.float64)[rows]
+    dm = np.asarray(df["DM"], dtype=np.float64)[rows]
+    time = np.asarray(df["Time"], dtype=np.float64)[rows]
+    counts = np.bincount(codes, minlength=n_codes)
+    present = counts > 0
+
+    # Best member: first row in each cluster reaching the cluster's maximum Sigma
+    peak = sigma == reduce(np.maximum, sigma, -np.inf)[codes]
+    best = np.full(n_codes, len(labels), dtype=np.intp)
+    np.minimum.at(best, codes[peak], rows[peak])
+
+    weight_sum = np.bincount(codes, weights=sigma, minlength=n_codes)[present]
+    summary = {"cluster": cluster_ids[present]}
+    for name in columns:
+        summary[name] = np.asarray(df[name])[best[present]]
+    summary["n_members"] = counts[present]
+    summary["DM_min"] = reduce(np.minimum, dm, np.inf)[present]
+    summary["DM_max"] = reduce(np.maximum, dm, -np.inf)[present]
+    summary["Time_min"] = reduce(np.minimum, time, np.inf)[present]
+    summary["Time_max"] = reduce(np.maximum, time, -np.inf)[present]
+    summary["Time_span"] = summary["Time_max"] - summary["Time_min"]
+    summary["DM_centroid"] = np.bincount(codes, weights=sigma * dm, minlength=n_codes)[present] / weight_sum
+    summary["Time_centroid"] = np.bincount(codes, weights=sigma * time, minlength=n_codes)[present] / weight_sum
+    summary["Downfact_max"] = reduce(np.maximum, np.asarray(df["Downfact"], dtype=np.float64)[rows], -np.inf)[present]
+
+    return pd.DataFrame(summary)
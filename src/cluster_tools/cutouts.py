@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+import os
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .io import _make_pool, _read_singlepulse_file
+from .dedisperse import _sample_delays
+
+CUTOUT_COLUMNS = ['file', 'tcand', 'dm', 'snr', 'width', 'label', 'chan_mask_path']
+
+
+def read_cutout_candidates(filename, fil_file=None, chan_mask_path=None):
+    """
+    Read candidates to cut out of their filterbank files.
+
+    Parameters
+    ----------
+    filename : str
+        csv_convert output (columns file, snr, width, dm, label, stime,
+        chan_mask_path; width is log2 of the boxcar width in samples) or a
+        .singlepulse file, e.g. the output of cluster_dbscan
+
+    fil_file : str
+        Filterbank the .singlepulse candidates were found in (required
+        for .singlepulse input, ignored for csv input)
+
+    chan_mask_path : str
+        Channel mask file for .singlepulse input (optional)
+
+    Returns
+    -------
+    candidates : pandas.DataFrame
+        Columns CUTOUT_COLUMNS, with 'tcand' in seconds and 'width' in
+        samples
+    """
+    if filename.endswith(".singlepulse"):
+        if fil_file is None:
+            raise ValueError("A filterbank file is needed to cut out .singlepulse candidates.")
+        _, data, err = _read_singlepulse_file(filename)
+        if err is not None:
+            raise ValueError(f"Cannot read {filename}: {err}")
+        return pd.DataFrame({
+            'file': os.path.abspath(fil_file),
+            'tcand': data[:, 2],
+            'dm': data[:, 0],
+            'snr': data[:, 1],
+            'width': data[:, 4].astype(np.int64),
+            'label': np.zeros(len(data), dtype=np.int64),
+            'chan_mask_path': chan_mask_path,
+        }, columns=CUTOUT_COLUMNS)
+
+    df = pd.read_csv(filename)
+    return pd.DataFrame({
+        'file': df['file'],
+        'tcand': df['stime'].astype(np.float64),
+        'dm': df['dm'].astype(np.float64),
+        'snr': df['snr'].astype(np.float64),
+        'width': (2 ** df['width'].astype(np.int64)).astype(np.int64),
+        'label': df['label'].astype(np.int64),
+        'chan_mask_path': df['chan_mask_path'].astype(object).where(df['chan_mask_path'].notna(), None),
+    }, columns=CUTOUT_COLUMNS)
+
+
+def _group_edges(nchans, size):
+    # First channel of each of `size` near-equal groups (all channels if fewer)
+    return np.unique(np.linspace(0, nchans, min(size, nchans) + 1).astype(np.intp)[:-1])
+
+
+def _cutout_windows(candidates, header, freqs, time_size=256, dm_size=256):
+    """
+    Spectra each candidate needs, as (start, stop, centre, decim, margin).
+
+    The freq-time cutout is `time_size` bins of `decim` = max(1, width // 2)
+    spectra centred on the candidate, dedispersed to the top of the band.
+    `margin` spectra on both sides cover the residual delays of the
+    DM-time trials (0 to twice the DM), and the raw read extends by the
+    dispersion delay across the band at the candidate DM.
+    """
+    tsamp = header["tsamp"]
+    f_top = freqs.max()
+    decim = np.maximum(1, candidates['width'].to_numpy() // 2)
+    n = time_size * decim
+    centre = np.floor(candidates['tcand'].to_numpy() / tsamp + 0.5).astype(np.int64)
+    dm = candidates['dm'].to_numpy()
+    sweep = _sample_delays(dm, freqs.min(), f_top, tsamp).astype(np.int64)
+    # Whole time bins on either side
+    margin = -(-sweep // decim) * decim if dm_size > 1 else np.zeros_like(sweep)
+    start = centre - n // 2 - margin
+    stop = start + n + 2 * margin + sweep
+    return start, stop, centre, decim, margin
+
+
+def plan_cutout_blocks(start, stop, max_spectra):
+    """
+    Group candidate windows into sequential reads.
+
+    Windows are sorted by start and merged while the merged read stays
+    within `max_spectra` (a longer single window gets a block of its own),
+    so overlapping dispersion sweeps of nearby candidates are read once.
+
+    Returns
+    -------
+    blocks : list of (start, stop, indices)
+        In file order, `indices` being positions into `start`/`stop`
+    """
+    order = np.argsort(start, kind="stable")
+    blocks = []
+    for i in order:
+        s, e = int(start[i]), int(stop[i])
+        if blocks and s < blocks[-1][1] and max(e, blocks[-1][1]) - blocks[-1][0] <= max_spectra:
+            blocks[-1][1] = max(e, blocks[-1][1])
+            blocks[-1][2].append(int(i))
+        else:
+            blocks.append([s, e, [int(i)]])
+    return [(s, e, idx) for s, e, idx in blocks]
+
+
+def _make_cutout(block, b0, cand, freqs, tsamp, levels, kill, time_size, freq_size, dm_size):
+    """
+    Dedispersed freq-time (time_size, n_freq) and DM-time (dm_size,
+    time_size) images of one candidate from a (nchans, nspectra) block
+    that starts at spectrum `b0`.
+    """
+    f_top = freqs.max()
+    decim, margin, centre = int(cand["decim"]), int(cand["margin"]), int(cand["centre"])
+    n_bins = time_size + 2 * (margin // decim)
+    length = n_bins * decim
+
+    # Channels shifted to the top of the band at the candidate DM and
+    # summed straight into their frequency groups; masked channels add
+    # their median level
+    delays = _sample_delays(cand["dm"], freqs, f_top, tsamp)
+    e0 = centre - time_size * decim // 2 - margin - b0
+    edges = _group_edges(len(freqs), freq_size)
+    group = np.searchsorted(edges, np.arange(len(freqs)), side="right") - 1
+    counts = np.bincount(group)
+    killed = np.zeros(len(freqs), dtype=bool)
+    if kill is not None:
+        killed[kill] = True
+    sub = np.zeros((len(edges), length), dtype=np.float32)
+    for c, d in enumerate(delays):
+        if killed[c]:
+            sub[group[c]] += levels[c]
+        else:
+            sub[group[c]] += block[c, e0 + d:e0 + d + length]
+    # Time bins from strided sums, much faster than a mean over a short axis
+    binned = sub[:, ::decim].copy()
+    for k in range(1, decim):
+        binned += sub[:, k::decim]
+    sub = binned / (counts[:, None] * decim)
+
+    m = margin // decim
+    data_ft = sub[:, m:m + time_size].T
+
+    # DM trials from 0 to twice the DM, from the groups shifted by their
+    # residual delay against the candidate DM, in time bins
+    if dm_size > 1:
+        sub_top = np.maximum.reduceat(freqs, edges)
+        residual = _sample_delays(np.linspace(0, 2 * cand["dm"], dm_size)[:, None] - cand["dm"],
+                                  sub_top[None, :], f_top, tsamp * decim)
+        residual = np.clip(residual, -m, m)
+        data_dmt = np.zeros((dm_size, time_size), dtype=np.float32)
+        for s in range(len(edges)):
+            data_dmt += sliding_window_view(sub[s], time_size)[m + residual[:, s]]
+    else:
+        data_dmt = sub[:, m:m + time_size].sum(axis=0, keepdims=True)
+    return np.ascontiguousarray(data_ft, dtype=np.float32), data_dmt.astype(np.float32)
+
+
+def _save_cutout(filename, cand, header, data_ft, data_dmt):
+    # Attributes and dataset names follow your's Candidate.save_h5, as read by FETCH
+    import h5py
+
+    with h5py.File(filename, "w") as f:
+        f.attrs["cand_id"] = os.path.splitext(os.path.basename(filename))[0]
+        f.attrs["tcand"] = cand["tcand"]
+        f.attrs["dm"] = cand["dm"]
+        f.attrs["snr"] = cand["snr"]
+        f.attrs["width"] = cand["width"]
+        f.attrs["label"] = cand["label"]
+        f.attrs["filename"] = cand["file"]
+        for key in ("tsamp", "nchans", "foff", "fch1", "nspectra", "tstart"):
+            f.attrs[key] = header[key]
+        f.attrs["dm_range"] = (0.0, 2 * cand["dm"])
+        ft = f.create_dataset("data_freq_time", data=data_ft)
+        ft.dims[0].label = "time"
+        ft.dims[1].label = "frequency"
+        dmt = f.create_dataset("data_dm_time", data=data_dmt)
+        dmt.dims[0].label = "dm"
+        dmt.dims[1].label = "time"
+
+
+def _cutout_name(cand, header):
+    return (f"cand_tstart_{header['tstart']:.12f}_tcand_{cand['tcand']:.7f}_"
+            f"dm_{cand['dm']:.5f}_snr_{cand['snr']:.5f}.h5")
+
+
+def _process_block(task):
+    """
+    Read one block of a filterbank and write the cutouts of its candidates.
+
+    Returns the output file of each candidate, in the order given.
+    """
+    from your import Your
+
+    fil_file, start, stop, cands, output_dir, sizes = task
+    reader = Your(fil_file)
+    header = _cutout_header(reader)
+    freqs = np.asarray(reader.chan_freqs, dtype=np.float64)
+    nspectra = header["nspectra"]
+
+    # One sequential read, stored channel-major and padded with the
+    # channel medians beyond the ends of the file
+    lo = min(max(start, 0), stop)
+    hi = max(min(stop, nspectra), lo)
+    data = reader.get_data(lo, hi - lo) if hi > lo else np.zeros((0, len(freqs)), dtype=np.float32)
+    if len(data):
+        levels = np.median(data[:8192], axis=0).astype(np.float32)
+    else:
+        levels = np.zeros(len(freqs), dtype=np.float32)
+    block = np.empty((len(freqs), stop - start), dtype=np.float32)
+    block[:, :lo - start] = levels[:, None]
+    block[:, hi - start:] = levels[:, None]
+    block[:, lo - start:hi - start] = data.T
+    del data
+
+    masks = {}
+    files = []
+    for cand in cands:
+        path = cand["chan_mask_path"] if isinstance(cand["chan_mask_path"], str) else None
+        if path and path not in masks:
+            masks[path] = np.atleast_1d(np.loadtxt(path, dtype=np.intp))
+        data_ft, data_dmt = _make_cutout(block, start, cand, freqs, header["tsamp"], levels,
+                                         masks.get(path) if path else None, *sizes)
+        filename = os.path.join(output_dir, _cutout_name(cand, header))
+        _save_cutout(filename, cand, header, data_ft, data_dmt)
+        files.append(filename)
+    return files
+
+
+def _cutout_header(reader):
+    header = reader.your_header
+    return {"tsamp": float(header.tsamp), "nchans": int(header.nchans), "foff": float(header.foff),
+            "fch1": float(header.fch1), "nspectra": int(header.nspectra), "tstart": float(header.tstart)}
+
+
+def make_cutouts(candidates, output_dir, time_size=256, freq_size=256, dm_size=256, block_bytes=256 << 20,
+                 n_jobs=1, verbose=True):
+    """
+    Write dedispersed freq-time and DM-time cutouts of candidates to HDF5.
+
+    Candidates are sorted by file and time, and the windows each one needs
+    (its dispersion sweep plus the DM-time margin) are merged into blocks
+    of at most `block_bytes` of float32 data. Each block is one sequential
+    read of the filterbank, so a file is read once front to back instead
+    of once per candidate. Blocks are processed in file order across
+    `n_jobs` worker processes, each writing one .h5 file per candidate
+    with the datasets 'data_freq_time' (time, frequency) and
+    'data_dm_time' (DM, time) that your's candmaker writes.
+
+    Parameters
+    ----------
+    candidates : pandas.DataFrame
+        As returned by read_cutout_candidates
+
+    output_dir : str
+        Directory for the .h5 files
+
+    time_size, freq_size, dm_size : int
+        Cutout size in time bins, frequency channels and DM trials. Time
+        bins are max(1, width // 2) spectra wide; channels are averaged
+        into `freq_size` groups; DM trials span 0 to twice the DM.
+
+    block_bytes : int
+        Largest block read at once
+
+    n_jobs : int
+        Worker processes, <= 0 uses all CPUs
+
+    verbose : bool
+        Print progress per filterbank
+
+    Returns
+    -------
+    candidates : pandas.DataFrame
+        The input with an 'h5' column holding each cutout file
+    """
+    from your import Your
+
+    os.makedirs(output_dir, exist_ok=True)
+    candidates = candidates.reset_index(drop=True)
+    files = np.empty(len(candidates), dtype=object)
+    sizes = (time_size, freq_size, dm_size)
+
+    tasks = []
+    for fil_file, group in candidates.groupby('file', sort=True):
+        reader = Your(fil_file)
+        header = _cutout_header(reader)
+        freqs = np.asarray(reader.chan_freqs, dtype=np.float64)
+        start, stop, centre, decim, margin = _cutout_windows(group, header, freqs, time_size, dm_size)
+        records = group.assign(centre=centre, decim=decim, margin=margin).to_dict("records")
+        blocks = plan_cutout_blocks(start, stop, max(1, block_bytes // (4 * header["nchans"])))
+        if verbose:
+            print(f"{fil_file}: {len(group)} candidates in {len(blocks)} reads")
+        for b0, b1, idx in blocks:
+            tasks.append((group.index[idx], (fil_file, b0, b1, [records[i] for i in idx], output_dir, sizes)))
+
+    pool = _make_pool(n_jobs, backend="process")
+    try:
+        results = pool.map(_process_block, [task for _, task in tasks]) if pool is not None \
+            else map(_process_block, [task for _, task in tasks])
+        for (rows, _), names in zip(tasks, results):
+            files[rows] = names
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return candidates.assign(h5=files)
@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+import heapq
+import os
+import shutil
+import signal
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+# Useful functions for dedispersing filterbank data with PRESTO
+
+
+def read_ddplan(parameters_file):
+    """
+    Read a DDplan parameters table (whitespace separated, with the columns
+    Low_DM, High_DM, dDM, DownSamp, dsubDM, DM_call and calls).
+    """
+    return pd.read_csv(parameters_file, sep=r'\s+')
+
+
+def _plan_calls(plan):
+    # One dict per prepsubband call of a DDplan table, in plan order
+    calls = []
+    for row_index, row in enumerate(plan.itertuples(index=False)):
+        for ii in range(int(row.calls)):
+            calls.append({
+                "row": row_index,
+                "subDM": row.Low_DM + (ii + 0.5) * row.dsubDM,
+                "loDM": row.Low_DM + ii * row.dsubDM,
+                "dDM": row.dDM,
+                "numdms": int(row.DM_call),
+                "downsamp": int(row.DownSamp),
+            })
+    return calls
+
+
+def plan_prepsubband_jobs(plan, basename, rawfiles, mask, nsub=32, outsubs=None):
+    """
+    Build the list of prepsubband calls for a DDplan table.
+
+    Parameters
+    ----------
+    plan : pandas.DataFrame
+        DDplan table as returned by read_ddplan
+
+    basename : str
+        Output base name passed to prepsubband -o
+
+    rawfiles : str
+        Input filterbank file
+
+    mask : str
+        RFI mask file
+
+    nsub : int
+        Number of subbands
+
+    outsubs : bool
+        Create subbands first (-sub) and dedisperse those; by default only
+        when the plan reaches above DM 1000
+
+    Returns
+    -------
+    jobs : list of dict
+        In plan order, each with a unique 'name' (also its log file name),
+        'cmd' (shell command line), 'after' (name of the job that must
+        succeed first, or None) and the plan values 'subDM', 'loDM', 'dDM',
+        'numdms' and 'downsamp' (total, relative to the raw data). A subband
+        dedispersion job depends on the -sub call that writes its
+        .sub[0-9]* files; all other jobs are independent.
+    """
+    if outsubs is None:
+        outsubs = plan["High_DM"].max() > 1000
+
+    jobs = []
+    for call in _plan_calls(plan):
+        subDM, loDM, dDM, dmspercall, downsamp = (call[k] for k in ("subDM", "loDM", "dDM", "numdms", "downsamp"))
+        values = {"subDM": subDM, "loDM": loDM, "dDM": dDM, "numdms": dmspercall}
+        if outsubs:
+            # Get our downsampling right
+            subdownsamp = downsamp // 2
+            datdownsamp = 2
+            if downsamp < 2:
+                subdownsamp = datdownsamp = 1
+            sub_name = "%04d_sub_DM%.2f" % (len(jobs), subDM)
+            jobs.append({
+                "name": sub_name,
+                "cmd": "prepsubband -sub -subdm %.2f -nsub %d -downsamp %d -o %s %s" %
+                       (subDM, nsub, subdownsamp, basename, rawfiles),
+                "after": None,
+                **values, "numdms": 0, "downsamp": subdownsamp, "subbands": True,
+            })
+            subnames = basename + "_DM%.2f.sub[0-9]*" % subDM
+            jobs.append({
+                "name": "%04d_DM%.2f" % (len(jobs), loDM),
+                "cmd": "prepsubband -lodm %.2f -dmstep %.2f -numdms %d -downsamp %d -mask %s -o %s %s -nobary" %
+                       (loDM, dDM, dmspercall, datdownsamp, mask, basename, subnames),
+                "after": sub_name,
+                **values, "downsamp": subdownsamp * datdownsamp, "from_subbands": True,
+            })
+        else:
+            jobs.append({
+                "name": "%04d_DM%.2f" % (len(jobs), loDM),
+                "cmd": "prepsubband -nsub %d -lodm %.2f -dmstep %.2f -numdms %d -downsamp %d -mask %s -o %s %s -nobary" %
+                       (nsub, loDM, dDM, dmspercall, downsamp, mask, basename, rawfiles),
+                "after": None,
+                **values, "downsamp": downsamp,
+            })
+    return jobs
+
+
+def estimate_job_costs(jobs, header, nsub=32):
+    """
+    Add a cost estimate to each job from plan_prepsubband_jobs.
+
+    'out_bytes' is what the call writes: 4-byte .dat samples for each DM
+    (numdms * nspectra / downsamp * 4), or 2-byte samples for each
+    subband of a -sub call. 'cost' counts the samples prepsubband
+    touches: the raw channels it reads plus, per output DM, the subbands
+    it shifts and sums. It is a relative CPU cost, not a time.
+    """
+    nspectra, nchans = header["nspectra"], header["nchans"]
+    for job in jobs:
+        n_out = nspectra // job["downsamp"]
+        if job.get("subbands"):
+            job["out_bytes"] = nsub * n_out * 2
+            job["cost"] = nspectra * nchans
+        elif job.get("from_subbands"):
+            job["out_bytes"] = job["numdms"] * n_out * 4
+            job["cost"] = job["numdms"] * n_out * nsub
+        else:
+            job["out_bytes"] = job["numdms"] * n_out * 4
+            job["cost"] = nspectra * nchans + job["numdms"] * n_out * nsub
+    return jobs
+
+
+def order_longest_first(jobs):
+    """
+    Reorder jobs so the most expensive dependency chains start first.
+
+    Jobs are grouped with the jobs that depend on them and the groups
+    sorted by total 'cost', largest first, keeping plan order inside a
+    group. Starting long chains early keeps workers busy at the tail of
+    the run instead of waiting on one late, long call.
+    """
+    root = {}
+    for job in jobs:
+        after = job.get("after")
+        root[job["name"]] = root[after] if after else job["name"]
+    totals = {}
+    for job in jobs:
+        totals[root[job["name"]]] = totals.get(root[job["name"]], 0) + job.get("cost", 0)
+    position = {job["name"]: i for i, job in enumerate(jobs)}
+    return sorted(jobs, key=lambda job: (-totals[root[job["name"]]], position[root[job["name"]]],
+                                         position[job["name"]]))
+
+
+def simulate_schedule(jobs, n_jobs=1):
+    """
+    Makespan, in cost units, of running `jobs` as run_jobs would start
+    them on `n_jobs` workers, with each job taking its 'cost'.
+    """
+    n_jobs = max(1, n_jobs)
+    end_time = {}
+    running = []
+    queue = list(jobs)
+    now = 0.0
+    while queue:
+        # Start ready jobs in list order while workers are free
+        for job in list(queue):
+            if len(running) >= n_jobs:
+                break
+            if end_time.get(job.get("after"), 0.0 if job.get("after") is None else np.inf) <= now:
+                end_time[job["name"]] = now + job["cost"]
+                heapq.heappush(running, end_time[job["name"]])
+                queue.remove(job)
+        if not running:
+            break
+        # Advance to the next job completion
+        now = heapq.heappop(running)
+        while running and running[0] <= now:
+            heapq.heappop(running)
+    return max(end_time.values(), default=0.0)
+
+
+def check_free_space(out_bytes, output_dir="."):
+    """Return (free_bytes, enough) for writing `out_bytes` to `output_dir`."""
+    free = shutil.disk_usage(output_dir).free
+    return free, out_bytes <= free
+
+
+def _launch(job, log_dir, attempt):
+    # Start one attempt of a job with its output going to the job's log file
+    log_file = os.path.join(log_dir, f"{job['name']}.log")
+    log = open(log_file, "a")
+    log.write(f"# attempt {attempt}: {job['cmd']}\n")
+    log.flush()
+    # A session of its own lets the whole shell pipeline be terminated together
+    proc = subprocess.Popen(job["cmd"], shell=True, stdout=log, stderr=subprocess.STDOUT, cwd=job.get("cwd"),
+                            start_new_session=True)
+    return proc, log, log_file
+
+
+def _terminate(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def run_jobs(jobs, n_jobs=1, retries=0, log_dir=".", keep_going=False, poll=0.2, verbose=True):
+    """
+    Run shell jobs in a bounded pool of subprocesses, honouring 'after'.
+
+    Jobs start in list order as soon as a slot is free and the job they
+    depend on has succeeded. Each job writes its output and exit code to
+    <log_dir>/<name>.log. A failing job is retried up to `retries` times.
+    If it still fails, its dependents are skipped and, unless
+    `keep_going` is set, no new jobs are started and running ones are
+    terminated. Ctrl-C also terminates running jobs.
+
+    Parameters
+    ----------
+    jobs : list of dict
+        Jobs with at least 'name', 'cmd' and 'after' (see plan_prepsubband_jobs)
+
+    n_jobs : int
+        Maximum number of concurrent jobs
+
+    retries : int
+        Extra attempts for a failing job
+
+    log_dir : str
+        Directory for per-job logs (created if needed)
+
+    keep_going : bool
+        Keep running independent jobs after a failure
+
+    poll : float
+        Seconds between checks on running jobs
+
+    verbose : bool
+        Print each command as it starts and each failure
+
+    Returns
+    -------
+    results : dict
+        Job name to {'status', 'returncode', 'attempts', 'elapsed', 'log'},
+        status being 'done', 'failed', 'skipped' or 'cancelled'
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    n_jobs = max(1, n_jobs)
+    results = {job["name"]: {"status": "pending", "returncode": None, "attempts": 0,
+                             "elapsed": 0.0, "log": None} for job in jobs}
+    queue = list(jobs)
+    running = {}
+    aborted = False
+
+    try:
+        while queue or running:
+            # Start every ready job that fits, in plan order
+            if not aborted:
+                for job in list(queue):
+                    if len(running) >= n_jobs:
+                        break
+                    after = job.get("after")
+                    state = results[after]["status"] if after else "done"
+                    if state in ("failed", "skipped", "cancelled"):
+                        results[job["name"]]["status"] = "skipped"
+                        queue.remove(job)
+                    elif state == "done":
+                        queue.remove(job)
+                        result = results[job["name"]]
+                        result["attempts"] += 1
+                        if verbose:
+                            print("'%s'" % job["cmd"])
+                        proc, log, result["log"] = _launch(job, log_dir, result["attempts"])
+                        running[job["name"]] = (job, proc, log, time.time())
+            elif queue:
+                for job in queue:
+                    results[job["name"]]["status"] = "cancelled"
+                queue = []
+
+            time.sleep(poll if running else 0)
+            for name, (job, proc, log, start) in list(running.items()):
+                code = proc.poll()
+                if code is None:
+                    continue
+                result = results[name]
+                result["elapsed"] += time.time() - start
+                result["returncode"] = code
+                log.write(f"# exit code {code}\n")
+                log.close()
+                del running[name]
+                if code == 0:
+                    result["status"] = "done"
+                elif aborted:
+                    result["status"] = "cancelled"
+                elif result["attempts"] <= retries:
+                    if verbose:
+                        print(f"Job {name} failed with exit code {code}, retrying")
+                    queue.insert(0, job)
+                else:
+                    result["status"] = "failed"
+                    if verbose:
+                        print(f"Job {name} failed with exit code {code}, see {result['log']}")
+                    if not keep_going:
+                        aborted = True
+                        for _, other, _, _ in running.values():
+                            _terminate(other)
+    except KeyboardInterrupt:
+        print("Interrupted, terminating running jobs...")
+        for _, proc, _, _ in running.values():
+            _terminate(proc)
+        raise
+    finally:
+        for name, (job, proc, log, start) in running.items():
+            proc.wait()
+            results[name]["status"] = "cancelled"
+            results[name]["returncode"] = proc.returncode
+            log.close()
+        for job in queue:
+            if results[job["name"]]["status"] == "pending":
+                results[job["name"]]["status"] = "cancelled"
+
+    return results
+
+
+# Dispersion constant in s MHz^2 pc^-1 cm^3, as used by PRESTO, so sample
+# shifts match prepsubband's. io.DM_delay keeps the rounded 4.15e3 for the
+# Delay_s clustering feature, where the 0.03% difference does not matter
+DM_CONSTANT = 4.148808e3
+
+
+def read_rfifind_mask(mask_file):
+    """
+    Read a PRESTO rfifind .mask file.
+
+    Returns
+    -------
+    mask : dict
+        'nchan', 'nint', 'ptsperint', 'zap_chans' (channels masked for
+        the whole observation), 'zap_ints' (intervals masked in all
+        channels) and 'zap_chans_per_int' (list of channel arrays, one per
+        interval). Channel 0 is the lowest frequency, as in PRESTO.
+    """
+    with open(mask_file, "rb") as f:
+        np.fromfile(f, dtype=np.float64, count=6)  # sigmas, MJD, dtint, lofreq, df
+        nchan, nint, ptsperint = (int(v) for v in np.fromfile(f, dtype=np.int32, count=3))
+        nzap = int(np.fromfile(f, dtype=np.int32, count=1)[0])
+        zap_chans = np.fromfile(f, dtype=np.int32, count=nzap)
+        nzap = int(np.fromfile(f, dtype=np.int32, count=1)[0])
+        zap_ints = np.fromfile(f, dtype=np.int32, count=nzap)
+        nzap_per_int = np.fromfile(f, dtype=np.int32, count=nint)
+        zap_chans_per_int = [np.fromfile(f, dtype=np.int32, count=int(n)) for n in nzap_per_int]
+    return {"nchan": nchan, "nint": nint, "ptsperint": ptsperint, "zap_chans": zap_chans,
+            "zap_ints": zap_ints, "zap_chans_per_int": zap_chans_per_int}
+
+
+def _sample_delays(dm, freqs, f_ref, tsamp):
+    # Dispersion delays relative to f_ref, rounded to whole samples
+    return np.floor(DM_CONSTANT * dm * (freqs ** -2.0 - f_ref ** -2.0) / tsamp + 0.5).astype(np.intp)
+
+
+def _apply_mask(block, t0, mask, flip, fill):
+    """
+    Replace masked samples of a (nchans, n) block starting at spectrum t0
+    with the channel levels `fill`, which is what a channel contributes
+    when it carries no signal.
+    """
+    nchans, n = block.shape
+    def channels(c):
+        c = np.asarray(c, dtype=np.intp)
+        return nchans - 1 - c if flip else c
+    if len(mask["zap_chans"]):
+        chans = channels(mask["zap_chans"])
+        block[chans] = fill[chans, None]
+    ptsperint = mask["ptsperint"]
+    zap_ints = set(int(i) for i in mask["zap_ints"])
+    for interval in range(t0 // ptsperint, min((t0 + n - 1) // ptsperint + 1, mask["nint"])):
+        lo = max(interval * ptsperint - t0, 0)
+        hi = min((interval + 1) * ptsperint - t0, n)
+        if interval in zap_ints:
+            block[:, lo:hi] = fill[:, None]
+        elif len(mask["zap_chans_per_int"][interval]):
+            chans = channels(mask["zap_chans_per_int"][interval])
+            block[chans, lo:hi] = fill[chans, None]
+    return block
+
+
+def _dedisperse_call(block, call, t0, n_valid):
+    """
+    Two-stage dedispersion of one DDplan call over one block.
+
+    Channels are first shifted to the top of their subband at the call's
+    subband DM and summed, the subbands are downsampled, then each output
+    DM shifts the subbands to the top of the band and sums them.
+    """
+    ds = call["downsamp"]
+    n_out = call["n_block"] // ds
+    length = n_out * ds + call["stage2"].max() * ds
+    sub = np.zeros((call["nsub"], length), dtype=np.float32)
+    for c, d in enumerate(call["stage1"]):
+        sub[c // call["chans_per_sub"]] += block[c, d:d + length]
+    sub = sub.reshape(call["nsub"], -1, ds).sum(axis=2)
+
+    series = np.zeros((call["numdms"], n_out), dtype=np.float32)
+    for i, delays in enumerate(call["stage2"]):
+        row = series[i]
+        for s, d in enumerate(delays):
+            row += sub[s, d:d + n_out]
+    o0 = t0 // ds
+    n = n_valid // ds
+    call["out"][call["dm_start"]:call["dm_start"] + call["numdms"], o0:o0 + n] = series[:, :n]
+
+
+def dedisperse_filterbank(fil_file, plan, mask_file=None, nsub=32, output_dir=None,
+                          chunk_size=1 << 16, n_jobs=1, verbose=True):
+    """
+    Dedisperse a filterbank file in-process along a DDplan.
+
+    Every DDplan call is dedispersed in two stages as prepsubband does:
+    channels are summed into `nsub` subbands at the call's subband DM,
+    downsampled, and the subbands shifted and summed for each of the
+    call's DMs. The file is streamed in blocks of `chunk_size` spectra
+    (plus the largest dispersion delay), masked with an rfifind mask if
+    given, and the calls of each block run on `n_jobs` threads.
+
+    Parameters
+    ----------
+    fil_file : str
+        Filterbank file, read with your.Your
+
+    plan : pandas.DataFrame
+        DDplan table as returned by read_ddplan
+
+    mask_file : str
+        PRESTO rfifind .mask file (optional)
+
+    nsub : int
+        Number of subbands, must divide the number of channels
+
+    output_dir : str
+        If given, each DDplan row is written to
+        <output_dir>/<basename>_row<k>.npy and returned memory-mapped,
+        with its DMs in <basename>_row<k>_dms.npy
+
+    chunk_size : int
+        Spectra per block (rounded up to a multiple of every DownSamp)
+
+    n_jobs : int
+        Threads, <= 0 uses all CPUs
+
+    verbose : bool
+        Print progress per block
+
+    Returns
+    -------
+    rows : list of dict
+        One per DDplan row: 'dms' (numdms,), 'downsamp', 'tsamp' (s) and
+        'data', the (numdms, nspectra // downsamp) float32 DM-time array
+    """
+    from your import Your
+    from concurrent.futures import ThreadPoolExecutor
+
+    reader = Your(fil_file)
+    header = reader.your_header
+    nspectra, nchans, tsamp = int(header.nspectra), int(header.nchans), float(header.tsamp)
+    if nchans % nsub:
+        raise ValueError(f"nsub={nsub} does not divide the {nchans} channels.")
+    freqs = np.asarray(reader.chan_freqs, dtype=np.float64)
+    chans_per_sub = nchans // nsub
+    sub_top = freqs.reshape(nsub, chans_per_sub).max(axis=1)
+    f_top = freqs.max()
+    mask = read_rfifind_mask(mask_file) if mask_file else None
+    flip = freqs[0] > freqs[-1]
+
+    # Median level of each channel, used for masked samples and past the end of the file
+    levels = np.median(reader.get_data(0, min(nspectra, 8192)), axis=0).astype(np.float32)
+
+    calls = _plan_calls(plan)
+    step = int(np.lcm.reduce([call["downsamp"] for call in calls])) if calls else 1
+    chunk_size = -(-chunk_size // step) * step
+
+    rows = []
+    for k, row in enumerate(plan.itertuples(index=False)):
+        row_calls = [call for call in calls if call["row"] == k]
+        dms = np.concatenate([call["loDM"] + call["dDM"] * np.arange(call["numdms"]) for call in row_calls])
+        ds = int(row.DownSamp)
+        shape = (len(dms), nspectra // ds)
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            stem = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(fil_file))[0]}_row{k}")
+            np.save(stem + "_dms.npy", dms)
+            data = np.lib.format.open_memmap(stem + ".npy", mode="w+", dtype=np.float32, shape=shape)
+        else:
+            data = np.zeros(shape, dtype=np.float32)
+        rows.append({"dms": dms, "downsamp": ds, "tsamp": tsamp * ds, "data": data})
+        dm_start = 0
+        for call in row_calls:
+            dm_grid = call["loDM"] + call["dDM"] * np.arange(call["numdms"])
+            call.update({
+                "nsub": nsub, "chans_per_sub": chans_per_sub, "n_block": chunk_size, "dm_start": dm_start,
+                "stage1": _sample_delays(call["subDM"], freqs, np.repeat(sub_top, chans_per_sub), tsamp),
+                "stage2": _sample_delays(dm_grid[:, None], sub_top[None, :], f_top, tsamp * ds),
+                "out": data,
+            })
+            dm_start += call["numdms"]
+
+    # Each block carries enough spectra after it for the largest delay of any call
+    overlap = max((call["stage1"].max() + call["stage2"].max() * call["downsamp"] for call in calls), default=0)
+    n_jobs = os.cpu_count() if n_jobs is None or n_jobs <= 0 else n_jobs
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for t0 in range(0, nspectra, chunk_size):
+            n_read = min(chunk_size + overlap, nspectra - t0)
+            block = np.ascontiguousarray(reader.get_data(t0, n_read).T, dtype=np.float32)
+            if mask is not None:
+                block = _apply_mask(block, t0, mask, flip, levels)
+            if n_read < chunk_size + overlap:
+                pad = np.repeat(levels[:, None], chunk_size + overlap - n_read, axis=1)
+                block = np.concatenate([block, pad], axis=1)
+            n_valid = min(chunk_size, nspectra - t0)
+            futures = [pool.submit(_dedisperse_call, block, call, t0, n_valid) for call in calls]
+            for future in futures:
+                future.result()
+            if verbose:
+                print(f"Dedispersed {t0 + n_valid}/{nspectra} spectra")
+
+    for row in rows:
+        if isinstance(row["data"], np.memmap):
+            row["data"].flush()
+    return rows
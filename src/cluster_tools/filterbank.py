@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+
+# Filterbank headers, read with `your` and cached across runs
+
+
+def read_filterbank_header(fil_file):
+    """
+    Read the sizes needed for cost estimates from a filterbank header.
+
+    Returns
+    -------
+    header : dict
+        'nspectra', 'nchans', 'tsamp' (s) and 'nbits'
+    """
+    from your import Your
+
+    header = Your(fil_file).your_header
+    return {"nspectra": int(header.nspectra), "nchans": int(header.nchans),
+            "tsamp": float(header.tsamp), "nbits": int(header.nbits)}
+
+
+HEADER_CACHE_VERSION = 1
+
+
+def default_header_cache():
+    # Per-user cache file, shared by every run on the machine
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "cluster_tools", "filterbank_headers.json")
+
+
+def _read_header_entry(fil_file):
+    # Header of one file for a worker pool, with the error instead of raising
+    try:
+        return read_filterbank_header(fil_file), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def read_filterbank_headers(fil_files, cache_file=None, pool=None):
+    """
+    Read the headers of many filterbank files through a persistent cache.
+
+    Entries are keyed by absolute path and reused while the file's size
+    and modification time are unchanged, so repeated runs over the same
+    observations open no filterbank at all. Files missing from the cache
+    are read serially or across `pool`, and the cache is rewritten
+    atomically when anything changed.
+
+    Parameters
+    ----------
+    fil_files : list
+        Filterbank file paths
+
+    cache_file : str
+        JSON cache path, or None to read every header without caching
+
+    pool : concurrent.futures.Executor
+        Optional pool used for the headers that are not cached
+
+    Returns
+    -------
+    headers : dict
+        Path (as given) to the read_filterbank_header dict
+
+    Raises
+    ------
+    OSError
+        If a header cannot be read, naming the file
+    """
+    from .io import _file_signature
+
+    entries = {}
+    if cache_file is not None:
+        try:
+            with open(cache_file) as fh:
+                cached = json.load(fh)
+            if cached.get("version") == HEADER_CACHE_VERSION:
+                entries = cached["files"]
+        except (OSError, ValueError, KeyError):
+            entries = {}
+
+    headers = {}
+    missing = []
+    signatures = {}
+    for f in dict.fromkeys(fil_files):
+        key = os.path.abspath(f)
+        signatures[f] = _file_signature(f)
+        entry = entries.get(key)
+        if entry is not None and signatures[f] == (entry["size"], entry["mtime_ns"]):
+            headers[f] = entry["header"]
+        else:
+            missing.append(f)
+
+    results = pool.map(_read_header_entry, missing) if pool is not None else map(_read_header_entry, missing)
+    for f, (header, err) in zip(missing, results):
+        if err is not None:
+            raise OSError(f"Cannot read filterbank header of {f}: {err}")
+        headers[f] = header
+        if signatures[f] is not None:
+            entries[os.path.abspath(f)] = {"size": signatures[f][0], "mtime_ns": signatures[f][1], "header": header}
+
+    if cache_file is not None and missing:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+            # Unique per thread, as the clustering service converts in threads of one process
+            tmp = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as fh:
+                json.dump({"version": HEADER_CACHE_VERSION, "files": entries}, fh)
+            os.replace(tmp, cache_file)
+        except OSError:
+            pass
+    return headers
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+import cProfile
+import fnmatch
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Recorder that library stages report to, None when nothing is recorded
+_active = None
+
+
+def _read_status(field):
+    # Memory field of /proc/self/status in bytes, or None off Linux
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss():
+    peak = _read_status("VmHWM")
+    if peak is None:
+        # ru_maxrss is in kB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return peak
+
+
+def _reset_peak_rss():
+    # Restart the kernel's peak RSS from the current RSS (Linux only)
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class MetricsRecorder:
+    """
+    Per-stage wall time, CPU time, row counts and peak RSS of one run.
+
+    Stages are opened with `stage` and may nest; repeated stages with the
+    same path (e.g. one per chunk) are added up into one record with a
+    call count. On Linux the kernel's peak RSS is reset when a stage
+    starts, so each stage reports its own peak; elsewhere the peak is
+    that of the process so far. Stages whose name or path matches one of
+    the `profile` patterns run under cProfile, one .prof file per stage
+    in `profile_dir`.
+
+    Parameters
+    ----------
+    profile : list
+        Stage names or fnmatch patterns to profile (e.g. 'dbscan_labels',
+        'load*')
+
+    profile_dir : str
+        Directory for the .prof files (default: current directory)
+    """
+
+    def __init__(self, profile=(), profile_dir=None):
+        self.stages = {}
+        self.profile = list(profile)
+        self.profile_dir = profile_dir or "."
+        self.started = time.time()
+        self.status = "running"
+        self._profiles = {}
+        self._profiling = False
+        self._open = []
+        self._thread = threading.get_ident()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._children0 = self._children_cpu()
+        self._per_stage_peak = _reset_peak_rss()
+        self._max_peak = _peak_rss()
+
+    @staticmethod
+    def _children_cpu():
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def _fold_peak(self, peak):
+        # Carry a peak seen inside a stage up to every stage still open
+        for entry in self._open:
+            entry["peak"] = max(entry["peak"], peak)
+        self._max_peak = max(self._max_peak, peak)
+
+    @contextmanager
+    def stage(self, name, rows=None, **info):
+        """
+        Record the enclosed block as stage `name`, nested under the stages
+        already open. The yielded dict may be updated with 'rows' and any
+        other JSON-serialisable values to store with the stage.
+        """
+        if threading.get_ident() != self._thread:
+            # Stages run by worker threads are covered by their caller
+            yield {}
+            return
+
+        path = "/".join([entry["path"] for entry in self._open[-1:]] + [name])
+        record = dict(info)
+        if rows is not None:
+            record["rows"] = rows
+
+        self._fold_peak(_peak_rss())
+        if self._per_stage_peak:
+            _reset_peak_rss()
+        entry = {"path": path, "peak": _peak_rss()}
+        self._open.append(entry)
+        if path not in self.stages:
+            self.stages[path] = {"stage": path, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "child_cpu_s": 0.0,
+                                 "peak_rss_mb": 0.0}
+
+        profiler = None
+        if not self._profiling and any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(path, p)
+                                       for p in self.profile):
+            profiler = self._profiles.setdefault(path, cProfile.Profile())
+            self._profiling = True
+            profiler.enable()
+
+        wall0, cpu0, children0 = time.perf_counter(), time.process_time(), self._children_cpu()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+            children = self._children_cpu() - children0
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            self._open.pop()
+            peak = max(entry["peak"], _peak_rss())
+            self._fold_peak(peak)
+            self._add(path, wall, cpu, children, peak, record)
+
+    def _add(self, path, wall, cpu, children, peak, record):
+        total = self.stages[path]
+        total["calls"] += 1
+        total["wall_s"] += wall
+        total["cpu_s"] += cpu
+        total["child_cpu_s"] += children
+        total["peak_rss_mb"] = max(total["peak_rss_mb"], peak / 2 ** 20)
+        for key, value in record.items():
+            if key == "rows" and value is not None:
+                total["rows"] = total.get("rows", 0) + int(value)
+            else:
+                total[key] = value
+
+    def to_dict(self):
+        """
+        The run as a JSON-serialisable dict: command line, totals and one
+        entry per stage in the order the stages were first entered.
+        """
+        self._fold_peak(_peak_rss())
+        return {
+            "command": [os.path.basename(sys.argv[0])] + sys.argv[1:],
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "status": self.status,
+            "pid": os.getpid(),
+            "host": os.uname().nodename if hasattr(os, "uname") else None,
+            "wall_s": time.perf_counter() - self._wall0,
+            "cpu_s": time.process_time() - self._cpu0,
+            "child_cpu_s": self._children_cpu() - self._children0,
+            "peak_rss_mb": self._max_peak / 2 ** 20,
+            "peak_rss_scope": "stage" if self._per_stage_peak else "process",
+            "stages": list(self.stages.values()),
+            "profiles": {path: self._profile_file(path) for path in self._profiles},
+        }
+
+    def _profile_file(self, path):
+        return os.path.join(self.profile_dir, path.replace("/", ".") + ".prof")
+
+    def dump_profiles(self):
+        for path, profiler in self._profiles.items():
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(self._profile_file(path))
+
+    def write(self, filename):
+        """Write to_dict() as JSON, replacing `filename` atomically."""
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=1, default=float)
+        os.replace(tmp, filename)
+
+
+@contextmanager
+def recording(recorder):
+    """Send the stages run inside the block to `recorder`."""
+    global _active
+    previous, _active = _active, recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+@contextmanager
+def stage(name, rows=None, **info):
+    """
+    Record a stage with the active recorder; does nothing (and costs
+    almost nothing) when no recorder is active.
+    """
+    if _active is None:
+        yield {}
+        return
+    with _active.stage(name, rows, **info) as record:
+        yield record
+
+
+def instrumented(name=None):
+    """
+    Decorator recording every call of a function as a stage (default:
+    the function name), with the length of its result as 'rows'.
+    """
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    record["rows"] = len(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def add_metrics_arguments(parser):
+    """Add the --metrics and --profile options shared by the CLIs."""
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Write wall time, CPU time, rows and peak RSS of every stage as JSON to FILE."
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="+",
+        default=[],
+        metavar="STAGE",
+        help="Run these stages under cProfile (names or patterns such as 'load*'); "
+             "<stage>.prof files are written next to the metrics file."
+    )
+
+
+@contextmanager
+def cli_metrics(args):
+    """
+    Record the stages of a CLI run as requested by --metrics / --profile,
+    writing the JSON and profiles when the block exits, also on errors.
+    """
+    if not args.metrics and not args.profile:
+        yield None
+        return
+    profile_dir = os.path.dirname(os.path.abspath(args.metrics)) if args.metrics else "."
+    recorder = MetricsRecorder(profile=args.profile, profile_dir=profile_dir)
+    try:
+        with recording(recorder):
+            yield recorder
+        recorder.status = "ok"
+    except BaseException as e:
+        recorder.status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        recorder.dump_profiles()
+        if args.metrics:
+            recorder.write(args.metrics)
+            print(f"Saved metrics to: {args.metrics}")
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import os
+import re
+import numpy as np
+import pandas as pd
+from sklearn.cluster import DBSCAN
+
+from .io import SINGLEPULSE_COLUMNS
+from .clustering import _fof_labels, select_strategy
+
+
+# DM trial tag of a PRESTO .singlepulse file name, e.g. obs_DM12.30.singlepulse
+_DM_TRIAL = re.compile(r"_DM(\d+(?:\.\d+)?)")
+
+
+class DMProgress:
+    """
+    How far in Time every DM trial has been searched, for the watermark
+    of OnlineDBSCAN.finalize.
+
+    PRESTO writes one .singlepulse file per DM trial, named with a
+    _DM<value> tag (per trial and time segment in segmented searches,
+    under the same tag). A trial has been searched up to the latest
+    candidate Time of its files read so far. Candidates of one trial
+    arrive in Time order but trials arrive in any order, and one file may
+    cover the whole observation, so the watermark is the least of these
+    times over all `n_dms` trials, and -inf until every trial has been
+    seen. Trials whose files held no candidates do not hold it back.
+
+    Parameters
+    ----------
+    n_dms : int
+        Number of DM trials of the search (default: unknown, so that no
+        watermark is given)
+    """
+
+    def __init__(self, n_dms=None):
+        self.n_dms = n_dms
+        # DM trial -> latest candidate Time, -inf while it has none
+        self.searched = {}
+
+    def update(self, filename, times):
+        """Record the candidate Times read from `filename`."""
+        match = _DM_TRIAL.search(os.path.basename(filename))
+        trial = match.group(1) if match else os.path.basename(filename)
+        latest = float(np.max(times)) if len(times) else -np.inf
+        self.searched[trial] = max(self.searched.get(trial, -np.inf), latest)
+
+    def watermark(self):
+        """Time before which every trial has been searched."""
+        if self.n_dms is None or len(self.searched) < self.n_dms:
+            return -np.inf
+        times = [t for t in self.searched.values() if t > -np.inf]
+        return min(times) if times else -np.inf
+
+
+class OnlineDBSCAN:
+    """
+    Incremental DBSCAN over candidates that arrive in batches.
+
+    Each call to `add` inserts a batch and re-clusters only the Time
+    window it can affect: the batch span widened by 2 * eps (points whose
+    core status or links may change), then widened to the full extent of
+    every existing cluster inside it, plus a 2 * eps margin of context.
+    Labels outside that window are untouched, so per-update cost scales
+    with the new candidates and the clusters they touch, and the result
+    matches a full DBSCAN run up to label numbering and the choice between
+    clusters for shared border points.
+
+    Cluster ids are stable: a re-clustered cluster keeps the id of the
+    existing cluster it shares the most candidates with (the smallest id
+    on ties), so clusters that are not touched never change id.
+
+    `finalize(watermark)` promises that no later candidate has Time below
+    `watermark`, returns the clusters that can no longer change and drops
+    candidates that are no longer needed as context. DMProgress derives
+    such a watermark from the files read so far. Candidates that break the
+    promise are still clustered, against the candidates held around them,
+    but cannot join clusters that were already returned; they are counted
+    in n_late.
+
+    Parameters
+    ----------
+    eps, min_samples :
+        DBSCAN parameters
+
+    cluster_column : list
+        Columns clustered on, must include 'Time' (default: ['Delay_s', 'Time'])
+
+    backend : str
+        'sklearn' or 'fof' (see FOF_clustering)
+    """
+
+    def __init__(self, eps=0.05, min_samples=5, cluster_column=None, backend="sklearn"):
+        if cluster_column is None:
+            cluster_column = ['Delay_s', 'Time']
+        if 'Time' not in cluster_column:
+            raise ValueError(f"Online clustering needs 'Time' among the cluster columns {cluster_column}.")
+        if backend not in ("sklearn", "fof"):
+            raise ValueError(f"Unknown backend '{backend}', expected 'sklearn' or 'fof'.")
+        self.eps = eps
+        self.min_samples = min_samples
+        self.cluster_column = list(cluster_column)
+        self.backend = backend
+        self.n_late = 0
+        self._next_id = 0
+        self._final_time = -np.inf
+        # Held candidates: one Time-sorted buffer per column (the first _n
+        # entries are used), with 'cluster' and 'final' alongside
+        self._columns = None
+        self._buffers = {}
+        self._n = 0
+        # First and last Time of every open cluster
+        self._extent_id = np.empty(0, dtype=np.int64)
+        self._extent_lo = np.empty(0, dtype=np.float64)
+        self._extent_hi = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        return self._n
+
+    def _labels(self, X):
+        if self.backend == "fof":
+            return _fof_labels(X, self.eps, self.min_samples)[0]
+        options = select_strategy("dbscan", len(X), X.shape[1])
+        return DBSCAN(eps=self.eps, min_samples=self.min_samples, **options).fit_predict(X)
+
+    def _insert(self, batch):
+        """
+        Merge a batch into the Time-sorted buffers, after held candidates of
+        equal Time. Only held candidates later than the earliest new one
+        move, so a batch arriving in Time order costs O(len(batch)).
+        """
+        if self._columns is None:
+            self._columns = [name for name in batch.columns if name not in ('cluster', 'final')]
+            self._buffers = {name: np.empty(0, dtype=batch[name].dtype) for name in self._columns}
+            self._buffers['cluster'] = np.empty(0, dtype=np.int64)
+            self._buffers['final'] = np.empty(0, dtype=bool)
+
+        order = np.argsort(batch['Time'].to_numpy(), kind='stable')
+        new = {name: batch[name].to_numpy()[order] for name in self._columns}
+        new['cluster'] = np.full(len(order), -1, dtype=np.int64)
+        new['final'] = np.zeros(len(order), dtype=bool)
+
+        n, m = self._n, len(order)
+        if n + m > len(self._buffers['Time']):
+            capacity = max(2 * (n + m), 1024)
+            for name, buffer in self._buffers.items():
+                grown = np.empty(capacity, dtype=buffer.dtype)
+                grown[:n] = buffer[:n]
+                self._buffers[name] = grown
+
+        pos = np.searchsorted(self._buffers['Time'][:n], new['Time'], side='right')
+        moved = np.arange(pos[0], n)
+        new_dest = pos + np.arange(m)
+        moved_dest = moved + np.searchsorted(pos, moved, side='right')
+        for name, buffer in self._buffers.items():
+            buffer[moved_dest] = buffer[pos[0]:n].copy()
+            buffer[new_dest] = new[name]
+        self._n = n + m
+
+    def add(self, batch):
+        """
+        Insert a batch of candidates and re-cluster the window it touches.
+
+        Candidates earlier than the last watermark passed to `finalize`
+        re-open their window like any other: they are clustered with the
+        open candidates and the final ones still held as context, and are
+        counted in n_late.
+
+        Returns
+        -------
+        n : int
+            Number of candidates that were re-clustered
+        """
+        self.n_late += int((batch['Time'].to_numpy() < self._final_time).sum())
+        if len(batch) == 0:
+            return 0
+
+        t_lo = batch['Time'].min() - 2 * self.eps
+        t_hi = batch['Time'].max() + 2 * self.eps
+        self._insert(batch)
+        time = self._buffers['Time'][:self._n]
+        cluster = self._buffers['cluster'][:self._n]
+        final = self._buffers['final'][:self._n]
+
+        # Widen the window to whole clusters until no open cluster crosses its edges
+        while True:
+            touched = (self._extent_hi >= t_lo) & (self._extent_lo <= t_hi)
+            lo = min(t_lo, self._extent_lo[touched].min()) if touched.any() else t_lo
+            hi = max(t_hi, self._extent_hi[touched].max()) if touched.any() else t_hi
+            if lo == t_lo and hi == t_hi:
+                break
+            t_lo, t_hi = lo, hi
+
+        # Re-cluster with 2 * eps of context; only open candidates in the window are relabelled
+        w_start = np.searchsorted(time, t_lo - 2 * self.eps, side='left')
+        w_stop = np.searchsorted(time, t_hi + 2 * self.eps, side='right')
+        r_start = np.searchsorted(time, t_lo, side='left')
+        r_stop = np.searchsorted(time, t_hi, side='right')
+        X = np.empty((w_stop - w_start, len(self.cluster_column)), dtype=np.float64)
+        for i, name in enumerate(self.cluster_column):
+            X[:, i] = self._buffers[name][w_start:w_stop]
+        local = self._labels(X)[r_start - w_start:r_stop - w_start]
+        relabel = ~final[r_start:r_stop]
+        local = np.where(relabel, local, -1)
+        old = cluster[r_start:r_stop]
+
+        # Map new clusters onto the ids of the old clusters they overlap most
+        pairs = pd.DataFrame({'local': local, 'old': old})
+        pairs = pairs[(pairs['local'] >= 0) & (pairs['old'] >= 0)]
+        overlap = pairs.groupby(['local', 'old']).size().reset_index(name='n')
+        overlap = overlap.sort_values(['n', 'old'], ascending=[False, True])
+        assigned, used = {}, set()
+        for label, old_id in zip(overlap['local'], overlap['old']):
+            if label not in assigned and old_id not in used:
+                assigned[label] = old_id
+                used.add(old_id)
+        new = np.full(len(local), -1, dtype=np.int64)
+        for label in np.unique(local[local >= 0]):
+            if label not in assigned:
+                assigned[label] = self._next_id
+                self._next_id += 1
+            new[local == label] = assigned[label]
+
+        cluster[r_start:r_stop] = np.where(relabel, new, old)
+
+        # The touched clusters lay inside the window; replace their extents
+        # with those of the clusters found there
+        ids, inverse = np.unique(new[new >= 0], return_inverse=True)
+        window_time = time[r_start:r_stop][new >= 0]
+        lo = np.full(len(ids), np.inf)
+        hi = np.full(len(ids), -np.inf)
+        np.minimum.at(lo, inverse, window_time)
+        np.maximum.at(hi, inverse, window_time)
+        self._extent_id = np.concatenate([self._extent_id[~touched], ids])
+        self._extent_lo = np.concatenate([self._extent_lo[~touched], lo])
+        self._extent_hi = np.concatenate([self._extent_hi[~touched], hi])
+        return int(relabel.sum())
+
+    def finalize(self, watermark=np.inf):
+        """
+        Return clusters that later candidates (Time >= watermark) cannot change.
+
+        A cluster is final once its last member is more than 2 * eps before
+        `watermark`, and noise that early stays noise. Final candidates are
+        kept only as long as they are needed as context for open ones.
+
+        Returns
+        -------
+        df : pandas.DataFrame
+            Members of the newly finalized clusters, with their 'cluster' id
+        """
+        if self._n == 0:
+            return pd.DataFrame(columns=SINGLEPULSE_COLUMNS + ['cluster'])
+
+        boundary = watermark - 2 * self.eps
+        n = self._n
+        time = self._buffers['Time'][:n]
+        cluster = self._buffers['cluster'][:n]
+        final = self._buffers['final'][:n]
+
+        done = self._extent_hi < boundary
+        newly_final = np.isin(cluster, self._extent_id[done]) & ~final
+        result = pd.DataFrame({name: self._buffers[name][:n][newly_final] for name in self._columns + ['cluster']})
+        self._extent_id = self._extent_id[~done]
+        self._extent_lo = self._extent_lo[~done]
+        self._extent_hi = self._extent_hi[~done]
+
+        final = final | newly_final | ((cluster < 0) & (time < boundary))
+        if np.isfinite(watermark):
+            self._final_time = max(self._final_time, watermark)
+            context_lo = min(boundary, time[~final].min() if (~final).any() else boundary) - 2 * self.eps
+            keep = ~final | (time >= context_lo)
+        else:
+            keep = ~final
+        self._buffers['final'][:n] = final
+        for name, buffer in self._buffers.items():
+            kept = buffer[:n][keep]
+            buffer[:len(kept)] = kept
+        self._n = int(keep.sum())
+        return result
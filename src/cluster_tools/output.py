@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+from .io import SINGLEPULSE_COLUMNS
+
+SINGLEPULSE_HEADER = "# DM      Sigma      Time (s)     Sample    Downfact\n"
+
+# Binary formats for the all-candidates table, by file extension
+STORE_FORMATS = {'.npz': 'npz', '.h5': 'hdf5', '.hdf5': 'hdf5', '.parquet': 'parquet'}
+STORE_EXTENSIONS = {'csv': 'csv', 'npz': 'npz', 'hdf5': 'h5', 'parquet': 'parquet'}
+
+# Zero-padded text of 0000 ... 9999, for writing digits four at a time
+_DIGIT_GROUPS = np.frombuffer("".join(f"{i:04d}" for i in range(10000)).encode(), dtype=np.uint8).reshape(10000, 4)
+
+
+def _fallback_text(value, decimals):
+    # Values the digit arithmetic cannot place exactly, spelled as pandas does
+    if np.isnan(value):
+        return "NaN"
+    return f"{value:.{decimals}f}"
+
+
+def _format_column(values, decimals=8):
+    """
+    Format one column as a right-justified (N, width) uint8 character array.
+
+    Floats are written as '%.{decimals}f' and integers as '%d', with the
+    digits computed arithmetically for all rows at once. Values where the
+    float arithmetic could round differently from '%f' (ties within the
+    product's rounding error, huge or non-finite values) are formatted
+    individually, so the text matches DataFrame.to_string exactly.
+    """
+    values = np.asarray(values)
+    n = len(values)
+    if np.issubdtype(values.dtype, np.integer):
+        negative = values < 0
+        whole = np.abs(values.astype(np.int64)).astype(np.uint64)
+        decimals = 0
+        slow = np.zeros(n, dtype=bool)
+    else:
+        values = values.astype(np.float64, copy=False)
+        negative = np.signbit(values)
+        magnitude = np.abs(values)
+        slow = ~np.isfinite(magnitude) | (magnitude >= 2.0 ** 63)
+        magnitude = np.where(slow, 0.0, magnitude)
+        whole = np.trunc(magnitude)
+        scaled = (magnitude - whole) * 10.0 ** decimals
+        frac = np.floor(scaled + 0.5)
+        # Halfway cases are left to the exact formatter
+        slow |= np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        carry = frac >= 10.0 ** decimals
+        frac = np.where(carry, 0.0, frac).astype(np.uint64)
+        whole = whole.astype(np.uint64) + carry
+
+    n_digits = np.ones(n, dtype=np.int64)
+    rest = whole // 10
+    while rest.any():
+        n_digits += rest > 0
+        rest //= 10
+
+    tail = decimals + 1 if decimals else 0
+    lengths = negative + n_digits + tail
+    fallback = {i: _fallback_text(values[i], decimals) for i in np.flatnonzero(slow)}
+    for i, text in fallback.items():
+        lengths[i] = len(text)
+    width = int(lengths.max()) if n else 0
+
+    # Rows formatted individually hold zeros here and are overwritten below.
+    # Every other row is at least as wide as its digits and fraction
+    chars = np.full((n, width), ord(" "), dtype=np.uint8)
+    if not slow.all():
+        int_end = width - 1 - tail
+        digits = whole
+        for k in range(int(n_digits.max())):
+            chars[:, int_end - k] = np.where(n_digits > k, ord("0") + digits % 10, ord(" "))
+            digits = digits // 10
+        signed = np.flatnonzero(negative & ~slow)
+        chars[signed, int_end - n_digits[signed]] = ord("-")
+        if decimals:
+            chars[:, width - tail] = ord(".")
+            # Fraction digits four at a time from a lookup table
+            digits = frac
+            for stop in range(width, width - decimals, -4):
+                size = min(4, stop - (width - decimals))
+                chars[:, stop - size:stop] = _DIGIT_GROUPS[digits % 10000, 4 - size:]
+                digits = digits // 10000
+    for i, text in fallback.items():
+        chars[i] = ord(" ")
+        chars[i, width - len(text):] = np.frombuffer(text.encode(), dtype=np.uint8)
+    return chars
+
+
+def format_singlepulse(df, columns=None, decimals=8):
+    """
+    Format candidates as .singlepulse text rows.
+
+    The layout is that of DataFrame.to_string(index=False, header=False,
+    float_format='%.8f'): each column right-justified to its widest
+    value, columns separated by one space, rows by newlines and no
+    trailing newline.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame or CandidateTable
+        Candidates to format
+
+    columns : list
+        Columns written, in order (default: SINGLEPULSE_COLUMNS)
+
+    decimals : int
+        Digits after the decimal point for float columns
+
+    Returns
+    -------
+    text : bytes
+    """
+    if columns is None:
+        columns = SINGLEPULSE_COLUMNS
+    if len(df) == 0:
+        return b""
+    parts = []
+    for name in columns:
+        parts.append(_format_column(np.asarray(df[name]), decimals))
+        parts.append(np.full((len(df), 1), ord(" "), dtype=np.uint8))
+    parts[-1] = np.full((len(df), 1), ord("\n"), dtype=np.uint8)
+    return np.hstack(parts).tobytes()[:-1]
+
+
+def write_singlepulse(df, filename, append=False):
+    """
+    Write candidates in PRESTO .singlepulse layout.
+
+    A new file gets the usual '# DM Sigma ...' header line and no trailing
+    newline, as the clustering CLIs always wrote it. With `append=True`
+    the rows are added to an existing file followed by a newline, so
+    further blocks can be appended.
+
+    Returns
+    -------
+    n : int
+        Number of rows written
+    """
+    text = format_singlepulse(df)
+    with open(filename, "ab" if append else "wb") as f:
+        if not append:
+            f.write(SINGLEPULSE_HEADER.encode())
+        f.write(text)
+        if append and text:
+            f.write(b"\n")
+    return len(df)
+
+
+def _store_format(filename, fmt=None):
+    if fmt is None:
+        fmt = STORE_FORMATS.get(os.path.splitext(filename)[1].lower(), 'csv')
+    if fmt not in ('csv', 'npz', 'hdf5', 'parquet'):
+        raise ValueError(f"Unknown candidate store format '{fmt}', expected csv, npz, hdf5 or parquet.")
+    return fmt
+
+
+def write_candidates(df, filename, fmt=None):
+    """
+    Write a candidate table with all its columns (e.g. cluster labels).
+
+    Binary formats store each column as one uncompressed, contiguous
+    array so read_candidates can memory-map it:
+
+    - 'npz' : one .npy member per column (numpy only)
+    - 'hdf5' : one dataset per column at the file root (needs h5py)
+    - 'parquet' : one column chunk per column (needs pyarrow)
+    - 'csv' : text, as DataFrame.to_csv(index=False)
+
+    Parameters
+    ----------
+    df : pandas.DataFrame or CandidateTable
+        Candidates to write
+
+    filename : str
+        Output path
+
+    fmt : str
+        Format name (default: from the extension, .npz/.h5/.hdf5/.parquet,
+        otherwise csv)
+    """
+    fmt = _store_format(filename, fmt)
+    columns = {name: np.ascontiguousarray(df[name]) for name in df.columns}
+    if fmt == 'csv':
+        pd.DataFrame(columns).to_csv(filename, index=False)
+    elif fmt == 'npz':
+        # np.savez stores members uncompressed, which keeps them mappable
+        with open(filename, "wb") as f:
+            np.savez(f, **columns)
+    elif fmt == 'hdf5':
+        import h5py
+        with h5py.File(filename, "w") as f:
+            for name, values in columns.items():
+                f.create_dataset(name, data=values)
+            f.attrs['columns'] = list(columns)
+    else:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow (pip install pyarrow).") from None
+        table = pa.table(columns)
+        pq.write_table(table, filename, compression='none', row_group_size=max(len(df), 1))
+
+
+def _npz_member_offsets(filename):
+    # Offset, dtype and shape of every uncompressed .npy member of an .npz file
+    members = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED or not info.filename.endswith(".npy"):
+                return None
+            # The local header repeats the name and has its own extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                return None
+            if fortran_order or dtype.hasobject:
+                return None
+            members[info.filename[:-4]] = (f.tell(), dtype, shape)
+    return members
+
+
+def read_candidates(filename, fmt=None, mmap=True):
+    """
+    Read a candidate table written by write_candidates.
+
+    With `mmap=True` the columns of npz and hdf5 files are numpy memmaps
+    into the file, and parquet columns are read through a memory-mapped
+    file, so opening even a very large table costs almost nothing until
+    columns are used.
+
+    Returns
+    -------
+    columns : dict
+        Column name to 1-D array, in file order. Wrap it in
+        pandas.DataFrame or CandidateTable as needed.
+    """
+    fmt = _store_format(filename, fmt)
+    if fmt == 'csv':
+        df = pd.read_csv(filename)
+        return {name: df[name].to_numpy() for name in df.columns}
+    if fmt == 'npz':
+        members = _npz_member_offsets(filename) if mmap else None
+        if members is None:
+            with np.load(filename) as data:
+                return {name: data[name] for name in data.files}
+        return {
+            name: np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+            for name, (offset, dtype, shape) in members.items()
+        }
+    if fmt == 'hdf5':
+        import h5py
+        columns = {}
+        with h5py.File(filename, "r") as f:
+            names = list(f.attrs.get('columns', list(f.keys())))
+            for name in names:
+                dset = f[name]
+                offset = dset.id.get_offset()
+                if mmap and offset is not None and dset.chunks is None and len(dset):
+                    columns[name] = np.memmap(filename, dtype=dset.dtype, mode="r", offset=offset, shape=dset.shape)
+                else:
+                    columns[name] = dset[()]
+        return columns
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet input needs pyarrow (pip install pyarrow).") from None
+    table = pq.read_table(filename, memory_map=mmap)
+    return {name: table.column(name).to_numpy() for name in table.column_names}
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import numpy as np
+import pandas as pd
+
+from .metrics import stage
+
+REPORT_COLUMNS = ['time_start', 'time_end', 'n_candidates', 'n_removed', 'dm_fraction', 'peak_dm', 'peak_sigma',
+                  'reason']
+
+
+def _windows(flagged, reasons, bins, t0, bin_width, count, removed, dm_fraction, peak_dm, peak_sigma):
+    # Merge runs of consecutive flagged bins into report rows
+    if len(flagged) == 0:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    run = np.r_[0, np.cumsum(np.diff(bins[flagged]) != 1)]
+    starts = np.flatnonzero(np.r_[True, run[1:] != run[:-1]])
+    ends = np.r_[starts[1:], len(flagged)]
+    rows = []
+    for a, b in zip(starts, ends):
+        sel = flagged[a:b]
+        brightest = sel[np.argmax(peak_sigma[sel])]
+        rows.append({
+            'time_start': t0 + bins[sel[0]] * bin_width,
+            'time_end': t0 + (bins[sel[-1]] + 1) * bin_width,
+            'n_candidates': int(count[sel].sum()),
+            'n_removed': int(removed[sel].sum()),
+            'dm_fraction': float(dm_fraction[sel].max()),
+            'peak_dm': float(peak_dm[brightest]),
+            'peak_sigma': float(peak_sigma[brightest]),
+            'reason': ",".join(sorted(set(",".join(reasons[sel]).split(",")))),
+        })
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def rfi_veto(df, bin_width=0.1, max_dm_fraction=0.5, count_factor=None, zero_dm=None, keep=0):
+    """
+    Flag broadband RFI storms: Time bins crowded with candidates across DM.
+
+    Candidates are histogrammed into Time bins of `bin_width` seconds in
+    one pass. A bin is vetoed when its candidates cover more than
+    `max_dm_fraction` of the DM trials present in `df`, when it holds more
+    than `count_factor` times the median count of the occupied bins, or
+    when its brightest candidate is at DM <= `zero_dm` and it holds more
+    than the median count, as an undispersed signal does. In a vetoed bin
+    only the `keep` highest-Sigma candidates survive, so a bright burst
+    that coincides with a storm can still be clustered.
+
+    Run it before any DM cut, so that storms peaking at low DM are seen.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame or CandidateTable
+        Candidates with at least the 'DM', 'Sigma' and 'Time' columns
+
+    bin_width : float
+        Time bin in seconds
+
+    max_dm_fraction : float
+        Largest fraction of the DM trials a bin may cover (None: no limit)
+
+    count_factor : float
+        Largest bin count as a multiple of the median (None: no limit)
+
+    zero_dm : float
+        Veto busy bins that peak at or below this DM (None: off)
+
+    keep : int
+        Highest-Sigma candidates kept in each vetoed bin
+
+    Returns
+    -------
+    (mask, report) : tuple
+        Boolean array, True for the rows that are kept, and a DataFrame
+        with one row per run of vetoed bins: 'time_start', 'time_end',
+        'n_candidates', 'n_removed', the largest 'dm_fraction', 'peak_dm'
+        and 'peak_sigma' of the brightest candidate and the 'reason'
+        ('dm_fraction', 'count' and/or 'zero_dm')
+    """
+    time = np.asarray(df['Time'], dtype=np.float64)
+    dm = np.asarray(df['DM'], dtype=np.float64)
+    sigma = np.asarray(df['Sigma'], dtype=np.float64)
+    n = len(time)
+    if n == 0:
+        return np.ones(0, dtype=bool), pd.DataFrame(columns=REPORT_COLUMNS)
+
+    with stage("rfi_veto", rows=n) as record:
+        t0 = time.min()
+        row_bin = np.floor((time - t0) / bin_width).astype(np.int64)
+        bins, row_bin = np.unique(row_bin, return_inverse=True)
+        n_bins = len(bins)
+        count = np.bincount(row_bin, minlength=n_bins)
+
+        # Distinct DM trials per bin, over the trials present anywhere
+        trials, trial = np.unique(dm, return_inverse=True)
+        pairs = np.unique(row_bin * len(trials) + trial)
+        dm_fraction = np.bincount(pairs // len(trials), minlength=n_bins) / len(trials)
+
+        # Rows of each bin from the brightest down; the first is the bin's peak
+        order = np.lexsort((-sigma, row_bin))
+        first = np.searchsorted(row_bin[order], np.arange(n_bins))
+        peak_dm, peak_sigma = dm[order[first]], sigma[order[first]]
+
+        median = np.median(count)
+        tests = []
+        if max_dm_fraction is not None:
+            tests.append(("dm_fraction", dm_fraction > max_dm_fraction))
+        if count_factor is not None:
+            tests.append(("count", count > count_factor * median))
+        if zero_dm is not None:
+            tests.append(("zero_dm", (peak_dm <= zero_dm) & (count > median)))
+        vetoed = np.zeros(n_bins, dtype=bool)
+        reasons = np.full(n_bins, "", dtype=object)
+        for name, hit in tests:
+            reasons[hit & vetoed] += "," + name
+            reasons[hit & ~vetoed] = name
+            vetoed |= hit
+
+        # Keep the `keep` brightest rows of vetoed bins
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n) - first[row_bin[order]]
+        mask = ~vetoed[row_bin] | (rank < keep)
+        removed = np.bincount(row_bin, weights=~mask, minlength=n_bins).astype(np.int64)
+        record["removed"] = int(n - mask.sum())
+
+    report = _windows(np.flatnonzero(vetoed), reasons, bins, t0, bin_width, count, removed, dm_fraction, peak_dm,
+                      peak_sigma)
+    return mask, report
+
+
+def add_rfi_arguments(parser, report=True):
+    """
+    Add the RFI storm veto options shared by the clustering CLIs, with
+    --rfi_report unless the CLI names the reports itself.
+    """
+    parser.add_argument(
+        "--rfi_veto",
+        action="store_true",
+        help="Remove candidates in Time bins crowded across DM (broadband RFI) before the DM cut and clustering."
+    )
+    parser.add_argument(
+        "--rfi_bin",
+        type=float,
+        default=0.1,
+        help="Time bin of the RFI veto in seconds (default: 0.1)."
+    )
+    parser.add_argument(
+        "--rfi_dm_fraction",
+        type=float,
+        default=0.5,
+        help="Veto bins covering more than this fraction of the DM trials (default: 0.5)."
+    )
+    parser.add_argument(
+        "--rfi_count_factor",
+        type=float,
+        default=None,
+        help="Also veto bins with more than this many times the median candidates per bin (default: off)."
+    )
+    parser.add_argument(
+        "--rfi_zero_dm",
+        type=float,
+        default=None,
+        help="Also veto busier than median bins whose brightest candidate is at or below this DM (default: off)."
+    )
+    parser.add_argument(
+        "--rfi_keep",
+        type=int,
+        default=0,
+        help="Highest-SNR candidates kept in each vetoed bin (default: 0)."
+    )
+    if not report:
+        return
+    parser.add_argument(
+        "--rfi_report",
+        type=str,
+        default="rfi_veto.csv",
+        help="CSV listing the vetoed Time windows (default: rfi_veto.csv)."
+    )
+
+
+def rfi_options(args):
+    """rfi_veto keyword arguments given by the --rfi_* options, or None without --rfi_veto."""
+    if not args.rfi_veto:
+        return None
+    return {"bin_width": args.rfi_bin, "max_dm_fraction": args.rfi_dm_fraction,
+            "count_factor": args.rfi_count_factor, "zero_dm": args.rfi_zero_dm, "keep": args.rfi_keep}
+
+
+def cli_rfi_veto(args, df, dm_min=None):
+    """
+    Apply the veto requested by the --rfi_* options to `df`, loaded
+    without a DM cut, write the report and return the surviving rows with
+    DM >= `dm_min`. `df` is returned as is when --rfi_veto is not given.
+    """
+    if not args.rfi_veto:
+        return df
+    mask, report = rfi_veto(df, **rfi_options(args))
+    report.to_csv(args.rfi_report, index=False)
+    print(f"RFI veto: removed {len(df) - int(mask.sum())} candidates in {len(report)} windows "
+          f"(report: {args.rfi_report})")
+    if dm_min is not None:
+        mask &= np.asarray(df['DM']) >= dm_min
+    attrs = dict(df.attrs)
+    df = df[mask].reset_index(drop=True)
+    df.attrs.update(attrs)
+    return df
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+# Only the standard library is imported here, so that clients start quickly;
+# the service imports the clustering stack once, when it starts
+
+
+def default_socket():
+    """
+    Socket of the clustering service: $CLUSTER_TOOLS_SOCKET, else
+    cluster_tools.sock in $XDG_RUNTIME_DIR, else a per-user file in /tmp.
+    """
+    if os.environ.get("CLUSTER_TOOLS_SOCKET"):
+        return os.environ["CLUSTER_TOOLS_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "cluster_tools.sock")
+    return f"/tmp/cluster_tools-{os.getuid()}.sock"
+
+
+def preload():
+    # Import the clustering stack and run each algorithm once on a few
+    # points, so that the first request pays no import or warm-up cost
+    import numpy as np
+    from .clustering import dbscan_labels, hdbscan_labels
+    from .batch import cluster_observation  # noqa: F401
+    from .cli import csv_convertor  # noqa: F401
+
+    X = np.random.default_rng(0).normal(size=(50, 2))
+    dbscan_labels(X, eps=0.5, min_samples=5)
+    hdbscan_labels(X, min_cluster_size=5)
+
+
+def _check_absolute(request, *keys):
+    # Relative paths would resolve against the service's working directory,
+    # not the client's, so clients must send absolute ones
+    for key in keys:
+        paths = request.get(key)
+        for path in paths if isinstance(paths, list) else [paths]:
+            if path is not None and not os.path.isabs(path):
+                raise ValueError(f"'{key}' must be an absolute path, got '{path}'")
+
+
+def _cluster(request):
+    from .batch import cluster_observation
+
+    _check_absolute(request, "single_path", "output")
+    if not os.path.isdir(request["single_path"]):
+        raise FileNotFoundError(f"No such directory: {request['single_path']}")
+    output_dir, name = os.path.split(request["output"])
+    if name.endswith(".singlepulse"):
+        name = name[:-len(".singlepulse")]
+    os.makedirs(output_dir, exist_ok=True)
+    return cluster_observation(request["single_path"], output_dir, name, request.get("config"))
+
+
+def _convert(request):
+    from .cli.csv_convertor import convert, output_path
+
+    _check_absolute(request, "fil_files", "info_files", "output_dir", "channel_mask")
+    fil_files = request["fil_files"]
+    info_files = request["info_files"]
+    extension, csv_file_path = output_path(fil_files, info_files, request["output_dir"])
+    args = argparse.Namespace(channel_mask=request.get("channel_mask"), header_cache=None, no_header_cache=False)
+    n_rows = convert(args, fil_files, info_files, extension, csv_file_path, None)
+    return {"output": csv_file_path, "n_candidates": n_rows}
+
+
+# Request operations: 'op' -> function of the request returning the result
+OPERATIONS = {
+    "cluster": _cluster,
+    "convert": _convert,
+}
+
+
+def handle_request(request):
+    """
+    Run one request in this process and return the response.
+
+    Requests are dicts with an 'op'; all paths in them must be absolute:
+
+    'cluster'
+        'single_path', 'output' (.singlepulse file) and optionally
+        'config' (see batch.cluster_observation); the result is the
+        batch index row of the directory
+    'convert'
+        'fil_files', 'info_files', 'output_dir' and optionally
+        'channel_mask', as for csv_convert; the result holds the CSV path
+        and candidate count
+
+    Returns
+    -------
+    response : dict
+        {'status': 'ok', 'result': ..., 'seconds': ...}, or
+        {'status': 'error', 'error': ...} if the request failed
+    """
+    t0 = time.perf_counter()
+    try:
+        op = OPERATIONS.get(request.get("op"))
+        if op is None:
+            raise ValueError(f"Unknown op '{request.get('op')}', expected one of {', '.join(OPERATIONS)}")
+        result = op(request)
+    except Exception as e:
+        return {"status": "error", "error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - t0}
+    return {"status": "ok", "result": result, "seconds": time.perf_counter() - t0}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # One JSON request per line, answered by one JSON response line
+    def handle(self):
+        server = self.server
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                op, response = None, {"status": "error", "error": f"Invalid request: {e}"}
+            else:
+                op = request.get("op")
+                if op == "ping":
+                    response = {"status": "ok", "result": {"pid": os.getpid(), "requests": server.requests,
+                                                           "uptime": time.time() - server.started}}
+                elif op == "stop":
+                    response = {"status": "ok", "result": {"pid": os.getpid()}}
+                else:
+                    response = handle_request(request)
+                    server.requests += 1
+                    if server.verbose:
+                        target = request.get("single_path") or request.get("output_dir") or ""
+                        detail = "ok" if response["status"] == "ok" else response["error"]
+                        print(f"{op} {target}: {detail} in {response['seconds']:.3f} s", flush=True)
+            self.wfile.write((json.dumps(response, default=float) + "\n").encode())
+            self.wfile.flush()
+            if op == "stop":
+                # Only after answering, since the process exits once serve_forever returns.
+                # shutdown() waits for serve_forever, so it cannot run in a handler thread
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=None, warm=True, verbose=True):
+    """
+    Answer clustering and conversion requests on a Unix socket until a
+    'stop' request, SIGTERM or Ctrl-C.
+
+    The service keeps numpy, pandas, sklearn and hdbscan loaded (and,
+    with `warm`, exercised once), so a request costs only its own
+    compute instead of interpreter start-up and imports. Each connection
+    is served by its own thread and may send any number of requests.
+    The socket is only accessible to the current user.
+
+    Parameters
+    ----------
+    socket_path : str
+        Socket file (default: default_socket())
+
+    warm : bool
+        Import and warm up the clustering stack before accepting requests
+
+    verbose : bool
+        Print a line per request
+    """
+    socket_path = socket_path or default_socket()
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+        except OSError:
+            # Left behind by a service that did not stop cleanly
+            os.unlink(socket_path)
+        else:
+            raise RuntimeError(f"A service is already listening on {socket_path}")
+
+    if warm:
+        t0 = time.perf_counter()
+        preload()
+        if verbose:
+            print(f"Loaded the clustering libraries in {time.perf_counter() - t0:.2f} s", flush=True)
+
+    old_umask = os.umask(0o177)
+    try:
+        server = _Server(socket_path, _Handler)
+    finally:
+        os.umask(old_umask)
+    server.verbose = verbose
+    server.requests = 0
+    server.started = time.time()
+
+    def terminate(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    previous = signal.signal(signal.SIGTERM, terminate)
+    if verbose:
+        print(f"Listening on {socket_path} (pid {os.getpid()})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+    if verbose:
+        print(f"Stopped after {server.requests} requests", flush=True)
+
+
+def request(message, socket_path=None, timeout=None):
+    """
+    Send one request (see handle_request; also 'ping' and 'stop') to the
+    service and return its response.
+
+    Raises
+    ------
+    ConnectionError
+        If no service is listening on the socket
+    """
+    socket_path = socket_path or default_socket()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"No clustering service on {socket_path} ({e.strerror}); "
+                                  f"start one with cluster_service") from None
+        with sock.makefile("rwb") as stream:
+            stream.write((json.dumps(message) + "\n").encode())
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError(f"The service on {socket_path} closed the connection without answering")
+    return json.loads(line)
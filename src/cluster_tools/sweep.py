@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import warnings
+import numpy as np
+import pandas as pd
+import hdbscan
+from sklearn.neighbors import NearestNeighbors
+
+try:
+    # Private hdbscan internals, used to re-condense one single-linkage tree
+    # for many min_cluster_size values; without them each setting is a full fit
+    from hdbscan._hdbscan_tree import condense_tree, compute_stability, get_clusters
+except ImportError:
+    condense_tree = compute_stability = get_clusters = None
+
+from .clustering import _graph_dbscan_labels, cluster_features, select_strategy
+
+
+def _summarize(labels, sigma, snr):
+    # Cluster count, noise fraction and best-per-cluster survivors of one setting
+    clustered = labels >= 0
+    n_clusters = len(np.unique(labels[clustered]))
+    best = pd.Series(sigma[clustered]).groupby(labels[clustered]).max()
+    return {
+        "n_clusters": n_clusters,
+        "noise_fraction": float(1 - clustered.mean()) if len(labels) else 0.0,
+        "n_best": int((best > snr).sum()) if snr is not None else n_clusters,
+    }
+
+
+def DBSCAN_sweep(df, cluster_column=None, eps_values=(0.05,), min_samples_values=(5,), snr=None, verbose=False,
+                 n_jobs=1, strategy="auto"):
+    """
+    Evaluate DBSCAN over a grid of eps and min_samples values.
+
+    The radius-neighbours graph is built once at the largest eps; every
+    setting then only filters its edges, counts neighbours and labels
+    connected core points, which gives the same labels as DBSCAN.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame or CandidateTable
+        Candidates with the cluster columns and 'Sigma'
+
+    cluster_column : list
+        Columns clustered on (default: ['Delay_s', 'Time'])
+
+    eps_values, min_samples_values : sequence
+        Grid of DBSCAN parameters
+
+    snr : float
+        Only best-per-cluster candidates with Sigma > snr are counted in
+        'n_best' (default: all clusters)
+
+    verbose : bool
+        Print each row as it is computed
+
+    n_jobs, strategy :
+        Workers and neighbour-search options of the graph query, see
+        select_strategy
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        One row per setting with columns ['eps', 'min_samples',
+        'n_clusters', 'noise_fraction', 'n_best']
+    """
+    if any(m is None for m in min_samples_values):
+        raise ValueError("DBSCAN needs an integer min_samples; None is only meaningful for HDBSCAN.")
+    X = cluster_features(df, cluster_column)
+    sigma = np.asarray(df['Sigma'], dtype=np.float64)
+    n = len(X)
+
+    options = select_strategy("dbscan", n, X.shape[1], n_jobs, strategy)
+    graph = NearestNeighbors(radius=max(eps_values), **options).fit(X).radius_neighbors_graph(X, mode='distance').tocoo()
+    off_diagonal = graph.row != graph.col
+    rows, cols, dist = graph.row[off_diagonal], graph.col[off_diagonal], graph.data[off_diagonal]
+    order = np.argsort(dist, kind='stable')
+    rows, cols, dist = rows[order], cols[order], dist[order]
+
+    records = []
+    for eps in sorted(eps_values):
+        k = np.searchsorted(dist, eps, side='right')
+        counts = 1 + np.bincount(rows[:k], minlength=n)
+        for min_samples in sorted(min_samples_values):
+            labels = _graph_dbscan_labels(n, rows[:k], cols[:k], counts >= min_samples)
+            record = {"eps": eps, "min_samples": min_samples, **_summarize(labels, sigma, snr)}
+            records.append(record)
+            if verbose:
+                print(record)
+
+    return pd.DataFrame(records, columns=['eps', 'min_samples', 'n_clusters', 'noise_fraction', 'n_best'])
+
+
+def HDBSCAN_sweep(df, cluster_column=None, min_cluster_size_values=(5,), min_samples_values=(None,), snr=None, verbose=False,
+                  n_jobs=1, strategy="auto"):
+    """
+    Evaluate HDBSCAN over a grid of min_cluster_size and min_samples values.
+
+    The single-linkage tree depends only on min_samples, so it is built
+    once per min_samples value and re-condensed for every min_cluster_size.
+    min_samples=None follows HDBSCAN's default of min_samples equal to
+    min_cluster_size, which needs one tree per setting (and warns if that
+    defeats the reuse). If the installed hdbscan lacks the internal tree
+    functions, every setting is a full HDBSCAN fit instead.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame or CandidateTable
+        Candidates with the cluster columns and 'Sigma'
+
+    cluster_column : list
+        Columns clustered on (default: ['Delay_s', 'Time'])
+
+    min_cluster_size_values, min_samples_values : sequence
+        Grid of HDBSCAN parameters
+
+    snr : float
+        Only best-per-cluster candidates with Sigma > snr are counted in
+        'n_best' (default: all clusters)
+
+    verbose : bool
+        Print each row as it is computed
+
+    n_jobs, strategy :
+        Core-distance workers and tree options of each fit, see
+        select_strategy
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        One row per setting with columns ['min_cluster_size',
+        'min_samples', 'n_clusters', 'noise_fraction', 'n_best']
+    """
+    X = cluster_features(df, cluster_column)
+    sigma = np.asarray(df['Sigma'], dtype=np.float64)
+
+    if None in min_samples_values and len(set(min_cluster_size_values)) > 1:
+        warnings.warn("min_samples=None changes with min_cluster_size, so no single-linkage tree is reused; "
+                      "give fixed min_samples values to sweep faster.", stacklevel=2)
+
+    options = select_strategy("hdbscan", len(X), X.shape[1], n_jobs, strategy)
+    trees = {}
+    records = []
+    for min_samples in min_samples_values:
+        for min_cluster_size in sorted(min_cluster_size_values):
+            effective = min_cluster_size if min_samples is None else min_samples
+            if condense_tree is None:
+                labels = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, min_samples=effective,
+                                         **options).fit_predict(X)
+            else:
+                if effective not in trees:
+                    clusterer = hdbscan.HDBSCAN(min_cluster_size=max(min_cluster_size, 2), min_samples=effective,
+                                                **options).fit(X)
+                    trees[effective] = clusterer.single_linkage_tree_.to_numpy()
+                condensed = condense_tree(trees[effective], min_cluster_size)
+                labels = get_clusters(condensed, compute_stability(condensed))[0]
+            record = {"min_cluster_size": min_cluster_size, "min_samples": min_samples,
+                      **_summarize(labels, sigma, snr)}
+            records.append(record)
+            if verbose:
+                print(record)
+
+    table = pd.DataFrame(records, columns=['min_cluster_size', 'min_samples', 'n_clusters', 'noise_fraction', 'n_best'])
+    table['min_samples'] = table['min_samples'].astype('Int64')
+    return table
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+import json
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import stage
+
+# Job state directories of a queue, in the order a job passes through them
+STATES = ("waiting", "pending", "running", "done", "failed")
+
+
+def worker_id():
+    """Name of this process in a queue: <host>-<pid>."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _read_json(filename):
+    with open(filename) as fh:
+        return json.load(fh)
+
+
+class WorkQueue:
+    """
+    Job queue kept in a directory of a filesystem shared by all nodes.
+
+    Every job is a small JSON file that moves between the directories
+    waiting/, pending/, running/, done/ and failed/ by rename, which is
+    atomic on POSIX filesystems, parallel ones included. A worker claims a
+    job by renaming pending/<name>.json to running/<name>@<worker>.json;
+    of several workers racing for the same job exactly one rename
+    succeeds, so no broker, lock server or database is needed and workers
+    never wait for each other. While a job runs its worker touches the
+    running file every `heartbeat` seconds. A running file whose mtime
+    another worker has seen unchanged for `timeout` seconds belongs to a
+    dead worker or node and is put back in pending/, up to `max_requeues`
+    times. Staleness is judged on the observer's own clock, so the nodes'
+    clocks need not agree. A job with an 'after' dependency waits in
+    waiting/<after>~<name>.json until <after> is done and is failed as
+    'skipped' if <after> fails.
+
+    Parameters
+    ----------
+    path : str
+        Queue directory, created if needed
+
+    heartbeat : float
+        Seconds between heartbeats of a running job
+
+    timeout : float
+        Seconds without a heartbeat after which a running job is requeued;
+        keep it well above `heartbeat` and the filesystem's attribute
+        cache time
+
+    max_requeues : int
+        Times a job is requeued after losing its worker before it fails
+    """
+
+    def __init__(self, path, heartbeat=30.0, timeout=300.0, max_requeues=3):
+        self.path = os.path.abspath(path)
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.max_requeues = max_requeues
+        for state in STATES + ("tmp",):
+            os.makedirs(os.path.join(self.path, state), exist_ok=True)
+        # Running file -> (mtime, monotonic time this mtime was first seen)
+        self._seen = {}
+
+    def _dir(self, state):
+        return os.path.join(self.path, state)
+
+    def _file(self, state, name):
+        return os.path.join(self.path, state, f"{name}.json")
+
+    def _list(self, state):
+        # Job files of a state in name order, without temporaries
+        return sorted(f for f in os.listdir(self._dir(state)) if f.endswith(".json") and not f.startswith("."))
+
+    def _write(self, job, filename):
+        # Replace `filename` atomically, so readers never see a partial job
+        tmp = os.path.join(self._dir("tmp"), f"{os.path.basename(filename)}.{worker_id()}.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(job, fh, indent=1, default=float)
+        os.replace(tmp, filename)
+
+    def names(self):
+        """Names of all jobs in the queue, whatever their state."""
+        names = set()
+        for state in STATES:
+            for f in self._list(state):
+                stem = f[:-5]
+                if state == "running":
+                    stem = stem.rsplit("@", 1)[0]
+                elif state == "waiting":
+                    stem = stem.split("~", 1)[1]
+                names.add(stem)
+        return names
+
+    def submit(self, jobs):
+        """
+        Add jobs, JSON-serialisable dicts each with a unique 'name' and a
+        'kind' (see run_job). 'after' names a job that must be done first
+        and 'retries' gives the extra attempts of a failing job; it must
+        be in the queue already or among `jobs`, without a cycle. Jobs
+        whose name is already in the queue, in any state, are left alone.
+        Nothing is added if a job is invalid.
+
+        Returns
+        -------
+        submitted : int
+            Number of jobs added
+        """
+        existing = self.names()
+        after = {}
+        for job in jobs:
+            name = job["name"]
+            if not name or name.startswith(".") or any(c in name for c in "/@~"):
+                raise ValueError(f"Invalid job name '{name}': it may not start with '.' or contain '/', '@' or '~'")
+            if name not in existing:
+                after[name] = job.get("after")
+        for name, target in after.items():
+            # A dependency that is never submitted, or a cycle, would leave jobs waiting forever
+            chain = [name]
+            while target and target in after:
+                if target in chain:
+                    raise ValueError(f"Job '{name}' depends on itself through {' -> '.join(chain + [target])}")
+                chain.append(target)
+                target = after[target]
+            if target and target not in existing:
+                raise ValueError(f"Job '{chain[-1]}' runs after '{target}', which is not in the queue")
+        submitted = 0
+        for job in jobs:
+            name = job["name"]
+            if name in existing:
+                continue
+            self._place({**job, "attempts": 0, "requeues": 0, "submitted": time.time()})
+            existing.add(name)
+            submitted += 1
+        return submitted
+
+    def _place(self, job):
+        # Queue a job in pending/, or in waiting/ until its dependency is done
+        after = job.get("after")
+        if after and not os.path.exists(self._file("done", after)):
+            self._write(job, os.path.join(self._dir("waiting"), f"{after}~{job['name']}.json"))
+        else:
+            self._write(job, self._file("pending", job["name"]))
+
+    def claim(self, worker=None):
+        """
+        Take the first pending job for `worker` (default: worker_id()).
+
+        Returns
+        -------
+        claimed : tuple or None
+            (job, running file), or None when no job is pending
+        """
+        worker = worker or worker_id()
+        for f in self._list("pending"):
+            running = os.path.join(self._dir("running"), f"{f[:-5]}@{worker}.json")
+            try:
+                os.rename(os.path.join(self._dir("pending"), f), running)
+            except FileNotFoundError:
+                # Claimed by another worker first
+                continue
+            os.utime(running)
+            return _read_json(running), running
+        return None
+
+    @contextmanager
+    def keep_alive(self, running):
+        """
+        Touch the running file every `heartbeat` seconds while the block
+        runs. Yields a threading.Event that is set if the job is taken
+        away, i.e. requeued by another worker.
+        """
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat):
+                try:
+                    os.utime(running)
+                except FileNotFoundError:
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def _settle(self, source, state, job):
+        # Move a job file to done/ or failed/ with its record; False if another worker took it first
+        target = self._file(state, job["name"])
+        try:
+            os.rename(source, target)
+        except FileNotFoundError:
+            return False
+        self._write(job, target)
+        return True
+
+    def requeue(self, running, job):
+        """
+        Put a claimed job back in pending/, e.g. when its worker stops.
+        Returns False if another worker has already moved it.
+        """
+        # Take the running file first, so that only one of several workers requeues it
+        hidden = os.path.join(self._dir("pending"), f".{job['name']}.requeue")
+        try:
+            os.rename(running, hidden)
+        except FileNotFoundError:
+            return False
+        self._write(job, self._file("pending", job["name"]))
+        os.unlink(hidden)
+        return True
+
+    def finish(self, job, running, result):
+        """
+        Record the outcome of a claimed job: done/ when result['status'] is
+        'done', back to pending/ while it has retries left, failed/
+        otherwise. Returns the state the job moved to, or None, dropping
+        the result, when the job was requeued by another worker in the
+        meantime.
+        """
+        job = {**job, **result, "attempts": job["attempts"] + 1}
+        if result["status"] == "done":
+            state = "done"
+        elif job["attempts"] <= job.get("retries", 0):
+            return "pending" if self.requeue(running, job) else None
+        else:
+            state = "failed"
+        return state if self._settle(running, state, job) else None
+
+    def requeue_stale(self):
+        """
+        Requeue running jobs without a heartbeat for `timeout` seconds
+        (failing them after `max_requeues`), and release or fail the
+        waiting jobs whose dependency has finished. Every worker calls
+        this between jobs.
+
+        Returns
+        -------
+        requeued : list
+            Names of the jobs put back in pending/
+        """
+        now = time.monotonic()
+        seen, requeued = {}, []
+        running_files = [os.path.join("running", f) for f in self._list("running")]
+        # Requeues interrupted between their two renames
+        orphans = [os.path.join("pending", f) for f in os.listdir(self._dir("pending")) if f.endswith(".requeue")]
+        for rel in running_files + orphans:
+            filename = os.path.join(self.path, rel)
+            try:
+                mtime = os.stat(filename).st_mtime
+            except FileNotFoundError:
+                continue
+            last = self._seen.get(rel)
+            seen[rel] = last if last is not None and last[0] == mtime else (mtime, now)
+            if now - seen[rel][1] < self.timeout:
+                continue
+            try:
+                job = _read_json(filename)
+            except (FileNotFoundError, ValueError):
+                continue
+            job["requeues"] = job.get("requeues", 0) + 1
+            lost = {**job, "status": "lost", "error": f"no heartbeat for {self.timeout:g} s"}
+            if rel in orphans:
+                # Take the orphan, then finish its requeue unless it got as far as writing pending/
+                taken = os.path.join(self._dir("tmp"), f"{os.path.basename(filename)}.{worker_id()}")
+                try:
+                    os.rename(filename, taken)
+                except FileNotFoundError:
+                    continue
+                if job["name"] in self.names():
+                    os.unlink(taken)
+                elif job["requeues"] > self.max_requeues:
+                    self._settle(taken, "failed", lost)
+                else:
+                    self._write(job, self._file("pending", job["name"]))
+                    os.unlink(taken)
+                    requeued.append(job["name"])
+            elif job["requeues"] > self.max_requeues:
+                self._settle(filename, "failed", lost)
+            elif self.requeue(filename, job):
+                requeued.append(job["name"])
+        self._seen = seen
+
+        for f in self._list("waiting"):
+            after, name = f[:-5].split("~", 1)
+            waiting = os.path.join(self._dir("waiting"), f)
+            if os.path.exists(self._file("done", after)):
+                try:
+                    os.rename(waiting, self._file("pending", name))
+                except FileNotFoundError:
+                    pass
+            elif os.path.exists(self._file("failed", after)):
+                try:
+                    job = _read_json(waiting)
+                except FileNotFoundError:
+                    continue
+                self._settle(waiting, "failed", {**job, "status": "skipped", "error": f"{after} failed"})
+        return requeued
+
+    def retry_failed(self):
+        """Queue every failed job again with its attempt counts reset; returns how many."""
+        n = 0
+        for job in self.jobs("failed"):
+            job = {k: v for k, v in job.items() if k not in ("status", "error", "returncode", "result")}
+            self._place({**job, "attempts": 0, "requeues": 0})
+            os.unlink(self._file("failed", job["name"]))
+            n += 1
+        return n
+
+    def idle(self):
+        """True when no job is waiting, pending or running."""
+        return not any(self._list(state) for state in ("waiting", "pending", "running"))
+
+    def jobs(self, state):
+        """
+        Records of the jobs in `state`, in name order. Running jobs also
+        get 'worker' and 'heartbeat_age' (seconds since the last
+        heartbeat, by this node's clock).
+        """
+        records = []
+        for f in self._list(state):
+            filename = os.path.join(self._dir(state), f)
+            try:
+                job = _read_json(filename)
+                if state == "running":
+                    job["worker"] = f[:-5].rsplit("@", 1)[1]
+                    job["heartbeat_age"] = time.time() - os.stat(filename).st_mtime
+            except (FileNotFoundError, ValueError):
+                # Moved on while listing
+                continue
+            records.append(job)
+        return records
+
+
+def run_job(job, lost=None):
+    """
+    Run one queue job in this process.
+
+    Kinds of job:
+
+    'shell'
+        job['cmd'] run by the shell in job['cwd'], with its output in
+        <job['log_dir']>/<name>.log, as dedisperse.run_jobs does; it is
+        terminated if `lost` is set
+    'cluster'
+        batch.cluster_observation(job['observation'], job['output_dir'],
+        job['output_name'], job['config']), writing into a private staging
+        directory of job['output_dir'] whose files publish() moves into
+        place once the job is recorded as done. A worker that lost the job
+        to another therefore never overwrites the new claimant's outputs.
+
+    Returns
+    -------
+    result : dict
+        'status' ('done' or 'failed') and the details of the run, with the
+        staging directory as 'staging' for cluster jobs
+    """
+    if job["kind"] == "shell":
+        from .dedisperse import _launch, _terminate
+
+        os.makedirs(job["log_dir"], exist_ok=True)
+        proc, log, log_file = _launch(job, job["log_dir"], job["attempts"] + 1)
+        try:
+            while True:
+                try:
+                    code = proc.wait(timeout=1.0)
+                    break
+                except subprocess.TimeoutExpired:
+                    if lost is not None and lost.is_set():
+                        _terminate(proc)
+            log.write(f"# exit code {code}\n")
+        finally:
+            if proc.poll() is None:
+                _terminate(proc)
+                proc.wait()
+            log.close()
+        return {"status": "done" if code == 0 else "failed", "returncode": code, "log": log_file}
+
+    if job["kind"] == "cluster":
+        from .batch import cluster_observation
+
+        staging = os.path.join(job["output_dir"], f".{job['name']}.{worker_id()}.tmp")
+        os.makedirs(staging, exist_ok=True)
+        try:
+            record = cluster_observation(job["observation"], staging, job["output_name"], job["config"])
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        record["output"] = os.path.join(job["output_dir"], os.path.basename(record["output"]))
+        return {"status": "done", "result": record, "staging": staging}
+
+    raise ValueError(f"Unknown job kind '{job['kind']}', expected 'shell' or 'cluster'.")
+
+
+def publish(staging, output_dir=None):
+    """
+    Move the files of a staging directory (see run_job) into `output_dir`,
+    replacing existing ones, and remove it; with output_dir=None the
+    staged files are discarded.
+    """
+    if output_dir is not None:
+        for f in sorted(os.listdir(staging)):
+            os.replace(os.path.join(staging, f), os.path.join(output_dir, f))
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def run_worker(queue_dir, heartbeat=30.0, timeout=300.0, poll=5.0, wait=False, max_jobs=None, verbose=True):
+    """
+    Claim and run jobs of the queue in `queue_dir` one at a time.
+
+    Start as many workers as there are cores to use, on any node that
+    sees the queue directory. Between jobs a worker requeues jobs of dead
+    workers and releases jobs whose dependency is done; when nothing can
+    be claimed it polls every `poll` seconds. A worker stopped by Ctrl-C
+    puts its job straight back in pending/.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory
+
+    heartbeat, timeout : float
+        See WorkQueue
+
+    poll : float
+        Seconds between attempts to claim a job when none is pending
+
+    wait : bool
+        Keep polling for new jobs instead of exiting once no job is
+        waiting, pending or running
+
+    max_jobs : int
+        Exit after this many jobs (default: no limit)
+
+    verbose : bool
+        Print a line per job
+
+    Returns
+    -------
+    counts : dict
+        Jobs run by this worker by outcome: 'done', 'retried' (failed and
+        requeued for another attempt), 'failed' and 'lost' (requeued by
+        another worker while running)
+    """
+    queue = WorkQueue(queue_dir, heartbeat=heartbeat, timeout=timeout)
+    worker = worker_id()
+    counts = {"done": 0, "retried": 0, "failed": 0, "lost": 0}
+    while max_jobs is None or sum(counts.values()) < max_jobs:
+        for name in queue.requeue_stale():
+            if verbose:
+                print(f"[{worker}] requeued {name}: no heartbeat for {timeout:g} s")
+        claimed = queue.claim(worker)
+        if claimed is None:
+            if not wait and queue.idle():
+                break
+            time.sleep(poll)
+            continue
+
+        job, running = claimed
+        t0 = time.perf_counter()
+        try:
+            with queue.keep_alive(running) as lost, stage(job["kind"]):
+                try:
+                    result = run_job(job, lost)
+                except Exception as e:
+                    result = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+        except BaseException:
+            queue.requeue(running, job)
+            raise
+        staging = result.pop("staging", None)
+        result.update(worker=worker, elapsed=time.perf_counter() - t0, finished=time.time())
+        outcome = "lost"
+        try:
+            outcome = {"done": "done", "pending": "retried", "failed": "failed", None: "lost"}[
+                queue.finish(job, running, result)]
+        finally:
+            if staging is not None:
+                # Outputs appear only once this worker holds the job as done
+                publish(staging, job["output_dir"] if outcome == "done" else None)
+        counts[outcome] += 1
+        if verbose:
+            detail = result.get("error") or (f"exit code {result['returncode']}" if "returncode" in result else "")
+            print(f"[{worker}] {job['name']}: {outcome} in {result['elapsed']:.1f} s" +
+                  (f" ({detail})" if outcome != "done" and detail else ""))
+    return counts
+
+
+def dedisperse_jobs(jobs, basename, log_dir, cwd=None, retries=0):
+    """
+    Queue jobs for the prepsubband calls of plan_prepsubband_jobs, named
+    <basename>_<call name> so several filterbanks can share a queue. The
+    calls run in `cwd` (default: the current directory), which all nodes
+    must see at the same path, with their logs in `log_dir`.
+    """
+    cwd = os.path.abspath(cwd or os.getcwd())
+    log_dir = os.path.join(cwd, log_dir)
+    return [{
+        "name": f"{basename}_{job['name']}",
+        "kind": "shell",
+        "cmd": job["cmd"],
+        "after": f"{basename}_{job['after']}" if job.get("after") else None,
+        "cwd": cwd,
+        "log_dir": log_dir,
+        "retries": retries,
+    } for job in jobs]
+
+
+def cluster_jobs(paths, output_dir, config=None, retries=0):
+    """
+    Queue jobs clustering each singlepulse directory in `paths` into
+    `output_dir` with the shared `config`, named like cluster_batch
+    names its outputs (prefixed with 'cluster_').
+    """
+    from .batch import observation_names
+
+    output_dir = os.path.abspath(output_dir)
+    return [{
+        "name": f"cluster_{name}",
+        "kind": "cluster",
+        "observation": os.path.abspath(path),
+        "output_dir": output_dir,
+        "output_name": name,
+        "config": config,
+        "retries": retries,
+    } for path, name in zip(paths, observation_names(paths))]
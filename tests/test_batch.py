@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools.batch import INDEX_COLUMNS, cluster_batch, cluster_observation, expand_observations, \
+    observation_names
+from cluster_tools.clustering import cluster_summary, dbscan_labels
+from cluster_tools.io import DM_delay, load_filtered_singlepulse
+from cluster_tools.output import write_singlepulse
+
+DMS = 5 + 2.0 * np.arange(30)
+
+
+def write_observation(directory, seed):
+    # Noise plus a few pulses sweeping neighbouring DM trials, one file per DM
+    rng = np.random.default_rng(seed)
+    rows = [np.c_[rng.choice(DMS, 800), rng.uniform(5, 7, 800), rng.uniform(0, 60, 800)]]
+    for t0, dm0 in zip(rng.uniform(5, 55, 4), rng.uniform(20, 50, 4)):
+        dms = DMS[np.abs(DMS - dm0) <= 8]
+        sigma = 12 - np.abs(dms - dm0) / 2
+        rows.append(np.c_[dms, sigma, t0 + DM_delay(dms - dm0, 550.0, 200.0) + rng.normal(0, 0.003, len(dms))])
+    rows = np.concatenate(rows)
+    df = pd.DataFrame({"DM": rows[:, 0], "Sigma": rows[:, 1], "Time": rows[:, 2], "Sample": 0.0, "Downfact": 1.0})
+    os.makedirs(directory, exist_ok=True)
+    for dm, part in df.groupby("DM"):
+        write_singlepulse(part.sort_values("Time"), os.path.join(directory, f"obs_DM{dm:.2f}.singlepulse"))
+
+
+@pytest.fixture
+def observations(tmp_path):
+    paths = [str(tmp_path / "night1" / "beam0"), str(tmp_path / "night2" / "beam0"), str(tmp_path / "night2" / "beam1")]
+    for seed, path in enumerate(paths):
+        write_observation(path, seed)
+    return paths
+
+
+def test_observation_names_are_unique():
+    assert observation_names(["/a/x/beam0", "/a/y/beam0", "/a/y/beam1"]) == ["x_beam0", "y_beam0", "beam1"]
+    # A path that runs out of parents keeps its longest name
+    assert observation_names(["/a/beam0", "/b/a/beam0"]) == ["a_beam0", "b_a_beam0"]
+
+
+def test_expand_observations(observations, tmp_path):
+    (tmp_path / "night1" / "notes.txt").write_text("")
+    found = expand_observations([str(tmp_path / "night*" / "*"), observations[0], str(tmp_path / "missing")])
+    assert found == observations
+
+
+def test_observation_matches_manual_clustering(observations, tmp_path):
+    record = cluster_observation(observations[0], str(tmp_path), "beam0", {"eps": 0.05, "min_samples": 3,
+                                                                           "cache": False})
+    df = load_filtered_singlepulse(observations[0], f_low=550.0, BW=200.0, dm_min=10.0, verbose=False)
+    df["cluster"] = dbscan_labels(df, ["Delay_s", "Time"], eps=0.05, min_samples=3)
+    summary = cluster_summary(df)
+    best = summary[summary["Sigma"] > 6.0].sort_values("Time").reset_index(drop=True)
+
+    assert record["status"] == "ok" and record["n_read"] == df.attrs["rows_read"]
+    assert record["n_candidates"] == len(df) and record["n_clusters"] == len(summary)
+    assert record["n_best"] == len(best) >= 4
+    written = np.loadtxt(record["output"], ndmin=2)
+    np.testing.assert_allclose(written[:, 2], best["Time"], atol=1e-6)
+
+
+def test_batch_matches_serial_and_writes_index(observations, tmp_path):
+    config = {"eps": 0.05, "min_samples": 3, "summary": True, "cache": False}
+    serial = cluster_batch(observations, str(tmp_path / "serial"), config, verbose=False)
+    parallel = cluster_batch(observations, str(tmp_path / "parallel"), config, n_jobs=2, verbose=False)
+
+    assert list(serial.columns) == INDEX_COLUMNS and (serial["status"] == "ok").all()
+    assert serial["name"].tolist() == ["night1_beam0", "night2_beam0", "beam1"]
+    assert parallel["name"].tolist() == serial["name"].tolist()
+    for name in serial["name"]:
+        for suffix in (".singlepulse", "_summary.csv"):
+            a = open(tmp_path / "serial" / f"{name}{suffix}").read()
+            assert a == open(tmp_path / "parallel" / f"{name}{suffix}").read()
+    index = pd.read_csv(tmp_path / "parallel" / "index.csv")
+    assert index["n_best"].tolist() == serial["n_best"].tolist()
+
+
+def test_failures_are_recorded(observations, tmp_path):
+    index = cluster_batch(observations[:2], str(tmp_path / "out"), {"algorithm": "kmeans", "cache": False},
+                          n_jobs=2, verbose=False)
+    assert (index["status"] == "error").all()
+    assert index["error"].str.contains("Unknown algorithm").all()
+    assert pd.read_csv(tmp_path / "out" / "index.csv")["status"].tolist() == ["error", "error"]
+
+
+def test_rfi_veto_runs_before_the_dm_threshold(observations, tmp_path):
+    config = {"eps": 0.05, "min_samples": 3, "cache": False, "rfi_veto": {"bin_width": 0.1}}
+    record = cluster_observation(observations[1], str(tmp_path), "beam", config)
+    assert record["status"] == "ok"
+    assert os.path.exists(tmp_path / "beam_rfi_veto.csv")
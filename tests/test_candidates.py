@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools.candidates import CandidateTable, load_candidate_table
+from cluster_tools.clustering import dbscan_labels
+from cluster_tools.io import DM_delay, SINGLEPULSE_COLUMNS, load_filtered_singlepulse
+from cluster_tools.output import write_singlepulse
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 400
+    time = rng.uniform(0, 20, n)
+    return pd.DataFrame({"DM": rng.choice(np.arange(10, 60, 0.5), n), "Sigma": rng.uniform(5, 12, n), "Time": time,
+                         "Sample": np.floor(time / 1e-3), "Downfact": rng.choice([1, 2, 4, 9], n).astype(float)})
+
+
+def test_columns_use_compact_dtypes(frame):
+    table = CandidateTable.from_dataframe(frame)
+    assert [table[name].dtype for name in SINGLEPULSE_COLUMNS] == [np.float32, np.float32, np.float64, np.int64,
+                                                                   np.int32]
+    assert table.nbytes < frame.memory_usage(index=False).sum()
+    np.testing.assert_array_equal(table["Time"], frame["Time"])
+    with pytest.raises(ValueError, match="different lengths"):
+        CandidateTable({"DM": [1.0, 2.0], "Time": [1.0]})
+
+
+def test_views_share_columns(frame):
+    table = CandidateTable.from_dataframe(frame)
+    bright = table.where(table["Sigma"] > 8)
+    assert bright.is_view and not table.is_view
+    assert bright._columns is table._columns
+    np.testing.assert_array_equal(bright["Sigma"], table["Sigma"][table["Sigma"] > 8])
+
+    # Views of views select from the same arrays
+    first = bright.take([0, 2, 4])
+    np.testing.assert_array_equal(first["Time"], bright["Time"][[0, 2, 4]])
+    ordered = bright.sort_values("Time")
+    assert np.all(np.diff(ordered["Time"]) >= 0)
+    assert len(ordered) == len(bright)
+
+    compact = ordered.materialize()
+    assert not compact.is_view and len(compact["DM"]) == len(ordered)
+    pd.testing.assert_frame_equal(compact.to_pandas(), ordered.to_pandas())
+
+
+def test_writes_through_a_view(frame):
+    table = CandidateTable.from_dataframe(frame)
+    bright = table.where(table["Sigma"] > 8)
+    bright["cluster"] = np.arange(len(bright))
+    # A new column is filled for the rows outside the view
+    assert table["cluster"].dtype == np.int32
+    assert np.array_equal(table["cluster"][table["Sigma"] > 8], np.arange(len(bright)))
+    assert np.all(table["cluster"][table["Sigma"] <= 8] == -1)
+
+    copy = bright.assign("Sigma", np.zeros(len(bright)))
+    assert np.all(copy["Sigma"] == 0) and np.all(bright["Sigma"] > 8)
+    with pytest.raises(ValueError, match="expected"):
+        bright["cluster"] = [1, 2]
+    with pytest.raises(ValueError, match="Mask"):
+        table.where([True])
+
+
+def test_features_and_clustering_match_dataframe(frame):
+    frame["Delay_s"] = DM_delay(frame["DM"], 550.0, 200.0)
+    table = CandidateTable.from_dataframe(frame)
+    view = table.where(table["DM"] >= 20)
+    X = view.features(["Delay_s", "Time"])
+    assert X.flags["C_CONTIGUOUS"] and X.shape == (len(view), 2)
+
+    subset = frame[frame["DM"] >= 20].reset_index(drop=True)
+    expected = dbscan_labels(subset.astype({"Delay_s": np.float32}), eps=0.3, min_samples=3)
+    np.testing.assert_array_equal(dbscan_labels(view, eps=0.3, min_samples=3), expected)
+
+
+def test_load_candidate_table_matches_filtered_load(frame, tmp_path):
+    for dm, part in frame.groupby("DM"):
+        write_singlepulse(part.sort_values("Time"), str(tmp_path / f"obs_DM{dm:.2f}.singlepulse"))
+    table = load_candidate_table(str(tmp_path), f_low=550.0, BW=200.0, dm_min=20, verbose=False, chunk_files=7)
+    df = load_filtered_singlepulse(str(tmp_path), f_low=550.0, BW=200.0, dm_min=20, verbose=False)
+    assert len(table) == len(df) and table.columns == SINGLEPULSE_COLUMNS + ["Delay_s"]
+    np.testing.assert_array_equal(table["Time"], df["Time"])
+    np.testing.assert_allclose(table["Delay_s"], df["Delay_s"], rtol=1e-6)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+from cluster_tools.clustering import _graph_dbscan_labels, dbscan_labels, fof_labels
+
+
+def random_points(seed, n=300, d=2):
+    # Uniform background plus a few tight blobs, on a coarse lattice so
+    # that some points coincide and some lie exactly eps apart
+    rng = np.random.default_rng(seed)
+    centres = rng.random((4, d))
+    blobs = centres[rng.integers(0, 4, n // 2)] + rng.normal(scale=0.02, size=(n // 2, d))
+    X = np.vstack([rng.random((n - n // 2, d)), blobs])
+    return np.round(X, 2)
+
+
+CASES = [(seed, d, eps, min_samples)
+         for seed, (d, eps, min_samples) in enumerate([(2, 0.03, 3), (2, 0.05, 5), (2, 0.1, 2),
+                                                      (3, 0.08, 4), (3, 0.15, 8), (2, 0.02, 1)])]
+
+
+def sklearn_dbscan(X, eps, min_samples):
+    model = DBSCAN(eps=eps, min_samples=min_samples).fit(X)
+    core = np.zeros(len(X), dtype=bool)
+    core[model.core_sample_indices_] = True
+    return model.labels_, core
+
+
+@pytest.mark.parametrize("seed, d, eps, min_samples", CASES)
+def test_fof_matches_sklearn(seed, d, eps, min_samples):
+    X = random_points(seed, d=d)
+    expected, _ = sklearn_dbscan(X, eps, min_samples)
+    np.testing.assert_array_equal(fof_labels(X, eps=eps, min_samples=min_samples), expected)
+
+
+@pytest.mark.parametrize("d, eps, min_samples", [(4, 0.2, 4), (5, 0.25, 3), (8, 0.35, 2), (8, 0.5, 5)])
+def test_fof_matches_sklearn_in_high_dimensions(d, eps, min_samples):
+    # Neighbouring cells reach ceil(sqrt(d)) cells along an axis once d > 4
+    X = np.random.default_rng(d).random((2000, d))
+    expected, _ = sklearn_dbscan(X, eps, min_samples)
+    np.testing.assert_array_equal(fof_labels(X, eps=eps, min_samples=min_samples), expected)
+
+
+@pytest.mark.parametrize("seed, d, eps, min_samples", CASES)
+def test_graph_labels_match_sklearn(seed, d, eps, min_samples):
+    X = random_points(seed, d=d)
+    expected, core = sklearn_dbscan(X, eps, min_samples)
+    graph = NearestNeighbors(radius=eps).fit(X).radius_neighbors_graph(X).tocoo()
+    off_diagonal = graph.row != graph.col
+    rows, cols = graph.row[off_diagonal], graph.col[off_diagonal]
+    assert np.array_equal(np.bincount(rows, minlength=len(X)) + 1 >= min_samples, core)
+    np.testing.assert_array_equal(_graph_dbscan_labels(len(X), rows, cols, core), expected)
+
+
+@pytest.mark.parametrize("seed, d, eps, min_samples", CASES)
+def test_fine_decimation_matches_sklearn(seed, d, eps, min_samples):
+    # Cells much smaller than the lattice spacing hold only coincident points
+    X = random_points(seed, d=d)
+    expected, _ = sklearn_dbscan(X, eps, min_samples)
+    labels = dbscan_labels(X, eps=eps, min_samples=min_samples, decimate=1000)
+    np.testing.assert_array_equal(labels, expected)
+
+
+@pytest.mark.parametrize("method", [dbscan_labels, fof_labels])
+@pytest.mark.parametrize("n_tiles", [2, 5])
+@pytest.mark.parametrize("seed, d, eps, min_samples", CASES)
+def test_tiles_match_global_fit(method, n_tiles, seed, d, eps, min_samples):
+    X = random_points(seed, d=d)
+    expected, core = sklearn_dbscan(X, eps, min_samples)
+    labels = method(X, eps=eps, min_samples=min_samples, n_tiles=n_tiles)
+
+    np.testing.assert_array_equal(labels == -1, expected == -1)
+    # Core points are partitioned identically, up to cluster numbering
+    pairs = np.unique(np.c_[labels[core], expected[core]], axis=0)
+    assert len(np.unique(pairs[:, 0])) == len(pairs) == len(np.unique(pairs[:, 1]))
+    # Border points join the cluster of one of their core neighbours
+    to_global = dict(pairs)
+    neighbours = NearestNeighbors(radius=eps).fit(X).radius_neighbors(X, return_distance=False)
+    for i in np.flatnonzero(~core & (labels >= 0)):
+        assert to_global[labels[i]] in set(expected[neighbours[i][core[neighbours[i]]]])
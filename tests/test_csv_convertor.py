@@ -0,0 +1,90 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from your.formats.filwriter import make_sigproc_object
+
+from cluster_tools.cli.csv_convertor import convert, convert_pair, output_path
+
+TSAMP = 2.56e-4
+
+
+def write_filterbank(filename, n=64):
+    sigproc = make_sigproc_object(filename, "test", 16, -1.0, 800.0, TSAMP, 60000.0, nbits=8)
+    sigproc.write_header(filename)
+    sigproc.append_spectra(np.zeros((n, 16), dtype=np.uint8), filename)
+
+
+def write_info(filename, rows):
+    header = "# DM Sigma Time(s) Sample Downfact\n" if filename.endswith(".singlepulse") else \
+        "DM SNR stime width_s width_samp\n"
+    with open(filename, "w") as fh:
+        fh.write(header)
+        for row in rows:
+            fh.write(" ".join(str(v) for v in row) + "\n")
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    fil_files, info_files = [], []
+    for k in range(5):
+        fil = str(tmp_path / f"obs{k}.fil")
+        info = str(tmp_path / f"obs{k}.singlepulse")
+        write_filterbank(fil)
+        write_info(info, [(10.0 + k, 6.5, 1.25 * j, 100 * j, w) for j, w in enumerate([1, 2, 3, 4, 9, 30])])
+        fil_files.append(fil)
+        info_files.append(info)
+    return fil_files, info_files
+
+
+def test_widths_are_log2_samples(tmp_path):
+    info = str(tmp_path / "a.singlepulse")
+    write_info(info, [(10.0, 6.0, 1.0, 10, w) for w in [1, 2, 3, 4, 9, 30]])
+    df = convert_pair("a.fil", info, TSAMP, ".singlepulse")
+    assert df["width"].tolist() == [0, 1, 1, 2, 3, 4]
+
+    # .injinf widths are in seconds
+    info = str(tmp_path / "a.injinf")
+    write_info(info, [(10.0, 6.0, 1.0, w * TSAMP, 0) for w in [1, 8, 20]])
+    assert convert_pair("a.fil", info, TSAMP, ".injinf")["width"].tolist() == [0, 3, 4]
+
+
+@pytest.mark.parametrize("width", [0, -2, "nan"])
+def test_invalid_widths_are_rejected(tmp_path, width):
+    info = str(tmp_path / "a.singlepulse")
+    write_info(info, [(10.0, 6.0, 1.0, 10, 2), (11.0, 6.0, 1.0, 10, width)])
+    with pytest.raises(ValueError, match="data row 2"):
+        convert_pair("a.fil", info, TSAMP, ".singlepulse")
+
+
+def test_output_path_checks_inputs(tmp_path):
+    with pytest.raises(ValueError, match="extension"):
+        output_path(["a.fil"], ["a.txt"], str(tmp_path))
+    with pytest.raises(ValueError, match="must be equal"):
+        output_path(["a.fil", "b.fil"], ["a.singlepulse"], str(tmp_path))
+    assert output_path(["/x/a.fil", "/x/b.fil"], ["a.singlepulse", "b.singlepulse"], str(tmp_path / "out")) == \
+        (".singlepulse", str(tmp_path / "out" / "acombined.csv"))
+
+
+def test_parallel_conversion_matches_serial(tmp_path, pairs):
+    fil_files, info_files = pairs
+    cache_file = str(tmp_path / "headers.json")
+    args = argparse.Namespace(channel_mask=None, header_cache=cache_file, no_header_cache=False)
+    serial = str(tmp_path / "serial.csv")
+    assert convert(args, fil_files, info_files, ".singlepulse", serial) == 30
+
+    cached = json.load(open(cache_file))["files"]
+    assert sorted(cached) == sorted(fil_files)
+    assert all(entry["header"]["tsamp"] == pytest.approx(TSAMP) for entry in cached.values())
+
+    parallel = str(tmp_path / "parallel.csv")
+    with ProcessPoolExecutor(2) as pool:
+        assert convert(args, fil_files, info_files, ".singlepulse", parallel, pool, n_workers=2) == 30
+    assert open(parallel).read() == open(serial).read()
+
+    df = pd.read_csv(serial)
+    assert df.columns.tolist() == ["file", "snr", "width", "dm", "label", "stime", "chan_mask_path", "num_files"]
+    assert df["file"].tolist() == [f for f in fil_files for _ in range(6)]
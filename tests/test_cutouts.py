@@ -0,0 +1,99 @@
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from your.formats.filwriter import make_sigproc_object
+
+from cluster_tools.cutouts import CUTOUT_COLUMNS, make_cutouts, plan_cutout_blocks, read_cutout_candidates
+from cluster_tools.dedisperse import DM_CONSTANT
+from cluster_tools.output import write_singlepulse
+
+NCHANS, TSAMP, FCH1, FOFF = 32, 1e-3, 800.0, -4.0
+PULSES = [(0.05, 60.0), (2.0, 60.0), (2.1, 120.0), (6.5, 30.0)]
+
+
+@pytest.fixture
+def filterbank(tmp_path):
+    # Dispersed 4-sample pulses at (arrival time at the top of the band, DM)
+    freqs = FCH1 + FOFF * np.arange(NCHANS)
+    data = np.random.default_rng(0).normal(100, 3, (8000, NCHANS)).astype(np.float32)
+    for t, dm in PULSES:
+        delays = DM_CONSTANT * dm * (freqs ** -2.0 - freqs.max() ** -2.0)
+        for c in range(NCHANS):
+            start = int(round((t + delays[c]) / TSAMP))
+            data[start:start + 4, c] += 30
+    filename = str(tmp_path / "pulses.fil")
+    sigproc = make_sigproc_object(filename, "pulses", NCHANS, FOFF, FCH1, TSAMP, 60000.0, nbits=32)
+    sigproc.write_header(filename)
+    sigproc.append_spectra(data, filename)
+    return filename
+
+
+@pytest.fixture
+def pulse_candidates(filterbank, tmp_path):
+    # Times at the centre of each pulse, as the boxcar search reports them
+    df = pd.DataFrame({"DM": [dm for _, dm in PULSES], "Sigma": [20.0, 21.0, 22.0, 23.0],
+                       "Time": [t + 2 * TSAMP for t, _ in PULSES], "Sample": 0.0, "Downfact": 4.0})
+    write_singlepulse(df, str(tmp_path / "pulses.singlepulse"))
+    return read_cutout_candidates(str(tmp_path / "pulses.singlepulse"), fil_file=filterbank)
+
+
+def read_h5(filename):
+    with h5py.File(filename, "r") as f:
+        return f["data_freq_time"][:], f["data_dm_time"][:], dict(f.attrs)
+
+
+def test_read_candidates_from_csv_and_singlepulse(tmp_path, filterbank, pulse_candidates):
+    assert list(pulse_candidates.columns) == CUTOUT_COLUMNS
+    assert pulse_candidates["width"].tolist() == [4] * 4 and pulse_candidates["file"].iloc[0] == filterbank
+    with pytest.raises(ValueError, match="filterbank"):
+        read_cutout_candidates(str(tmp_path / "pulses.singlepulse"))
+
+    pd.DataFrame({"file": [filterbank], "snr": [9.0], "width": [3], "dm": [60.0], "label": [1], "stime": [2.0],
+                  "chan_mask_path": [np.nan], "num_files": [1]}).to_csv(tmp_path / "cands.csv", index=False)
+    csv = read_cutout_candidates(str(tmp_path / "cands.csv"))
+    assert csv["width"].tolist() == [8] and csv["tcand"].tolist() == [2.0] and csv["chan_mask_path"].iloc[0] is None
+
+
+def test_cutouts_are_centred_and_dedispersed(tmp_path, pulse_candidates):
+    result = make_cutouts(pulse_candidates, str(tmp_path / "h5"), time_size=64, freq_size=16, dm_size=33,
+                          verbose=False)
+    assert result["h5"].notna().all() and result["h5"].nunique() == len(PULSES)
+    for (_, dm), filename in zip(PULSES, result["h5"]):
+        data_ft, data_dmt, attrs = read_h5(filename)
+        assert data_ft.shape == (64, 16) and data_dmt.shape == (33, 64)
+        assert attrs["dm"] == dm and attrs["nchans"] == NCHANS and tuple(attrs["dm_range"]) == (0.0, 2 * dm)
+        # The 4-sample pulse fills the two 2-sample bins either side of the centre in every
+        # channel group, and peaks at the candidate DM
+        assert set(data_ft.argmax(axis=0)) <= {31, 32}
+        row, column = np.unravel_index(data_dmt.argmax(), data_dmt.shape)
+        assert row == 16 and column in (31, 32)
+
+
+def test_block_size_and_workers_do_not_change_cutouts(tmp_path, pulse_candidates):
+    options = dict(time_size=32, freq_size=8, dm_size=16, verbose=False)
+    one = make_cutouts(pulse_candidates, str(tmp_path / "one"), **options)
+    small = make_cutouts(pulse_candidates, str(tmp_path / "small"), block_bytes=1, n_jobs=2, **options)
+    for a, b in zip(one["h5"], small["h5"]):
+        for x, y in zip(read_h5(a)[:2], read_h5(b)[:2]):
+            np.testing.assert_array_equal(x, y)
+
+
+def test_masked_channels_carry_their_median(tmp_path, pulse_candidates):
+    mask_file = tmp_path / "mask.txt"
+    np.savetxt(mask_file, np.arange(NCHANS), fmt="%d")
+    masked = pulse_candidates.assign(chan_mask_path=str(mask_file))
+    [filename] = make_cutouts(masked.iloc[[1]], str(tmp_path / "h5"), time_size=32, freq_size=8, dm_size=4,
+                              verbose=False)["h5"]
+    data_ft, _, _ = read_h5(filename)
+    # Every channel is masked, so each group holds the same level at every time
+    assert np.all(data_ft == data_ft[0])
+
+
+def test_overlapping_windows_share_reads():
+    start = np.array([100, 0, 50, 1000, 1010])
+    stop = np.array([300, 120, 200, 1100, 5000])
+    blocks = plan_cutout_blocks(start, stop, max_spectra=400)
+    assert blocks == [(0, 300, [1, 2, 0]), (1000, 1100, [3]), (1010, 5000, [4])]
+    assert plan_cutout_blocks(start, stop, max_spectra=100) == [(0, 120, [1]), (50, 200, [2]), (100, 300, [0]),
+                                                                (1000, 1100, [3]), (1010, 5000, [4])]
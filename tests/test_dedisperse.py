@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from your.formats.filwriter import make_sigproc_object
+
+from cluster_tools.dedisperse import DM_CONSTANT, dedisperse_filterbank
+from cluster_tools.io import DM_delay
+from cluster_tools.search import search_dedispersed
+
+NCHANS, TSAMP, FCH1, FOFF = 64, 1e-3, 800.0, -2.0
+PLAN = pd.DataFrame({"Low_DM": [50.0], "High_DM": [150.0], "dDM": [5.0], "DownSamp": [1], "dsubDM": [100.0],
+                     "DM_call": [20], "calls": [1]})
+
+
+@pytest.fixture
+def filterbank(tmp_path):
+    # Noise with a 4-sample pulse at DM 100 arriving at 3 s at the top of the band
+    freqs = FCH1 + FOFF * np.arange(NCHANS)
+    data = np.random.default_rng(0).normal(100, 5, (8000, NCHANS)).astype(np.float32)
+    delays = DM_CONSTANT * 100.0 * (freqs ** -2.0 - freqs.max() ** -2.0)
+    for c in range(NCHANS):
+        start = int(round((3.0 + delays[c]) / TSAMP))
+        data[start:start + 4, c] += 20
+    filename = str(tmp_path / "pulse.fil")
+    sigproc = make_sigproc_object(filename, "pulse", NCHANS, FOFF, FCH1, TSAMP, 60000.0, nbits=32)
+    sigproc.write_header(filename)
+    sigproc.append_spectra(data, filename)
+    return filename
+
+
+def test_injected_pulse_peaks_at_its_dm(filterbank):
+    [row] = dedisperse_filterbank(filterbank, PLAN, nsub=8, verbose=False)
+    assert row["data"].shape == (20, 8000) and row["tsamp"] == TSAMP
+    np.testing.assert_allclose(row["dms"], 50 + 5 * np.arange(20))
+
+    candidates = search_dedispersed([row], threshold=8.0)
+    best = candidates.loc[candidates["Sigma"].idxmax()]
+    assert best["DM"] == 100.0 and best["Downfact"] == 4
+    assert best["Sample"] == 3002
+    assert best["Time"] == pytest.approx(3.002)
+
+
+def test_blocks_and_threads_do_not_change_the_output(filterbank, tmp_path):
+    [whole] = dedisperse_filterbank(filterbank, PLAN, nsub=8, verbose=False)
+    [blocked] = dedisperse_filterbank(filterbank, PLAN, nsub=8, chunk_size=1000, n_jobs=2, verbose=False,
+                                      output_dir=str(tmp_path / "out"))
+    assert isinstance(blocked["data"], np.memmap)
+    np.testing.assert_array_equal(blocked["data"], whole["data"])
+    np.testing.assert_array_equal(np.load(str(tmp_path / "out" / "pulse_row0_dms.npy")), whole["dms"])
+
+
+def test_dispersion_constants_agree():
+    # DM_delay's rounded constant is within 0.03% of PRESTO's
+    assert DM_delay(100.0, 550.0, 200.0) == pytest.approx(DM_CONSTANT * 100.0 * (550.0 ** -2 - 750.0 ** -2), rel=3e-4)
@@ -0,0 +1,143 @@
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools.io import CACHE_DIRNAME, SINGLEPULSE_COLUMNS, iter_singlepulse, load_singlepulse
+from cluster_tools.output import write_singlepulse
+
+
+def candidates(seed, dm, n=50):
+    rng = np.random.default_rng(seed)
+    time = np.sort(rng.uniform(0, 100, n))
+    return pd.DataFrame({"DM": np.full(n, dm), "Sigma": np.round(rng.uniform(5, 10, n), 2), "Time": time,
+                         "Sample": np.floor(time / 1e-3), "Downfact": rng.choice([1, 2, 4, 9], n).astype(float)})
+
+
+@pytest.fixture
+def search_dir(tmp_path):
+    # Per-DM files as PRESTO writes them, plus an empty and an unreadable one
+    for k in range(12):
+        write_singlepulse(candidates(k, 10.0 + k), str(tmp_path / f"obs_DM{10 + k:.2f}.singlepulse"))
+    (tmp_path / "obs_DM90.00.singlepulse").write_text("# DM      Sigma      Time (s)     Sample    Downfact\n")
+    (tmp_path / "obs_DM99.00.singlepulse").write_text("# header\n1 2 3\n")
+    return tmp_path
+
+
+def expected(directory):
+    files = sorted(glob.glob(os.path.join(directory, "*.singlepulse")))
+    frames = [pd.read_csv(f, sep=r"\s+", comment="#", header=None, names=SINGLEPULSE_COLUMNS, dtype=np.float64)
+              for f in files if "DM99" not in f]
+    return pd.concat(frames, ignore_index=True)
+
+
+def cache_files(directory):
+    return sorted(os.listdir(os.path.join(directory, CACHE_DIRNAME)))
+
+
+@pytest.mark.parametrize("n_jobs, backend", [(1, "thread"), (3, "thread"), (2, "process")])
+def test_parallel_parsing_matches_serial(search_dir, n_jobs, backend):
+    df = load_singlepulse(str(search_dir), verbose=False, n_jobs=n_jobs, backend=backend)
+    pd.testing.assert_frame_equal(df, expected(search_dir))
+    assert list(df.attrs["load_errors"]) == [str(search_dir / "obs_DM99.00.singlepulse")]
+
+
+def test_cache_reuses_unchanged_files(search_dir, capsys):
+    first = load_singlepulse(str(search_dir), cache=True)
+    assert "Reusing 0 cached files, parsing 14" in capsys.readouterr().out
+    second = load_singlepulse(str(search_dir), cache=True)
+    assert "Reusing 13 cached files, parsing 1" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(second, first)
+
+    index = json.load(open(search_dir / CACHE_DIRNAME / "index.json"))
+    assert index["rows"] == len(first)
+    assert cache_files(search_dir) == sorted(["index.json", index["data"]])
+    assert os.path.getsize(search_dir / CACHE_DIRNAME / index["data"]) == len(first) * 5 * 8
+
+
+def test_cache_notices_size_and_mtime_changes(search_dir, capsys):
+    load_singlepulse(str(search_dir), cache=True, verbose=False)
+    old_index = json.load(open(search_dir / CACHE_DIRNAME / "index.json"))
+
+    # Same size, new contents and mtime; and a file that grows
+    same_size = search_dir / "obs_DM10.00.singlepulse"
+    same_size.write_text(same_size.read_text().replace("10.00 ", "11.00 ", 1))
+    st = os.stat(same_size)
+    os.utime(same_size, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    write_singlepulse(candidates(11, 21.0, n=60), str(search_dir / "obs_DM21.00.singlepulse"))
+
+    df = load_singlepulse(str(search_dir), cache=True)
+    assert "Reusing 11 cached files, parsing 3" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(df, expected(search_dir))
+
+    # The new data file replaced the old one
+    index = json.load(open(search_dir / CACHE_DIRNAME / "index.json"))
+    assert index["data"] != old_index["data"]
+    assert cache_files(search_dir) == sorted(["index.json", index["data"]])
+
+
+def test_removed_file_is_dropped_from_the_cache(search_dir):
+    load_singlepulse(str(search_dir), cache=True, verbose=False)
+    os.unlink(search_dir / "obs_DM15.00.singlepulse")
+    df = load_singlepulse(str(search_dir), cache=True, verbose=False)
+    pd.testing.assert_frame_equal(df, expected(search_dir))
+    index = json.load(open(search_dir / CACHE_DIRNAME / "index.json"))
+    assert "obs_DM15.00.singlepulse" not in index["files"] and index["rows"] == len(df)
+
+
+def test_inconsistent_cache_is_ignored(search_dir):
+    load_singlepulse(str(search_dir), cache=True, verbose=False)
+    index = json.load(open(search_dir / CACHE_DIRNAME / "index.json"))
+    with open(search_dir / CACHE_DIRNAME / index["data"], "r+b") as fh:
+        fh.truncate(80)
+    df = load_singlepulse(str(search_dir), cache=True, verbose=False)
+    pd.testing.assert_frame_equal(df, expected(search_dir))
+
+
+def test_concurrent_loads_install_a_consistent_index(search_dir):
+    errors = []
+
+    def load(k):
+        try:
+            write_singlepulse(candidates(100 + k, 30.0 + k), str(search_dir / f"new_DM{30 + k:.2f}.singlepulse"))
+            load_singlepulse(str(search_dir), cache=True, verbose=False)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=load, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    # Whichever index won names its own complete data file, and nothing else is left behind
+    index = json.load(open(search_dir / CACHE_DIRNAME / "index.json"))
+    assert cache_files(search_dir) == sorted(["index.json", index["data"]])
+    assert os.path.getsize(search_dir / CACHE_DIRNAME / index["data"]) == index["rows"] * 5 * 8
+    pd.testing.assert_frame_equal(load_singlepulse(str(search_dir), cache=True, verbose=False), expected(search_dir))
+
+
+def test_streamed_chunks_are_filtered_and_cached(search_dir):
+    chunks = list(iter_singlepulse(str(search_dir), chunk_files=5, dm_min=12, sigma_min=7, time_max=80, cache=True))
+    assert len(chunks) == 3
+    df = pd.concat(chunks, ignore_index=True)
+    full = expected(search_dir)
+    mask = (full["DM"] >= 12) & (full["Sigma"] >= 7) & (full["Time"] <= 80)
+    pd.testing.assert_frame_equal(df, full[mask].reset_index(drop=True))
+    assert sum(chunk.attrs["rows_read"] for chunk in chunks) == len(full)
+    pd.testing.assert_frame_equal(load_singlepulse(str(search_dir), cache=True, verbose=False), full)
+
+
+def test_stopping_a_stream_early_keeps_the_old_cache(search_dir):
+    load_singlepulse(str(search_dir), cache=True, verbose=False)
+    before = cache_files(search_dir)
+    write_singlepulse(candidates(7, 50.0), str(search_dir / "obs_DM50.00.singlepulse"))
+    stream = iter_singlepulse(str(search_dir), chunk_files=5, cache=True)
+    next(stream)
+    stream.close()
+    assert cache_files(search_dir) == before
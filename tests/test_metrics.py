@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from cluster_tools import metrics
+from cluster_tools.metrics import MetricsRecorder, add_metrics_arguments, cli_metrics, instrumented, recording, stage
+
+
+@instrumented()
+def make_rows(n):
+    with stage("fill", rows=n):
+        return list(range(n))
+
+
+def test_stages_nest_and_accumulate():
+    recorder = MetricsRecorder()
+    with recording(recorder):
+        with stage("load", files=3) as record:
+            for n in (10, 20):
+                with stage("parse", rows=n):
+                    time.sleep(0.01)
+            record["rows"] = 30
+        make_rows(5)
+    assert metrics._active is None
+
+    stages = {entry["stage"]: entry for entry in recorder.to_dict()["stages"]}
+    assert list(stages) == ["load", "load/parse", "make_rows", "make_rows/fill"]
+    assert stages["load"]["files"] == 3 and stages["load"]["rows"] == 30
+    assert stages["load/parse"]["calls"] == 2 and stages["load/parse"]["rows"] == 30
+    assert stages["load/parse"]["wall_s"] >= 0.02 and stages["load"]["wall_s"] >= stages["load/parse"]["wall_s"]
+    assert stages["make_rows"]["rows"] == 5
+
+
+def test_stages_do_nothing_without_a_recorder():
+    with stage("idle", rows=3) as record:
+        record["rows"] = 4
+    assert make_rows(2) == [0, 1]
+
+
+def test_peak_rss_follows_allocations():
+    recorder = MetricsRecorder()
+    with recording(recorder):
+        with stage("small"):
+            pass
+        with stage("big"):
+            block = np.ones(64 << 20, dtype=np.uint8)
+            del block
+    stages = {entry["stage"]: entry for entry in recorder.to_dict()["stages"]}
+    assert stages["big"]["peak_rss_mb"] >= 64
+    if recorder.to_dict()["peak_rss_scope"] == "stage":
+        assert stages["small"]["peak_rss_mb"] < stages["big"]["peak_rss_mb"]
+
+
+def test_worker_threads_are_not_recorded():
+    recorder = MetricsRecorder()
+    with recording(recorder):
+        thread = threading.Thread(target=make_rows, args=(3,))
+        thread.start()
+        thread.join()
+    assert recorder.stages == {}
+
+
+def run_cli(argv, fail=False):
+    parser = argparse.ArgumentParser()
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    with cli_metrics(args):
+        make_rows(3)
+        if fail:
+            raise RuntimeError("stop")
+
+
+def test_cli_writes_metrics_and_profiles(tmp_path):
+    metrics_file = str(tmp_path / "run" / "metrics.json")
+    run_cli(["--metrics", metrics_file, "--profile", "make_*"])
+    record = json.load(open(metrics_file))
+    assert record["status"] == "ok"
+    assert [entry["stage"] for entry in record["stages"]] == ["make_rows", "make_rows/fill"]
+    # Nested stages are covered by the profile of the stage that matched
+    assert record["profiles"] == {"make_rows": str(tmp_path / "run" / "make_rows.prof")}
+    assert os.path.getsize(record["profiles"]["make_rows"]) > 0
+
+    with pytest.raises(RuntimeError):
+        run_cli(["--metrics", metrics_file], fail=True)
+    assert json.load(open(metrics_file))["status"] == "error: RuntimeError"
+    assert sorted(os.listdir(tmp_path / "run")) == ["make_rows.prof", "metrics.json"]
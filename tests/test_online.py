@@ -0,0 +1,140 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+from cluster_tools.clustering import dbscan_labels
+from cluster_tools.io import DM_delay, SINGLEPULSE_COLUMNS, SinglepulseWatcher
+from cluster_tools.online import DMProgress, OnlineDBSCAN
+from cluster_tools.output import write_singlepulse
+
+EPS, MIN_SAMPLES = 0.05, 5
+DMS = 10 + 2.0 * np.arange(40)
+
+
+def search_files(directory, n_segments=1, seed=0):
+    """
+    PRESTO-like output: one file per DM trial (and time segment), each
+    sorted by Time, holding pulses spread over neighbouring DMs and noise.
+    'Sample' numbers every candidate, to match rows between runs.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for t0, dm0 in zip(rng.uniform(1, 29, 15), rng.uniform(25, 75, 15)):
+        dms = DMS[np.abs(DMS - dm0) <= 10]
+        rows.append(np.c_[dms, rng.uniform(5, 15, len(dms)), t0 + rng.normal(scale=0.005, size=len(dms))])
+    noise_dm = rng.choice(DMS, 1500)
+    rows.append(np.c_[noise_dm, rng.uniform(5, 7, len(noise_dm)), rng.uniform(0, 30, len(noise_dm))])
+    df = pd.DataFrame(np.vstack(rows), columns=["DM", "Sigma", "Time"])
+    df["Sample"] = np.arange(len(df))
+    df["Downfact"] = 1
+
+    files = []
+    for dm in DMS:
+        trial = df[df["DM"] == dm].sort_values("Time")
+        bounds = np.linspace(0, len(trial), n_segments + 1).astype(int)
+        for k, segment in enumerate(trial.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:])):
+            name = f"obs_DM{dm:.2f}.singlepulse" if n_segments == 1 else f"obs_DM{dm:.2f}_{k}.singlepulse"
+            files.append((k, os.path.join(directory, name)))
+            write_singlepulse(segment, files[-1][1])
+    # Segments in Time order, and the DM trials of a segment in DM order
+    return [f for _, f in sorted(files)]
+
+
+def run_online(files, watch_dir, n_dms, per_scan):
+    # The loop of cluster_online, copying `per_scan` files into watch_dir per scan
+    clusterer = OnlineDBSCAN(eps=EPS, min_samples=MIN_SAMPLES)
+    progress = DMProgress(n_dms)
+    outputs, n_early = [], 0
+    with SinglepulseWatcher(watch_dir) as watcher:
+        for k in range(0, len(files), per_scan):
+            for f in files[k:k + per_scan]:
+                shutil.copy(f, watch_dir)
+            results, _ = watcher.read_new(complete=True)
+            for f, data, err in results:
+                assert err is None
+                progress.update(f, data[:, 2])
+            batch = pd.DataFrame(np.concatenate([data for _, data, _ in results]), columns=SINGLEPULSE_COLUMNS)
+            batch["Delay_s"] = DM_delay(batch["DM"], 550.0, 200.0)
+            clusterer.add(batch)
+            final = clusterer.finalize(progress.watermark())
+            n_early += len(final)
+            outputs.append(final)
+    outputs.append(clusterer.finalize())
+    return pd.concat(outputs, ignore_index=True), clusterer, n_early
+
+
+def assert_matches_full_fit(files, online):
+    df = pd.concat([pd.DataFrame(np.loadtxt(f, ndmin=2), columns=SINGLEPULSE_COLUMNS) for f in files],
+                   ignore_index=True)
+    df["Delay_s"] = DM_delay(df["DM"], 550.0, 200.0)
+    labels = dbscan_labels(df, eps=EPS, min_samples=MIN_SAMPLES)
+    model = DBSCAN(eps=EPS, min_samples=MIN_SAMPLES).fit(df[["Delay_s", "Time"]].to_numpy())
+    core = np.zeros(len(df), dtype=bool)
+    core[model.core_sample_indices_] = True
+
+    online_label = dict(zip(online["Sample"], online["cluster"]))
+    assert len(online_label) == len(online)
+    assert set(online_label) == set(df["Sample"][labels >= 0])
+    # Core points are partitioned identically, up to cluster numbering
+    pairs = {(online_label[s], label) for s, label in zip(df["Sample"][core], labels[core])}
+    assert len({a for a, _ in pairs}) == len(pairs) == len({b for _, b in pairs})
+    to_full = dict(pairs)
+    # Border points join the cluster of one of their core neighbours
+    X = df[["Delay_s", "Time"]].to_numpy()
+    neighbours = NearestNeighbors(radius=EPS).fit(X).radius_neighbors(X, return_distance=False)
+    for i in np.flatnonzero(~core & (labels >= 0)):
+        assert to_full[online_label[df["Sample"][i]]] in set(labels[neighbours[i][core[neighbours[i]]]])
+
+
+def test_dm_chunks_match_full_fit(tmp_path):
+    files = search_files(str(tmp_path))
+    watch_dir = tmp_path / "watch"
+    watch_dir.mkdir()
+    online, clusterer, n_early = run_online(files, str(watch_dir), len(DMS), per_scan=5)
+    # Each file covers the whole observation: nothing is final before the last DM
+    assert clusterer.n_late == 0
+    assert_matches_full_fit(files, online)
+
+
+def test_time_segments_finalize_early(tmp_path):
+    files = search_files(str(tmp_path), n_segments=4)
+    watch_dir = tmp_path / "watch"
+    watch_dir.mkdir()
+    online, clusterer, n_early = run_online(files, str(watch_dir), len(DMS), per_scan=len(DMS))
+    assert n_early > 0
+    assert_matches_full_fit(files, online)
+
+
+def test_unknown_dm_count_gives_no_watermark():
+    progress = DMProgress()
+    progress.update("obs_DM10.00.singlepulse", [1.0, 5.0])
+    assert progress.watermark() == -np.inf
+    progress = DMProgress(n_dms=2)
+    progress.update("obs_DM10.00_0.singlepulse", [1.0, 5.0])
+    progress.update("obs_DM10.00_1.singlepulse", [7.0])
+    assert progress.watermark() == -np.inf
+    progress.update("obs_DM20.00.singlepulse", [])
+    assert progress.watermark() == 7.0
+    progress.update("obs_DM20.00_1.singlepulse", [3.0])
+    assert progress.watermark() == 3.0
+
+
+def test_late_candidates_are_clustered():
+    rng = np.random.default_rng(2)
+
+    def burst(t0, n=10):
+        return pd.DataFrame({"DM": 50.0, "Sigma": 8.0, "Time": t0 + rng.normal(scale=0.005, size=n),
+                             "Sample": 0.0, "Downfact": 1.0, "Delay_s": 0.3})
+
+    clusterer = OnlineDBSCAN(eps=EPS, min_samples=MIN_SAMPLES)
+    clusterer.add(burst(10.0))
+    assert len(clusterer.finalize(20.0)) == 10
+    # Breaks the watermark promise, but is clustered instead of dropped
+    clusterer.add(burst(5.0))
+    assert clusterer.n_late == 10
+    late = clusterer.finalize()
+    assert len(late) == 10 and late["cluster"].nunique() == 1
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools.io import SINGLEPULSE_COLUMNS
+from cluster_tools.output import format_singlepulse
+
+
+def to_string(df):
+    return df.to_string(index=False, header=False, float_format='%.8f').encode()
+
+
+@pytest.mark.parametrize("values", [
+    [np.nan],
+    [np.inf, -np.inf],
+    [np.nan, np.nan, np.nan],
+    [np.nan, 1.5, -0.25],
+    [-np.inf, 1e20, 0.0, -0.0],
+    [0.5, 2.5, 123.456789125, -1e-9],
+])
+def test_special_values_match_to_string(values):
+    df = pd.DataFrame({name: values for name in SINGLEPULSE_COLUMNS})
+    assert format_singlepulse(df) == to_string(df)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_values_match_to_string(seed):
+    rng = np.random.default_rng(seed)
+    n = 50
+    df = pd.DataFrame({
+        "DM": np.round(rng.random(n) * 2000, int(rng.integers(0, 10))),
+        "Sigma": rng.normal(size=n) * 10.0 ** rng.integers(-3, 8),
+        "Time": rng.random(n) * 10.0 ** rng.integers(0, 5),
+        "Sample": rng.integers(-1000, 10 ** 7, n),
+        "Downfact": rng.choice([np.nan, np.inf, 1.0, 30.0], n),
+    })
+    assert format_singlepulse(df) == to_string(df)
@@ -0,0 +1,79 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools.candidates import CandidateTable
+from cluster_tools.rfi import REPORT_COLUMNS, add_rfi_arguments, cli_rfi_veto, rfi_veto
+
+DMS = np.arange(0, 100, 1.0)
+
+
+@pytest.fixture
+def candidates():
+    # Sparse noise over 60 s starting at 0 s, a burst spanning a few DM trials
+    # at 20 s, and a broadband storm filling most trials between 30.0 and 30.3 s
+    rng = np.random.default_rng(0)
+    noise = pd.DataFrame({"DM": rng.choice(DMS[5:], 600), "Sigma": rng.uniform(5, 7, 600),
+                          "Time": np.r_[0.0, rng.uniform(0, 60, 599)]})
+    burst = pd.DataFrame({"DM": [49.0, 50.0, 51.0], "Sigma": [12.0, 15.0, 12.0], "Time": [20.02, 20.03, 20.04]})
+    storm = pd.DataFrame({"DM": np.tile(DMS[:80], 3), "Sigma": np.r_[rng.uniform(5, 9, 239), 30.0],
+                          "Time": np.repeat([30.01, 30.15, 30.25], 80)})
+    return pd.concat([noise, burst, storm], ignore_index=True)
+
+
+def in_storm(df):
+    return (df["Time"] >= 30.0) & (df["Time"] < 30.3)
+
+
+def test_storm_is_vetoed(candidates):
+    mask, report = rfi_veto(candidates, bin_width=0.1)
+    storm = in_storm(candidates).to_numpy()
+    assert not mask[storm].any() and mask[~storm].all()
+
+    assert list(report.columns) == REPORT_COLUMNS
+    [window] = report.to_dict("records")
+    assert window["time_start"] == pytest.approx(30.0) and window["time_end"] == pytest.approx(30.3)
+    assert window["n_candidates"] == window["n_removed"] >= 240
+    assert window["dm_fraction"] >= 0.8 and window["reason"] == "dm_fraction"
+    assert window["peak_sigma"] == 30.0 and window["peak_dm"] == 79.0
+
+
+def test_brightest_candidates_can_be_kept(candidates):
+    mask, report = rfi_veto(candidates, bin_width=0.1, keep=1)
+    kept = candidates[mask & in_storm(candidates)]
+    # One per vetoed bin, the brightest of each
+    assert len(kept) == 3 and kept["Sigma"].max() == 30.0
+    assert report["n_removed"].sum() == in_storm(candidates).sum() - 3
+
+
+def test_count_and_zero_dm_tests(candidates):
+    rfi = pd.DataFrame({"DM": np.zeros(40), "Sigma": np.full(40, 8.0), "Time": np.full(40, 45.05)})
+    df = pd.concat([candidates, rfi], ignore_index=True)
+    _, report = rfi_veto(df, bin_width=0.1, max_dm_fraction=None, count_factor=20)
+    assert report["reason"].tolist() == ["count", "count"]
+    _, report = rfi_veto(df, bin_width=0.1, max_dm_fraction=0.5, zero_dm=0.5)
+    assert report["reason"].tolist() == ["dm_fraction", "zero_dm"]
+    _, report = rfi_veto(df, bin_width=0.1, max_dm_fraction=None)
+    assert report.empty
+
+
+def test_candidate_tables_and_empty_input(candidates):
+    mask, report = rfi_veto(CandidateTable.from_dataframe(candidates))
+    np.testing.assert_array_equal(mask, rfi_veto(candidates)[0])
+    mask, report = rfi_veto(candidates.iloc[:0])
+    assert len(mask) == 0 and report.empty
+
+
+def test_cli_veto_writes_report_and_applies_dm_cut(candidates, tmp_path):
+    parser = argparse.ArgumentParser()
+    add_rfi_arguments(parser)
+    args = parser.parse_args(["--rfi_veto", "--rfi_report", str(tmp_path / "rfi.csv")])
+    candidates.attrs["rows_read"] = len(candidates)
+    df = cli_rfi_veto(args, candidates, dm_min=10)
+    assert len(df) == (~in_storm(candidates) & (candidates["DM"] >= 10)).sum()
+    assert df.attrs["rows_read"] == len(candidates)
+    assert len(pd.read_csv(tmp_path / "rfi.csv")) == 1
+
+    assert cli_rfi_veto(parser.parse_args([]), candidates) is candidates
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from cluster_tools.io import SINGLEPULSE_COLUMNS
+from cluster_tools.search import search_dedispersed, single_pulse_search
+
+TSAMP = 1e-3
+
+
+def noisy_series(n_dm=16, n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    # A slow baseline drift that the running median has to remove
+    return (rng.normal(size=(n_dm, n)) + np.linspace(0, 20, n)).astype(np.float32)
+
+
+def test_injected_pulse_is_found():
+    data = noisy_series()
+    dms = 50 + np.arange(len(data))
+    # Boxcar pulse of 6 samples, strongest at the true DM and smeared at its neighbours
+    for row, amplitude in [(6, 2.0), (7, 4.0), (8, 2.0)]:
+        data[row, 12000:12006] += amplitude
+    candidates = single_pulse_search(data, dms, TSAMP, t0=10.0)
+
+    assert list(candidates.columns) == SINGLEPULSE_COLUMNS
+    best = candidates.loc[candidates["Sigma"].idxmax()]
+    assert best["DM"] == 57 and best["Downfact"] == 6
+    assert abs(best["Sample"] - 12003) <= 1
+    assert best["Time"] == 10.0 + best["Sample"] * TSAMP
+    assert best["Sigma"] > 7.0
+    # One candidate per pulse and DM trial, and few noise candidates elsewhere
+    near = candidates[(candidates["DM"] == 57) & (abs(candidates["Sample"] - 12003) <= 30)]
+    assert len(near) == 1
+    assert len(candidates) < 0.001 * data.size
+
+
+def test_block_size_does_not_change_candidates():
+    data = noisy_series(n_dm=10, n=5000, seed=1)
+    data[3, 2000:2010] += 3.0
+    dms = np.arange(len(data), dtype=float)
+    full = single_pulse_search(data, dms, TSAMP, threshold=4.0)
+    # Room for one DM trial at a time, and blocks that do not divide the trials
+    single = single_pulse_search(data, dms, TSAMP, threshold=4.0, max_block_bytes=1)
+    uneven = single_pulse_search(data, dms, TSAMP, threshold=4.0, dm_block=3)
+    pd.testing.assert_frame_equal(single, full)
+    pd.testing.assert_frame_equal(uneven, full)
+
+
+def test_search_dedispersed_concatenates_rows():
+    data = noisy_series(n_dm=4, n=3000, seed=2)
+    data[1, 1500:1503] += 5.0
+    rows = [{"data": data[:2], "dms": [10.0, 11.0], "tsamp": TSAMP},
+            {"data": data[2:], "dms": [12.0, 13.0], "tsamp": TSAMP}]
+    candidates = search_dedispersed(rows, threshold=6.0)
+    assert set(candidates["DM"]) <= {10.0, 11.0, 12.0, 13.0}
+    assert (candidates["DM"] == 11.0).any()
+    assert search_dedispersed([]).columns.tolist() == SINGLEPULSE_COLUMNS
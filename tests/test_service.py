@@ -0,0 +1,156 @@
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools.batch import cluster_observation
+from cluster_tools.io import DM_delay
+from cluster_tools.output import write_singlepulse
+from cluster_tools.service import handle_request, request, serve
+
+
+@pytest.fixture
+def observation(tmp_path):
+    # Noise and two pulses sweeping neighbouring DM trials, one file per DM
+    rng = np.random.default_rng(0)
+    dms = 10 + 2.0 * np.arange(20)
+    rows = [np.c_[rng.choice(dms, 300), rng.uniform(5, 7, 300), rng.uniform(0, 30, 300)]]
+    for t0, dm0 in [(8.0, 25.0), (21.0, 35.0)]:
+        near = dms[np.abs(dms - dm0) <= 6]
+        rows.append(np.c_[near, 12 - np.abs(near - dm0) / 2, t0 + DM_delay(near - dm0, 550.0, 200.0)])
+    rows = np.concatenate(rows)
+    df = pd.DataFrame({"DM": rows[:, 0], "Sigma": rows[:, 1], "Time": rows[:, 2], "Sample": 0.0, "Downfact": 1.0})
+    path = tmp_path / "beam0"
+    path.mkdir()
+    for dm, part in df.groupby("DM"):
+        write_singlepulse(part.sort_values("Time"), str(path / f"obs_DM{dm:.2f}.singlepulse"))
+    return str(path)
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to about 100 characters, so not under tmp_path
+    directory = tempfile.mkdtemp(prefix="ct", dir="/tmp")
+    yield os.path.join(directory, "service.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def service(socket_path):
+    process = multiprocessing.get_context("fork").Process(target=serve, args=(socket_path,),
+                                                           kwargs={"warm": False, "verbose": False})
+    process.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            request({"op": "ping"}, socket_path, timeout=5)
+            break
+        except ConnectionError:
+            if time.monotonic() > deadline or not process.is_alive():
+                raise
+            time.sleep(0.05)
+    yield socket_path
+    try:
+        request({"op": "stop"}, socket_path, timeout=5)
+    except ConnectionError:
+        pass  # already stopped by the test
+    process.join(30)
+
+
+def test_requests_are_checked():
+    assert handle_request({"op": "fit"})["error"].startswith("ValueError: Unknown op 'fit'")
+    response = handle_request({"op": "cluster", "single_path": "beam0", "output": "/tmp/out.singlepulse"})
+    assert response["status"] == "error" and "absolute path" in response["error"]
+    response = handle_request({"op": "convert", "fil_files": ["/a.fil"], "info_files": ["b.singlepulse"],
+                               "output_dir": "/tmp"})
+    assert "'info_files' must be an absolute path" in response["error"]
+    response = handle_request({"op": "cluster", "single_path": "/no/such/dir", "output": "/tmp/out.singlepulse"})
+    assert response["error"].startswith("FileNotFoundError")
+
+
+def test_cluster_request_matches_direct_call(observation, tmp_path):
+    config = {"eps": 0.05, "min_samples": 3, "cache": False}
+    response = handle_request({"op": "cluster", "single_path": observation,
+                               "output": str(tmp_path / "out" / "beam0.singlepulse"), "config": config})
+    assert response["status"] == "ok" and response["seconds"] > 0
+    direct = cluster_observation(observation, str(tmp_path), "direct", config)
+    assert response["result"]["output"] == str(tmp_path / "out" / "beam0.singlepulse")
+    assert response["result"]["n_best"] == direct["n_best"] >= 2
+    assert open(response["result"]["output"]).read() == open(direct["output"]).read()
+
+
+def test_service_round_trip(service, observation, tmp_path):
+    config = {"eps": 0.05, "min_samples": 3, "cache": False}
+    expected = handle_request({"op": "cluster", "single_path": observation,
+                               "output": str(tmp_path / "expected.singlepulse"), "config": config})["result"]
+
+    # Concurrent clients, each on its own connection
+    responses = [None] * 4
+
+    def send(k):
+        responses[k] = request({"op": "cluster", "single_path": observation, "config": config,
+                                "output": str(tmp_path / f"client{k}.singlepulse")}, service, timeout=60)
+
+    threads = [threading.Thread(target=send, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for k, response in enumerate(responses):
+        assert response["status"] == "ok"
+        assert response["result"]["n_best"] == expected["n_best"]
+        assert open(tmp_path / f"client{k}.singlepulse").read() == open(expected["output"]).read()
+
+    assert request({"op": "cluster", "single_path": "beam0", "output": "x"}, service)["status"] == "error"
+    status = request({"op": "ping"}, service)
+    assert status["result"]["pid"] != os.getpid() and status["result"]["requests"] == 5
+
+    # Malformed lines are answered without closing the connection
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(service)
+        with sock.makefile("rwb") as stream:
+            stream.write(b"not json\n{\"op\": \"ping\"}\n")
+            stream.flush()
+            assert b"Invalid request" in stream.readline()
+            assert b"\"ok\"" in stream.readline()
+
+
+def test_stop_and_socket_lifecycle(service):
+    with pytest.raises(RuntimeError, match="already listening"):
+        serve(service, warm=False, verbose=False)
+    assert request({"op": "stop"}, service)["status"] == "ok"
+    deadline = time.monotonic() + 30
+    while os.path.exists(service) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not os.path.exists(service)
+    with pytest.raises(ConnectionError, match="No clustering service"):
+        request({"op": "ping"}, service)
+
+
+def test_stale_socket_is_replaced(socket_path):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    process = multiprocessing.get_context("fork").Process(target=serve, args=(socket_path,),
+                                                           kwargs={"warm": False, "verbose": False})
+    process.start()
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                assert request({"op": "ping"}, socket_path, timeout=5)["status"] == "ok"
+                break
+            except ConnectionError:
+                assert time.monotonic() < deadline and process.is_alive()
+                time.sleep(0.05)
+        request({"op": "stop"}, socket_path, timeout=5)
+    finally:
+        process.join(30)
+    assert process.exitcode == 0
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cluster_tools import sweep
+from cluster_tools.clustering import dbscan_labels, hdbscan_labels
+
+
+@pytest.fixture
+def candidates():
+    rng = np.random.default_rng(1)
+    X = np.vstack([rng.random((300, 2)), rng.normal(scale=0.03, size=(300, 2)) + rng.random(2)])
+    return pd.DataFrame({"Delay_s": X[:, 0], "Time": X[:, 1], "Sigma": rng.random(len(X)) * 10})
+
+
+def n_clusters(labels):
+    return len(np.unique(labels[labels >= 0]))
+
+
+def test_dbscan_sweep_matches_fits(candidates):
+    table = sweep.DBSCAN_sweep(candidates, eps_values=[0.02, 0.05], min_samples_values=[3, 5])
+    for row in table.itertuples():
+        labels = dbscan_labels(candidates, eps=row.eps, min_samples=row.min_samples)
+        assert row.n_clusters == n_clusters(labels)
+        assert row.noise_fraction == pytest.approx(np.mean(labels < 0))
+
+
+def test_dbscan_sweep_rejects_none_min_samples(candidates):
+    with pytest.raises(ValueError, match="min_samples"):
+        sweep.DBSCAN_sweep(candidates, eps_values=[0.05], min_samples_values=[3, None])
+
+
+def test_hdbscan_sweep_matches_fits(candidates, monkeypatch):
+    table = sweep.HDBSCAN_sweep(candidates, min_cluster_size_values=[3, 5, 10], min_samples_values=[3, 5])
+    for row in table.itertuples():
+        labels = hdbscan_labels(candidates, min_cluster_size=row.min_cluster_size, min_samples=row.min_samples)
+        assert row.n_clusters == n_clusters(labels)
+
+    # Without hdbscan's internal tree functions every setting is a full fit
+    monkeypatch.setattr(sweep, "condense_tree", None)
+    fallback = sweep.HDBSCAN_sweep(candidates, min_cluster_size_values=[3, 5, 10], min_samples_values=[3, 5])
+    pd.testing.assert_frame_equal(fallback, table)
+
+
+def test_hdbscan_sweep_warns_without_reuse(candidates):
+    with pytest.warns(UserWarning, match="min_samples=None"):
+        sweep.HDBSCAN_sweep(candidates, min_cluster_size_values=[3, 5], min_samples_values=[None])
@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from cluster_tools.workqueue import WorkQueue, run_worker
+
+
+def shell_job(tmp_path, name, cmd="true", **extra):
+    return {"name": name, "kind": "shell", "cmd": cmd, "cwd": str(tmp_path),
+            "log_dir": str(tmp_path / "logs"), **extra}
+
+
+def claim_all(queue_dir, worker):
+    # Claim jobs until none is pending, as a worker process would
+    queue = WorkQueue(queue_dir)
+    names = []
+    while (claimed := queue.claim(worker)) is not None:
+        names.append(claimed[0]["name"])
+    return names
+
+
+def claim_and_die(queue_dir):
+    # A worker that claims a job and exits without finishing it
+    WorkQueue(queue_dir).claim("dead-1")
+    os._exit(0)
+
+
+def test_each_job_is_claimed_once(tmp_path):
+    queue = WorkQueue(tmp_path / "queue")
+    assert queue.submit([shell_job(tmp_path, f"job{i:03d}") for i in range(200)]) == 200
+    with ProcessPoolExecutor(4) as pool:
+        claimed = list(pool.map(claim_all, [queue.path] * 4, [f"w{i}" for i in range(4)]))
+    names = [name for worker in claimed for name in worker]
+    assert sorted(names) == [f"job{i:03d}" for i in range(200)]
+    assert len(queue.jobs("running")) == 200 and not queue.jobs("pending")
+
+
+def test_submit_skips_known_names(tmp_path):
+    queue = WorkQueue(tmp_path / "queue")
+    assert queue.submit([shell_job(tmp_path, "a"), shell_job(tmp_path, "b")]) == 2
+    assert queue.submit([shell_job(tmp_path, "a"), shell_job(tmp_path, "c")]) == 1
+    with pytest.raises(ValueError, match="Invalid job name"):
+        queue.submit([shell_job(tmp_path, "x@y")])
+
+
+def test_submit_rejects_unknown_and_cyclic_dependencies(tmp_path):
+    queue = WorkQueue(tmp_path / "queue")
+    with pytest.raises(ValueError, match="not in the queue"):
+        queue.submit([shell_job(tmp_path, "a"), shell_job(tmp_path, "b", after="missing")])
+    with pytest.raises(ValueError, match="depends on itself"):
+        queue.submit([shell_job(tmp_path, "a", after="b"), shell_job(tmp_path, "b", after="a")])
+    assert queue.names() == set() and queue.idle()
+
+    # A dependency may come later in the same submission or from an earlier one
+    assert queue.submit([shell_job(tmp_path, "b", after="a"), shell_job(tmp_path, "a")]) == 2
+    assert queue.submit([shell_job(tmp_path, "c", after="b")]) == 1
+    assert [job["name"] for job in queue.jobs("waiting")] == ["b", "c"]
+
+
+def test_heartbeat_and_lost_job(tmp_path):
+    queue = WorkQueue(tmp_path / "queue", heartbeat=0.05)
+    queue.submit([shell_job(tmp_path, "a")])
+    job, running = queue.claim("w1")
+    os.utime(running, (0, 0))
+    with queue.keep_alive(running) as lost:
+        time.sleep(0.2)
+        assert os.stat(running).st_mtime > 0
+        os.unlink(running)
+        assert lost.wait(1.0)
+
+
+def test_stale_jobs_are_requeued_then_failed(tmp_path):
+    queue = WorkQueue(tmp_path / "queue", timeout=0.1, max_requeues=1)
+    queue.submit([shell_job(tmp_path, "a")])
+    queue.claim("w1")
+    assert queue.requeue_stale() == []
+    time.sleep(0.15)
+    assert queue.requeue_stale() == ["a"]
+    assert [job["requeues"] for job in queue.jobs("pending")] == [1]
+
+    queue.claim("w2")
+    queue.requeue_stale()
+    time.sleep(0.15)
+    assert queue.requeue_stale() == []
+    [failed] = queue.jobs("failed")
+    assert failed["status"] == "lost" and failed["requeues"] == 2
+
+
+def test_interrupted_requeue_keeps_its_count(tmp_path):
+    # A requeue that stopped between its two renames leaves a hidden file in pending/
+    queue = WorkQueue(tmp_path / "queue", timeout=0.0)
+    queue.submit([shell_job(tmp_path, "a")])
+    job, running = queue.claim("w1")
+    os.rename(running, os.path.join(queue.path, "pending", ".a.requeue"))
+    assert queue.requeue_stale() == ["a"]
+    [pending] = queue.jobs("pending")
+    assert pending["requeues"] == 1
+    assert os.listdir(os.path.join(queue.path, "pending")) == ["a.json"]
+    assert os.listdir(os.path.join(queue.path, "tmp")) == []
+
+
+def test_orphan_of_a_completed_requeue_is_dropped(tmp_path):
+    queue = WorkQueue(tmp_path / "queue", timeout=0.0)
+    queue.submit([shell_job(tmp_path, "a")])
+    with open(os.path.join(queue.path, "pending", ".a.requeue"), "w") as fh:
+        json.dump({**shell_job(tmp_path, "a"), "attempts": 0, "requeues": 0}, fh)
+    assert queue.requeue_stale() == []
+    assert os.listdir(os.path.join(queue.path, "pending")) == ["a.json"]
+    assert queue.jobs("pending")[0]["requeues"] == 0
+
+
+def test_workers_follow_dependencies(tmp_path):
+    queue = WorkQueue(tmp_path / "queue")
+    queue.submit([
+        shell_job(tmp_path, "a", cmd="echo a >> order"),
+        shell_job(tmp_path, "b", cmd="echo b >> order", after="a"),
+        shell_job(tmp_path, "c", cmd="exit 3", retries=1),
+        shell_job(tmp_path, "d", cmd="echo d >> order", after="c"),
+    ])
+    with ProcessPoolExecutor(2) as pool:
+        futures = [pool.submit(run_worker, queue.path, poll=0.05, verbose=False) for _ in range(2)]
+        counts = [future.result(timeout=60) for future in futures]
+    assert sum(c["done"] for c in counts) == 2
+    assert sum(c["retried"] for c in counts) == 1 and sum(c["failed"] for c in counts) == 1
+    assert queue.idle()
+    assert (tmp_path / "order").read_text().split() == ["a", "b"]
+    failed = {job["name"]: job for job in queue.jobs("failed")}
+    assert failed["c"]["returncode"] == 3 and failed["c"]["attempts"] == 2
+    assert failed["d"]["status"] == "skipped"
+
+
+def test_job_of_a_dead_worker_is_rerun(tmp_path):
+    queue = WorkQueue(tmp_path / "queue")
+    queue.submit([shell_job(tmp_path, "a", cmd="echo a >> order")])
+    with ProcessPoolExecutor(1) as pool:
+        with pytest.raises(Exception):
+            pool.submit(claim_and_die, queue.path).result(timeout=60)
+    assert [job["name"] for job in queue.jobs("running")] == ["a"]
+
+    counts = run_worker(queue.path, timeout=0.2, poll=0.05, verbose=False)
+    assert counts["done"] == 1
+    [done] = queue.jobs("done")
+    assert done["requeues"] == 1
+    assert (tmp_path / "order").read_text().split() == ["a"]